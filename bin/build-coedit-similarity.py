@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8  -*-
+"""
+Script to build the item-item co-edit similarity table for a given
+Wikipedia language edition, used by the co-edit recommender when
+config.coedit_engine is 'itemitem'.  Meant to be run nightly.
+
+Copyright (C) 2005-2017 SuggestBot Dev Group
+
+This library is free software; you can redistribute it and/or
+modify it under the terms of the GNU Library General Public
+License as published by the Free Software Foundation; either
+version 2 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+Library General Public License for more details.
+
+You should have received a copy of the GNU Library General Public
+License along with this library; if not, write to the
+Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+Boston, MA  02110-1301, USA.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the Python path
+# Use this line only if your want to test the script directly from the current path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import logging
+
+from suggestbot import config
+from suggestbot.recommenders.coeditindex import CoeditIndex
+from suggestbot.recommenders.itemsimilarity import SimilarityBuilder
+
+
+def main():
+    # Parse CLI options
+    import argparse
+
+    cli_parser = argparse.ArgumentParser(
+        description="Script to build the item-item co-edit similarity table for a specific language"
+    )
+
+    # Add verbosity option
+    cli_parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Be more verbose"
+    )
+
+    cli_parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=config.coedit_itemitem_workers,
+        help="number of worker processes (default: %(default)s)",
+    )
+
+    cli_parser.add_argument(
+        "-c",
+        "--chunk-size",
+        type=int,
+        default=2000,
+        help="number of articles a worker handles at a time (default: %(default)s)",
+    )
+
+    # Add required language parameter
+    cli_parser.add_argument(
+        "lang", help="language code of the Wikipedia we are processing"
+    )
+
+    args = cli_parser.parse_args()
+    if args.verbose:
+        logging.basicConfig(level=logging.INFO)
+
+    if config.coedit_engine != "itemitem":
+        logging.info("co-edit engine is not 'itemitem', nothing to build")
+        return ()
+
+    if args.lang not in config.coedit_similarity_table:
+        logging.error(
+            "no similarity table configured for {}wiki, exiting".format(args.lang)
+        )
+        return ()
+
+    index = CoeditIndex(args.lang)
+    if not index.load():
+        logging.error("unable to load the co-edit index, exiting")
+        return ()
+
+    builder = SimilarityBuilder(
+        args.lang,
+        k=config.coedit_itemitem_k,
+        min_coeditors=config.coedit_itemitem_min_coeditors,
+        max_user_articles=config.coedit_itemitem_max_user_articles,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+    )
+    builder.build(index)
+    return ()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+#!/bin/bash
+
+# Shell script to launch the build of the item-item co-edit similarity
+# table for a given language
+
+LAUNCH_DIR=`dirname "$0"`;
+cd $LAUNCH_DIR/../
+source set_paths.sh;
+
+cd bin;
+$PYTHON_EXECUTABLE build-coedit-similarity.py $1;
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8  -*-
+"""
+Script to build the link graph of a given Wikipedia language edition,
+used by the link recommender to expand articles without querying the
+database replicas.  Meant to be run weekly.
+
+Copyright (C) 2005-2017 SuggestBot Dev Group
+
+This library is free software; you can redistribute it and/or
+modify it under the terms of the GNU Library General Public
+License as published by the Free Software Foundation; either
+version 2 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+Library General Public License for more details.
+
+You should have received a copy of the GNU Library General Public
+License along with this library; if not, write to the
+Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+Boston, MA  02110-1301, USA.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the Python path
+# Use this line only if your want to test the script directly from the current path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import logging
+
+from suggestbot import config
+from suggestbot.recommenders.links import Recommender, DatabaseConnectionError
+from suggestbot.recommenders.linkgraph import LinkGraph, graph_path
+
+
+def main():
+    # Parse CLI options
+    import argparse
+
+    cli_parser = argparse.ArgumentParser(
+        description="Script to build the link graph for a specific language"
+    )
+
+    # Add verbosity option
+    cli_parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Be more verbose"
+    )
+
+    cli_parser.add_argument(
+        "-d",
+        "--directory",
+        default=config.links_graph_dir,
+        help="directory to write the graph to (default: %(default)s)",
+    )
+
+    # Add required language parameter
+    cli_parser.add_argument(
+        "lang", help="language code of the Wikipedia we are processing"
+    )
+
+    args = cli_parser.parse_args()
+    if args.verbose:
+        logging.basicConfig(level=logging.INFO)
+
+    if not args.directory:
+        logging.error("no graph directory given or configured, exiting")
+        return ()
+
+    # The link recommender knows where the database replicas are
+    recommender = Recommender(lang=args.lang)
+    try:
+        recommender.connect(args.lang)
+    except DatabaseConnectionError:
+        logging.error("unable to connect to the database replica, exiting")
+        return ()
+
+    graph = LinkGraph(args.lang)
+    success = graph.load(recommender.wiki_db_conn)
+    recommender.close()
+
+    if success:
+        graph.save_snapshot(graph_path(args.directory, args.lang))
+    return ()
+
+
+if __name__ == "__main__":
+    main()
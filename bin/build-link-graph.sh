@@ -0,0 +1,11 @@
+#!/bin/bash
+
+# Shell script to launch the build of the link graph
+# for a given language
+
+LAUNCH_DIR=`dirname "$0"`;
+cd $LAUNCH_DIR/../
+source set_paths.sh;
+
+cd bin;
+$PYTHON_EXECUTABLE build-link-graph.py $1;
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8  -*-
+"""
+Script to build the text index of a given Wikipedia language edition
+from a pages-articles dump, used by the text recommender to find similar
+articles without querying CirrusSearch.  Meant to be run whenever a new
+dump is available.
+
+Copyright (C) 2005-2017 SuggestBot Dev Group
+
+This library is free software; you can redistribute it and/or
+modify it under the terms of the GNU Library General Public
+License as published by the Free Software Foundation; either
+version 2 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+Library General Public License for more details.
+
+You should have received a copy of the GNU Library General Public
+License along with this library; if not, write to the
+Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+Boston, MA  02110-1301, USA.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the Python path
+# Use this line only if your want to test the script directly from the current path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import logging
+
+from suggestbot import config
+from suggestbot.recommenders.textindex import TextIndex, index_path
+
+
+def main():
+    # Parse CLI options
+    import argparse
+
+    cli_parser = argparse.ArgumentParser(
+        description="Script to build the text index for a specific language"
+    )
+
+    # Add verbosity option
+    cli_parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Be more verbose"
+    )
+
+    cli_parser.add_argument(
+        "-d",
+        "--directory",
+        default=config.text_index_dir,
+        help="directory to write the index to (default: %(default)s)",
+    )
+
+    cli_parser.add_argument(
+        "-f",
+        "--features",
+        type=int,
+        default=config.text_index_features,
+        help="number of features terms are hashed into (default: %(default)s)",
+    )
+
+    # Add required language parameter
+    cli_parser.add_argument(
+        "lang", help="language code of the Wikipedia we are processing"
+    )
+
+    # Add required dump parameter
+    cli_parser.add_argument(
+        "dump", help="path to the pages-articles XML dump (optionally bz2-compressed)"
+    )
+
+    args = cli_parser.parse_args()
+    if args.verbose:
+        logging.basicConfig(level=logging.INFO)
+
+    if not args.directory:
+        logging.error("no index directory given or configured, exiting")
+        return ()
+
+    index = TextIndex(args.lang, n_features=args.features)
+    if index.load(args.dump):
+        index.save_snapshot(index_path(args.directory, args.lang))
+    return ()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+#!/bin/bash
+
+# Shell script to launch the build of the text index
+# for a given language from a dump
+
+LAUNCH_DIR=`dirname "$0"`;
+cd $LAUNCH_DIR/../
+source set_paths.sh;
+
+cd bin;
+$PYTHON_EXECUTABLE build-text-index.py $1 $2;
@@ -0,0 +1,11 @@
+#!/bin/bash
+
+# Shell script to launch the classification of article titles
+# for a given language
+
+LAUNCH_DIR=`dirname "$0"`;
+cd $LAUNCH_DIR/../
+source set_paths.sh;
+
+cd bin;
+$PYTHON_EXECUTABLE build-title-classes.py $1;
@@ -31,7 +31,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 import logging
 
 from suggestbot import config
-from suggestbot.recommenders.coedit import Recommender
+from suggestbot.recommenders.coedit import Recommender, INDEX_ENGINES
 
 from xmlrpc.server import SimpleXMLRPCServer
 from xmlrpc.server import SimpleXMLRPCRequestHandler
@@ -50,12 +50,24 @@ def main():
     # Add verbosity option
     cli_parser.add_argument('-v', '--verbose', action='store_true',
                             help='Be more verbose')
+
+    cli_parser.add_argument('-s', '--snapshot', default=config.coedit_snapshot_dir,
+                            help='directory of co-edit index snapshots to map at startup, and write to when an index is reloaded (default: %(default)s)')
+
+    cli_parser.add_argument('-l', '--lang', action='append', default=[],
+                            help='language to load the co-edit index for at startup (can be given multiple times)')
     args = cli_parser.parse_args()
 
     if args.verbose:
         logging.basicConfig(level=logging.INFO)
 
-    recserver = Recommender()
+    recserver = Recommender(snapshot_dir=args.snapshot)
+    # Only the index-based engines use the co-edit index
+    if args.lang and config.coedit_engine not in INDEX_ENGINES:
+        logging.warning("the {} engine doesn't use the co-edit index, not loading it".format(config.coedit_engine))
+    else:
+        for lang in args.lang:
+            recserver.get_index(lang)
     server = SimpleXMLRPCServer(
         (config.coedit_hostname, config.coedit_hostport),
         allow_none=True)
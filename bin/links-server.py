@@ -48,7 +48,16 @@ def main():
     if args.verbose:
         logging.basicConfig(level=logging.INFO)
 
-    recserver = Recommender()
+    recserver = Recommender(graph_dir=config.links_graph_dir,
+                            max_frontier=config.links_max_frontier,
+                            scoring=config.links_scoring,
+                            ppr_damping=config.links_ppr_damping,
+                            ppr_iterations=config.links_ppr_iterations,
+                            ppr_tolerance=config.links_ppr_tolerance,
+                            ilc_dir=config.links_ilc_dir,
+                            workers=config.links_workers,
+                            slice_sizes=config.links_slice_size,
+                            title_class_dir=config.title_class_dir)
     server = SimpleXMLRPCServer(
         (config.links_hostname, config.links_hostport),
         allow_none=True)
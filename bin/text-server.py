@@ -48,7 +48,12 @@ def main():
     if args.verbose:
         logging.basicConfig(level=logging.INFO)
 
-    recserver = Recommender()
+    recserver = Recommender(workers=config.text_workers,
+                            batch_size=config.text_batch_size,
+                            cache_path=config.text_cache_path,
+                            cache_ttl=config.text_cache_ttl,
+                            cache_size=config.text_cache_size,
+                            index_dir=config.text_index_dir)
     server = SimpleXMLRPCServer(
         (config.textmatch_hostname, config.textmatch_hostport),
         allow_none=True)
@@ -0,0 +1,29 @@
+-- Format of the xxwiki_article_stats table, a per-article summary of the
+-- xxwiki_revisions table used by the co-edit recommenders to spot hub
+-- articles with many editors without counting them at request time.
+-- Kept up to date by the recent changes daemon
+-- (suggestbot/utilities/rcdaemon.py) as revisions are added and expire.
+
+DROP TABLE IF EXISTS enwiki_article_stats;
+CREATE TABLE enwiki_article_stats (
+       as_title VARCHAR(255) BINARY NOT NULL, -- page title
+       as_num_edits INT UNSIGNED NOT NULL DEFAULT 0, -- number of revisions
+       as_num_editors INT UNSIGNED NOT NULL DEFAULT 0, -- distinct editors
+       PRIMARY KEY(as_title),
+       KEY as_num_editors(as_num_editors)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_bin;
+
+CREATE TABLE nowiki_article_stats LIKE enwiki_article_stats;
+CREATE TABLE svwiki_article_stats LIKE enwiki_article_stats;
+CREATE TABLE ptwiki_article_stats LIKE enwiki_article_stats;
+CREATE TABLE ruwiki_article_stats LIKE enwiki_article_stats;
+CREATE TABLE fawiki_article_stats LIKE enwiki_article_stats;
+CREATE TABLE huwiki_article_stats LIKE enwiki_article_stats;
+CREATE TABLE frwiki_article_stats LIKE enwiki_article_stats;
+CREATE TABLE arwiki_article_stats LIKE enwiki_article_stats;
+
+-- Initial population from an existing revision table:
+-- INSERT INTO enwiki_article_stats
+-- SELECT rev_title, COUNT(*), COUNT(DISTINCT rev_user)
+-- FROM enwiki_revisions
+-- GROUP BY rev_title;
@@ -0,0 +1,23 @@
+-- Format of the xxwiki_coedit_similarity table, the top-K most similar
+-- articles of each article based on who edited them, used by the co-edit
+-- recommender when config.coedit_engine is 'itemitem'.  Rebuilt nightly
+-- by bin/build-coedit-similarity.py, which fills a copy of the table
+-- and swaps it in when done.
+
+DROP TABLE IF EXISTS enwiki_coedit_similarity;
+CREATE TABLE enwiki_coedit_similarity (
+       cs_title VARCHAR(255) BINARY NOT NULL, -- page title
+       cs_neighbour VARCHAR(255) BINARY NOT NULL, -- title of a similar page
+       cs_score FLOAT NOT NULL, -- cosine similarity of their editors
+       cs_coeditors INT UNSIGNED NOT NULL, -- number of shared editors
+       PRIMARY KEY(cs_title, cs_neighbour)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_bin;
+
+CREATE TABLE nowiki_coedit_similarity LIKE enwiki_coedit_similarity;
+CREATE TABLE svwiki_coedit_similarity LIKE enwiki_coedit_similarity;
+CREATE TABLE ptwiki_coedit_similarity LIKE enwiki_coedit_similarity;
+CREATE TABLE ruwiki_coedit_similarity LIKE enwiki_coedit_similarity;
+CREATE TABLE fawiki_coedit_similarity LIKE enwiki_coedit_similarity;
+CREATE TABLE huwiki_coedit_similarity LIKE enwiki_coedit_similarity;
+CREATE TABLE frwiki_coedit_similarity LIKE enwiki_coedit_similarity;
+CREATE TABLE arwiki_coedit_similarity LIKE enwiki_coedit_similarity;
@@ -0,0 +1,34 @@
+-- Format of the xxwiki_user_stats table, a per-user summary of the
+-- xxwiki_revisions table used by the co-edit recommenders so that
+-- edit counts and article counts are lookups rather than aggregate
+-- scans.  Kept up to date by the recent changes daemon
+-- (suggestbot/utilities/rcdaemon.py) as revisions are added and expire.
+
+DROP TABLE IF EXISTS enwiki_user_stats;
+CREATE TABLE enwiki_user_stats (
+       us_user VARCHAR(255) BINARY NOT NULL, -- user name
+       us_num_edits INT UNSIGNED NOT NULL DEFAULT 0, -- number of revisions
+       us_num_articles INT UNSIGNED NOT NULL DEFAULT 0, -- distinct articles edited
+       us_num_major_articles INT UNSIGNED NOT NULL DEFAULT 0, -- distinct articles with non-minor, non-reverting edits
+       us_is_expert BIT(1) DEFAULT 0, -- us_num_edits >= config.coedit_filter_threshold?
+       PRIMARY KEY(us_user)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_bin;
+
+CREATE TABLE nowiki_user_stats LIKE enwiki_user_stats;
+CREATE TABLE svwiki_user_stats LIKE enwiki_user_stats;
+CREATE TABLE ptwiki_user_stats LIKE enwiki_user_stats;
+CREATE TABLE ruwiki_user_stats LIKE enwiki_user_stats;
+CREATE TABLE fawiki_user_stats LIKE enwiki_user_stats;
+CREATE TABLE huwiki_user_stats LIKE enwiki_user_stats;
+CREATE TABLE frwiki_user_stats LIKE enwiki_user_stats;
+CREATE TABLE arwiki_user_stats LIKE enwiki_user_stats;
+
+-- Initial population from an existing revision table
+-- (18 is the default value of config.coedit_filter_threshold):
+-- INSERT INTO enwiki_user_stats
+-- SELECT rev_user, COUNT(*), COUNT(DISTINCT rev_title),
+--        COUNT(DISTINCT IF(rev_is_minor=0 AND rev_comment_is_revert=0,
+--                          rev_title, NULL)),
+--        COUNT(*) >= 18
+-- FROM enwiki_revisions
+-- GROUP BY rev_user;
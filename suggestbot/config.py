@@ -700,6 +700,32 @@ revision_table = {
     "ar": "arwiki_revisions",
 }
 
+# Configuration of database tables used to store per-user summaries
+# of the revision tables (edit counts, article counts, expert flag),
+# maintained by the recent changes daemon and read by the co-edit
+# recommenders.  None are configured by default: create and populate
+# a language's table with sql/user-stats.sql before adding it here,
+# e.g. "en": "enwiki_user_stats".  Users missing from a table, and all
+# users of languages not listed, are summarised from the revision table.
+user_stats_table = {}
+
+# Configuration of database tables used to store per-article summaries
+# of the revision tables (number of edits and distinct editors),
+# maintained by the recent changes daemon and used by the co-edit
+# recommenders to spot hub articles.  As above, none are configured by
+# default (e.g. "en": "enwiki_article_stats"), and articles missing
+# from a table are summarised from the revision table.
+article_stats_table = {}
+
+# Configuration of database tables holding the precomputed item-item
+# co-edit similarities, built nightly by bin/build-coedit-similarity.py
+# and used by the co-edit recommender's 'itemitem' engine.  None are
+# configured by default: create a language's table with
+# sql/coedit-similarity.sql before adding it here, e.g.
+# "en": "enwiki_coedit_similarity".  Languages not listed fall back
+# to the 'sql' engine.
+coedit_similarity_table = {}
+
 # Configuration of what templates to use.  Complete title
 # to the Wikipedia userspace article that contains the template.
 # Each key is a language code, which then contains a dictionary
@@ -1131,6 +1157,13 @@ list_re = {
     "ar": r"^قائمة[ _]",
 }
 
+# Directory with the title class snapshots built by
+# bin/build-title-classes.py, which mark list articles, dates and titles
+# with years.  When set, the links server and the recommendation filter
+# look articles up in them instead of matching their titles with
+# regular expressions.  None disables them.
+title_class_dir = None
+
 # P-value cutoffs for determining if an article-specific task suggestion
 # is a "yes" or a "maybe"
 task_p_yes = 0.1
@@ -1228,6 +1261,101 @@ filter_server_hostport = 10009
 links_hostname = "localhost"
 links_hostport = 10006
 
+# Directory with the link graph snapshots built by bin/build-link-graph.py.
+# For languages that have a graph, the links server expands articles
+# in-process instead of querying the database replicas.  None disables it.
+links_graph_dir = None
+
+# Maximum number of newly found articles the links server finds links for
+# at each depth of its search, keeping the highest scoring ones.
+# Bounds the work done for users whose articles link to many others,
+# 0 means no limit.
+links_max_frontier = 1000
+
+# How the links server scores candidates for languages with a link graph:
+# 'links' counts links from the user's articles and penalises popular
+# articles, 'pagerank' ranks articles by a personalized PageRank that
+# restarts at the user's articles.
+links_scoring = "links"
+
+# Personalized PageRank settings: probability of following a link rather
+# than restarting, maximum number of iterations, and the change in scores
+# (L1 distance) between iterations below which we stop early.
+links_ppr_damping = 0.85
+links_ppr_iterations = 10
+links_ppr_tolerance = 1e-4
+
+# Directory with the inlink count arrays exported by the inlink count
+# table updater (tool-labs/link-rec/inlink-table-updater.py -e).  When set,
+# the links server reads inlink counts from them instead of querying
+# the inlink count tables.  None disables it.
+links_ilc_dir = None
+
+# Number of slices of articles the links server fetches from the database
+# replicas concurrently (each on its own connection), and the number of
+# articles per slice, per language.  Raise these as replica capacity allows.
+# Languages not listed fetch one slice of 25 articles at a time.
+links_workers = {
+    "en": 4,
+    "no": 2,
+    "sv": 2,
+    "pt": 2,
+    "hu": 2,
+    "fa": 2,
+    "ru": 2,
+    "fr": 2,
+    "ar": 2,
+}
+
+links_slice_size = {
+    "en": 25,
+    "no": 25,
+    "sv": 25,
+    "pt": 25,
+    "hu": 25,
+    "fa": 25,
+    "ru": 25,
+    "fr": 25,
+    "ar": 25,
+}
+
+# Number of morelike searches the text server runs concurrently.  They all
+# share the site's throttle, which pauses them when the API reports
+# replication lag (see maxlag in pywikibot's user-config.py).
+text_workers = 8
+
+# Number of seconds the servers use a site's tokens for before clearing
+# them, after which Pywikibot fetches new ones when it needs them.
+# Sites are shared within a process (see suggestbot.utilities.sites).
+site_token_max_age = 60 * 60
+
+# Maximum number of articles the text server asks CirrusSearch for similar
+# articles to in a single morelike query, to cut the number of API calls.
+# A batch asks for as many results as its articles would get separately
+# (50 each, 100 with apihighlimits), but the API returns at most 500
+# (5000 with apihighlimits), so batches of more than 10 articles (50 with
+# apihighlimits) get fewer candidates per article.  Only the results of
+# articles searched for on their own are cached (see text_cache_path),
+# so with batching the cache is mostly left unused.  1 searches for each
+# article separately.
+text_batch_size = 1
+
+# SQLite database the text server caches morelike search results in,
+# shared by all text server processes.  Results are used for up to
+# text_cache_ttl seconds, unless the article has been edited since, and
+# the least recently used ones are evicted beyond text_cache_size results.
+# None disables the cache.
+text_cache_path = None
+text_cache_ttl = 7 * 24 * 60 * 60
+text_cache_size = 100000
+
+# Directory with the text index snapshots built by bin/build-text-index.py
+# from pages-articles dumps, and the number of features terms are hashed
+# into.  For languages that have an index, the text server finds similar
+# articles in it instead of querying CirrusSearch.  None disables it.
+text_index_dir = None
+text_index_features = 2 ** 20
+
 # How many contributions do grab from the API to base our recommendations on?
 nedits = 128
 
@@ -1262,6 +1390,73 @@ coedit_min_threshold = 1
 coedit_assoc_threshold = 0.0001
 coedit_filter_threshold = 18
 
+## Maximum number of editors of a single article the co-edit recommender
+## considers as neighbours.  Editors of hub articles with more editors than
+## this are sampled deterministically (by a hash of their user name), which
+## bounds the work done for users who edit popular pages.  0 considers all
+## editors.  If coedit_hub_idf is set, the association of neighbours found
+## only through hub articles is also scaled down by
+## log(1 + coedit_hub_editors) / log(1 + number of editors).
+coedit_hub_editors = 0
+coedit_hub_idf = False
+
+## How the co-edit recommender finds neighbours and candidates:
+## 'sql' queries the revision table for every article and user,
+## 'batch' uses a handful of set-based queries against the revision table
+## (also used by the collaborator recommender), while
+## 'index' loads the revision table into an in-memory sparse matrix
+## per language and does the work there, and 'minhash' uses the same
+## in-memory index but finds neighbours through MinHash/LSH buckets,
+## which is approximate but much faster for popular articles.
+## 'itemitem' skips the neighbourhood altogether and sums the precomputed
+## similar articles of each article in the basket (see
+## coedit_similarity_table), the co-edit count of a candidate is then
+## the number of basket articles it is similar to.
+coedit_engine = "sql"
+
+## Number of seconds before an in-memory co-edit index is reloaded
+## from the revision table.
+coedit_index_max_age = 6 * 3600
+
+## Directory where the co-edit server keeps memory-mapped snapshots of
+## its in-memory co-edit indexes, so restarts don't have to reload them
+## from the revision table and all servers on a host share one copy.
+## None disables snapshots.
+coedit_snapshot_dir = None
+
+## Directory where the recent changes daemon logs the revisions it inserts
+## and expires (see suggestbot/utilities/deltalog.py), so running co-edit
+## indexes can apply them instead of reloading from the revision table.
+## Logs are rotated once they grow beyond coedit_delta_max_bytes, which
+## makes indexes reload.  Indexes check their log at most every
+## coedit_delta_interval seconds, and drop users and articles without
+## edits every coedit_delta_compact_interval seconds, writing a new
+## snapshot if snapshots are enabled.  None disables the delta logs.
+coedit_delta_dir = None
+coedit_delta_max_bytes = 256 * 1024 * 1024
+coedit_delta_interval = 60
+coedit_delta_compact_interval = 3600
+
+## MinHash/LSH settings for the 'minhash' co-edit engine: number of
+## hash functions per signature, number of bands they are split into
+## (must divide the number of hash functions), and the maximum number
+## of LSH candidates we calculate exact association for.  More bands
+## (of fewer rows each) and more candidates find more of the true
+## neighbourhood, at the cost of speed.
+coedit_minhash_perms = 64
+coedit_lsh_bands = 32
+coedit_lsh_candidates = 2000
+
+## Settings for building the item-item co-edit similarity tables:
+## number of similar articles kept per article, minimum number of
+## shared editors for two articles to be similar, users with more
+## articles than this are left out of the build (0 keeps everyone),
+## and number of worker processes.
+coedit_itemitem_k = 50
+coedit_itemitem_min_coeditors = 2
+coedit_itemitem_max_user_articles = 5000
+coedit_itemitem_workers = 4
+
 ## API endpoint URLs for access to page views and article quality predictions
 pageview_url = "https://wikimedia.org/api/rest_v1/metrics/pageviews/per-article/"
 ORES_url = "https://ores.wikimedia.org/v3/scores/"
@@ -31,6 +31,7 @@ from datetime import datetime
 from suggestbot import config
 from suggestbot.db import SuggestBotDatabase
 import suggestbot.utilities.popqual as sup
+from suggestbot.utilities.titleclass import FILTER_LIST, mapped_title_classes
 
 class RecFilter:
     def __init__(self, randomID=u'random', tooManyEdits=1):
@@ -64,6 +65,12 @@ class RecFilter:
         # list articles.
         self.listRegex = None
 
+        # Mapped title classes, keyed by language code, used instead of
+        # the list regex for articles that have been classified, and
+        # the classes of the language we're currently filtering for.
+        self.titleClasses = {}
+        self.langClasses = None
+
     def getRecs(self, user='', lang='en', recLists={}, edits={}, params={}):
         '''
         Find articles needing work from the given lists of recommendations,
@@ -126,6 +133,8 @@ class RecFilter:
 
         # Set up the list regex for this language
         self.listRegex = re.compile(config.list_re[lang])
+        self.langClasses = mapped_title_classes(config.title_class_dir, lang,
+                                                self.titleClasses)
 
         # The set of recommendations we'll return
         recs = {}
@@ -446,7 +455,7 @@ class RecFilter:
             # that it's not a list article, and that it's in the right category.
             if rec in recs \
                     or rec in edits \
-                    or self.listRegex.match(rec) \
+                    or self.isList(rec) \
                     or not self.inCategory(cat=cat, rec=rec):
                 continue
 
@@ -465,6 +474,20 @@ class RecFilter:
         # We must have failed.
         return(False)
 
+    def isList(self, rec):
+        '''
+        Decide if a recommendation is a list article, using its title
+        class if it has been classified and the list regex otherwise.
+
+        :param rec: title of the recommended article
+        :type rec: str
+        '''
+        if self.langClasses is not None:
+            flags = self.langClasses.title_flags(rec)
+            if flags is not None:
+                return(bool(flags & FILTER_LIST))
+        return(self.listRegex.match(rec) is not None)
+
     def inCategory(self, cat, rec):
         """
         Decide if a recommendation is in the given category.
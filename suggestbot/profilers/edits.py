@@ -33,6 +33,7 @@ from datetime import datetime, timedelta
 import pywikibot
 
 from suggestbot import config
+from suggestbot.utilities.sites import get_site
 import suggestbot.utilities.reverts as sur
 
 class EditProfiler:
@@ -130,7 +131,7 @@ class EditProfiler:
 
         logging.info("Building profile {lang}:{username}".format(lang=lang, username=username))
         
-        site = pywikibot.Site(lang)
+        site = get_site(lang)
 
         # Default profile
         profile = {'interests' : {},
@@ -264,7 +265,7 @@ class EditProfiler:
         # List of edits (as dicts) we'll return
         user_edits = []
 
-        site = pywikibot.Site(lang)
+        site = get_site(lang)
         query = pywikibot.data.api.Request(site=site, action="query")
         query['list'] = "usercontribs"
         query['ucnamespace'] = 0
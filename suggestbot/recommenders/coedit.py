@@ -21,25 +21,65 @@ Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
 Boston, MA  02110-1301, USA.
 '''
 
+import os
 import sys
+import time
 import logging
 
+import numpy as np
+
 from suggestbot import config
 from suggestbot import db
+from suggestbot.recommenders.coeditindex import CoeditIndex, snapshot_path
+from suggestbot.recommenders.minhash import MinHashIndex
+from suggestbot.utilities.snapshot import SnapshotError
+from suggestbot.recommenders.neighbours import NeighbourFinder, \
+    EDITOR_HASH_SQL, hub_cutoff, hub_weight
 
 from operator import itemgetter
+from more_itertools import chunked
+
+# Number of most associated users whose edits we gather recommendations from
+NHOOD_SIZE = 250
+
+# Engines (see config.coedit_engine) that use the in-memory co-edit index
+INDEX_ENGINES = ('index', 'minhash')
 
 class Recommender:
-    def __init__(self):
+    def __init__(self, snapshot_dir=None):
+        '''
+        Instantiate a co-edit recommender.
+
+        :param snapshot_dir: directory of co-edit index snapshots, indexes
+                             are mapped from there if possible and
+                             written there when loaded from the database
+        :type snapshot_dir: str
+        '''
         # Easier to have these SQL queries as global variables,
         # rather than pass them around.  Does make for possible
         # errors if they're not prepared properly before execution, though.
         self.get_articles_by_user_query = ''
         self.get_articles_by_expert_user_query = ''
         self.get_editcount_query = ''
+        self.editcounts = {}
 
         self.dbconn = None
         self.dbcursor = None
+
+        # In-memory co-edit indexes, mapping language codes
+        # to CoeditIndex objects, used if config.coedit_engine is 'index'
+        # or 'minhash'.
+        self.indexes = {}
+        self.snapshot_dir = snapshot_dir
+
+        # When we last checked the delta log of each language
+        self.delta_checked = {}
+
+        # MinHash LSH indexes, mapping language codes to a tuple of the
+        # CoeditIndex they were built from, when it was last compacted
+        # (user IDs don't change in between), and the MinHashIndex,
+        # used if config.coedit_engine is 'minhash'.
+        self.lsh_indexes = {}
         
     def recommend(self, username, lang, user_edits,
                   nrecs=None, threshold=None,
@@ -70,6 +110,8 @@ class Recommender:
             'min-threshold' : config.coedit_min_threshold,
             'association-threshold': config.coedit_assoc_threshold,
             'filter-threshold' : config.coedit_filter_threshold,
+            'hub-editors': config.coedit_hub_editors,
+            'hub-idf': config.coedit_hub_idf,
         }
 
         if backoff is not None and backoff != params['backoff']:
@@ -82,16 +124,20 @@ class Recommender:
             params['threshold'] = threshold
 
         if min_threshold:
-            param['min-threshold'] = min_threshold
+            params['min-threshold'] = min_threshold
 
         sys.stderr.write("Got request to recommend {} articles to {}:User:{} based on {} edited articles\n".format(
             params['nrecs'], lang, username, len(user_edits)))
 
-        # Get some recs.
-        recs = self.get_recs_at_coedit_threshold(lang, username,
-                                                 user_edits, params)
+        # Find candidates and their co-edit counts once, then
+        # rank them at each threshold we're allowed to back off to.
+        (rec_map, coedit_count) = self.get_candidates(lang, username,
+                                                      user_edits, params)
+        ranked = sorted(rec_map.items(), key=itemgetter(1), reverse=True)
 
         # sys.stderr.write("Got {} recs back\n".format(len(recs)))
+        recs = self.rank_at_threshold(ranked, coedit_count,
+                                      params['threshold'], params['nrecs'])
         
         # If we're allowed to back off on the coedit threshold and don't
         # have enough recs, ease off on the threshold and try again.
@@ -100,15 +146,65 @@ class Recommender:
               and (len(recs) < params['nrecs']):
             # sys.stderr.write("Backing off threshold...\n")
             params['threshold'] -= 1
-            recs = self.get_recs_at_coedit_threshold(lang, username,
-                                                     user_edits, params)
+            recs = self.rank_at_threshold(ranked, coedit_count,
+                                          params['threshold'],
+                                          params['nrecs'])
 
         sys.stderr.write("Done recommeding for {}:User:{}, returning {} recommendations\n".format(lang, username, len(recs)))
 
         # OK, done
         return(recs[:params['nrecs']])
 
-    def get_recs_at_coedit_threshold(self, lang, username, contribs, params):
+    def get_candidates(self, lang, username, contribs, params):
+        '''
+        Find candidate articles for the given user using the engine
+        set in config.coedit_engine.
+
+        Returns a tuple of two dictionaries, both keyed by page title,
+        the first maps to the candidate's score, the second to its
+        co-edit count.
+
+        :param lang: Language code of the Wikipedia we're on
+        :param username: Name of the user we're recommending to
+        :param contribs: Titles of the articles the user edited
+        :param params: Recommendation parameters, as set up by `recommend()`
+        '''
+        if config.coedit_engine == 'index':
+            return(self.get_index_candidates(lang, username, contribs, params))
+        if config.coedit_engine == 'minhash':
+            return(self.get_minhash_candidates(lang, username, contribs, params))
+        if config.coedit_engine == 'batch':
+            return(self.get_batch_candidates(lang, username, contribs, params))
+        if config.coedit_engine == 'itemitem' \
+           and lang in config.coedit_similarity_table:
+            return(self.get_itemitem_candidates(lang, username, contribs, params))
+        return(self.get_sql_candidates(lang, username, contribs, params))
+
+    def rank_at_threshold(self, ranked, coedit_count, threshold, nrecs):
+        '''
+        Pick the `nrecs` highest scoring candidates that have a co-edit
+        count of at least `threshold`.
+
+        :param ranked: (title, score) tuples, sorted by descending score
+        :type ranked: list
+        :param coedit_count: Co-edit count of each candidate
+        :type coedit_count: dict
+        :param threshold: Minimum co-edit count
+        :type threshold: int
+        :param nrecs: Number of recommendations to return
+        :type nrecs: int
+        '''
+        recs = []
+        for (item, value) in ranked:
+            if coedit_count[item] < threshold:
+                continue
+            recs.append({'item': item,
+                         'value': value})
+            if len(recs) == nrecs:
+                break
+        return(recs)
+
+    def get_sql_candidates(self, lang, username, contribs, params):
         # NOTE: because rev_user and rev_title currently are VARCHAR(255) and
         # UTF-8, they're assumed to consume ~765 bytes in memory, and
         # therefore MySQL chooses to use a temp file table rather than
@@ -137,6 +233,11 @@ class Recommender:
                  OR rev_comment_is_revert=1)""".format(
                      config.revision_table[lang])
 
+        # For hub articles, both queries only ask for a deterministic
+        # sample of the editors, see NeighbourFinder.sampled_editors()
+        sample_clause = """
+            AND {} < %(cutoff)s""".format(EDITOR_HASH_SQL)
+
         # Query to get edited articles for a given user if the user is
         # below the edit threshold.
         self.get_articles_by_user_query = """
@@ -171,15 +272,16 @@ class Recommender:
         # Neighbours must have at least this much association.
         association_threshold = params['association-threshold']
 
-        # Recommendations we found
-        recs = []
-        
         sbdb = db.SuggestBotDatabase()
         if not sbdb.connect():
             logging.error("Unable to connect to the SuggestBot database")
-            return(recs)
+            return({}, {})
 
         (self.dbconn, self.dbcursor) = sbdb.getConnection()
+        finder = NeighbourFinder(self.dbcursor, lang)
+
+        # Edit counts of the users we've looked up
+        self.editcounts = {}
         
         rec_map = {}
 
@@ -192,15 +294,32 @@ class Recommender:
         user_assoc = {}
         user_shared = {}
 
-        for item in contribs:
+        # Articles with too many editors to consider all of them.
+        # We go through the articles by increasing number of editors so
+        # a user is first found through the article with the highest
+        # hub weight.
+        hubs = finder.hub_articles(contribs, params['hub-editors'])
+        if hubs:
+            logging.info("Sampling editors of {} hub articles".format(
+                len(hubs)))
+
+        for item in sorted(contribs, key=lambda title: hubs.get(title, 0)):
 	    # For each article the user has edited, find other editors.
             other_editors = {}
             # sys.stderr.write("Looking for contributors to {}\n".format(item))
 
+            query_args = {'title': item.encode('utf-8')}
+            users_query = get_users_by_article_query
+            minor_users_query = get_minor_users_by_article_query
+            if item in hubs:
+                query_args['cutoff'] = hub_cutoff(hubs[item],
+                                                  params['hub-editors'])
+                users_query += sample_clause
+                minor_users_query += sample_clause
+
 	    # First we get major stakeholders in the article
             # (non-minor/non-reverting edits)
-            self.dbcursor.execute(get_users_by_article_query,
-                             {'title': item.encode('utf-8')})
+            self.dbcursor.execute(users_query, query_args)
             for row in self.dbcursor:
                 # Only compute each thing once
                 user = row['rev_user'].decode('utf-8')
@@ -220,8 +339,7 @@ class Recommender:
 
 	    # Users we've seen (so we don't re-run SQL queries all the time)...
             seen_minors = {}
-            self.dbcursor.execute(get_minor_users_by_article_query,
-                             {'title' : item.encode('utf-8')})
+            self.dbcursor.execute(minor_users_query, query_args)
 
             # Note: using fetchall() to allow us to execute further queries
             for row in self.dbcursor.fetchall():
@@ -246,12 +364,16 @@ class Recommender:
                 # Passed tests, add as a minor user
                 seen_minors[user] = 1
 
+            # Look up edit counts of all the article's stakeholders
+            # in one go, we need them for the association as well.
+            self.editcounts.update(
+                {user: stats.num_edits for (user, stats)
+                 in finder.user_stats(list(other_editors.keys())
+                                      + list(seen_minors.keys())).items()})
+
+            for user in seen_minors.keys():
 	        # Is user above threshold?  If so, skip...
-                self.dbcursor.execute(self.get_editcount_query,
-                                      {'username': user.encode('utf-8')})
-                nedit_row = self.dbcursor.fetchone()
-                self.dbcursor.fetchall() # flush cursor
-                if nedit_row['num_edits'] >= params['filter-threshold']:
+                if self.get_editcount(user) >= params['filter-threshold']:
                     continue
 
                 # Passed all criteria, adding the user
@@ -265,6 +387,8 @@ class Recommender:
 
                 (assoc, shared) = self.user_association(
                     user, contribs, params['filter-threshold'])
+                if params['hub-idf'] and item in hubs:
+                    assoc *= hub_weight(hubs[item], params['hub-editors'])
                 if assoc < association_threshold:
                     continue
 
@@ -275,9 +399,9 @@ class Recommender:
             len(user_assoc)))
 
         # Find nhood of top k users
-        k = 250  # Larger nhood for more recs, hopefully
+        k = NHOOD_SIZE  # Larger nhood for more recs, hopefully
         nhood = sorted(user_assoc,
-                       key=itemgetter(1),
+                       key=user_assoc.get,
                        reverse=True)[:k]
 
         # Gather up preds
@@ -312,24 +436,311 @@ class Recommender:
 
         # sys.stderr.write("Took out all known articles by user, now {} recs\n".format(len(rec_map)))
         
-        # Filter by coedit thresh
-        rec_map = {k:v for k,v in rec_map.items()
-                   if coedit_count[k] >= params['threshold']}
-
-        # sys.stderr.write("Filtered by coedit threshold, now {} recs\n".format(len(rec_map)))
-        
         # Done with the database, disconnect
         self.dbconn = None
         self.dbcursor = None
         sbdb.disconnect()
-        
-        # Rank 'em and spit out 'nrecs' of them
-        for (item, value) in sorted(rec_map.items(),
-                                    key=itemgetter(1),
-                                    reverse=True)[:params['nrecs']]:
-            recs.append({'item': item,
-                         'value': value})
-        return(recs)
+
+        # Filtering by coedit thresh is done by the caller
+        return(rec_map, coedit_count)
+
+    def get_batch_candidates(self, lang, username, contribs, params):
+        '''
+        Same as `get_sql_candidates()`, but finding neighbours and their
+        shared articles with a handful of set-based queries rather than
+        a few queries per article and per user.
+        '''
+        sbdb = db.SuggestBotDatabase()
+        if not sbdb.connect():
+            logging.error("Unable to connect to the SuggestBot database")
+            return({}, {})
+
+        (self.dbconn, self.dbcursor) = sbdb.getConnection()
+        finder = NeighbourFinder(self.dbcursor, lang)
+
+        neighbours = finder.find(username, contribs,
+                                 params['filter-threshold'],
+                                 params['association-threshold'],
+                                 max_editors=params['hub-editors'],
+                                 hub_idf=params['hub-idf'])
+        user_assoc = {user: assoc
+                      for (user, (assoc, shared)) in neighbours.items()}
+
+        # Find nhood of top k users
+        nhood = sorted(user_assoc,
+                       key=user_assoc.get,
+                       reverse=True)[:NHOOD_SIZE]
+
+        # Gather up preds
+        rec_map = {}
+        coedit_count = {}
+        for (user, new_item) in finder.articles_by_users(nhood):
+            rec_map[new_item] = rec_map.get(new_item, 0) + user_assoc[user]
+            coedit_count[new_item] = coedit_count.get(new_item, 0) + 1
+
+        # Take out items already given and items from user
+        for item in contribs:
+            rec_map.pop(item, None)
+        for (user, page_title) in finder.articles_by_users([username]):
+            rec_map.pop(page_title, None)
+
+        self.dbconn = None
+        self.dbcursor = None
+        sbdb.disconnect()
+
+        return(rec_map, coedit_count)
+
+    def get_itemitem_candidates(self, lang, username, contribs, params):
+        '''
+        Same as `get_sql_candidates()`, but scoring candidates by summing
+        the precomputed similarities between them and the articles in the
+        basket (see bin/build-coedit-similarity.py), rather than going
+        through a neighbourhood of users.  The co-edit count of a candidate
+        is the number of basket articles it is similar to.
+        '''
+        similar_query = """
+            SELECT cs_neighbour,
+                   SUM(cs_score) AS score,
+                   COUNT(*) AS support
+            FROM {}
+            WHERE cs_title IN ({{titles}})
+            GROUP BY cs_neighbour""".format(
+                config.coedit_similarity_table[lang])
+
+        sbdb = db.SuggestBotDatabase()
+        if not sbdb.connect():
+            logging.error("Unable to connect to the SuggestBot database")
+            return({}, {})
+
+        (self.dbconn, self.dbcursor) = sbdb.getConnection()
+        finder = NeighbourFinder(self.dbcursor, lang)
+
+        rec_map = {}
+        coedit_count = {}
+        for subset in chunked(contribs, finder.slice_size):
+            titles = [title.encode('utf-8') for title in subset]
+            self.dbcursor.execute(
+                similar_query.format(titles=','.join(['%s'] * len(titles))),
+                titles)
+            for row in self.dbcursor.fetchall():
+                new_item = row['cs_neighbour'].decode('utf-8')
+                rec_map[new_item] = rec_map.get(new_item, 0) + row['score']
+                coedit_count[new_item] = coedit_count.get(new_item, 0) \
+                                         + row['support']
+
+        # Take out items already given and items from user
+        for item in contribs:
+            rec_map.pop(item, None)
+        for (user, page_title) in finder.articles_by_users([username]):
+            rec_map.pop(page_title, None)
+
+        self.dbconn = None
+        self.dbcursor = None
+        sbdb.disconnect()
+
+        return(rec_map, coedit_count)
+
+    def get_index(self, lang):
+        '''
+        Get the in-memory co-edit index for the given language, loading
+        it if we don't have one or the one we have is too old.
+
+        :param lang: Language code of the Wikipedia we're on
+        '''
+        index = self.indexes.get(lang)
+        if index is None and self.snapshot_dir:
+            index = self.load_snapshot(lang)
+        if index is not None and not self.update_index(index):
+            # Changes were lost, only a reload will do
+            index.loaded = None
+        if index is None or index.age() > config.coedit_index_max_age:
+            new_index = CoeditIndex(lang)
+            if new_index.load():
+                index = new_index
+                self.indexes[lang] = index
+                if self.snapshot_dir:
+                    self.save_snapshot(index)
+            elif index is not None:
+                logging.warning("Failed to reload co-edit index for {}wiki, using the old one".format(lang))
+        return(index)
+
+    def update_index(self, index):
+        '''
+        Apply recent changes from the delta log to the given co-edit
+        index, at most every config.coedit_delta_interval seconds, and
+        write a new snapshot whenever the index has been compacted.
+        Returns False if changes were lost and the index needs reloading.
+
+        :param index: The co-edit index to update
+        '''
+        now = time.time()
+        if now - self.delta_checked.get(index.lang, 0) < config.coedit_delta_interval:
+            return(True)
+        self.delta_checked[index.lang] = now
+
+        compacted = index.compacted
+        if not index.apply_deltas(config.coedit_delta_compact_interval):
+            return(False)
+        if self.snapshot_dir and index.compacted != compacted:
+            self.save_snapshot(index)
+        return(True)
+
+    def load_snapshot(self, lang):
+        '''
+        Map the co-edit index for the given language from its snapshot
+        in `self.snapshot_dir`, if there is one.  Returns the index,
+        or None if there is no usable snapshot.
+
+        :param lang: Language code of the Wikipedia we're on
+        '''
+        path = snapshot_path(self.snapshot_dir, lang)
+        if not os.path.exists(path):
+            return(None)
+
+        index = CoeditIndex(lang)
+        try:
+            if not index.load_snapshot(path):
+                return(None)
+        except (OSError, ValueError, KeyError, SnapshotError) as e:
+            logging.warning("Unable to read co-edit index snapshot {}: {}".format(path, e))
+            return(None)
+
+        self.indexes[lang] = index
+        return(index)
+
+    def save_snapshot(self, index):
+        '''
+        Write a snapshot of the given co-edit index to `self.snapshot_dir`.
+
+        :param index: The co-edit index to write
+        '''
+        try:
+            index.save_snapshot(snapshot_path(self.snapshot_dir, index.lang))
+        except OSError as e:
+            logging.warning("Unable to write co-edit index snapshot: {}".format(e))
+
+    def get_index_candidates(self, lang, username, contribs, params):
+        '''
+        Same as `get_sql_candidates()`, but using the in-memory
+        co-edit index for the given language rather than querying
+        the revision table.
+        '''
+        index = self.get_index(lang)
+        if index is None:
+            logging.error("No co-edit index available for {}wiki".format(lang))
+            return({}, {})
+
+        (nhood, assoc) = index.neighbours(username, contribs,
+                                          params['filter-threshold'],
+                                          params['association-threshold'],
+                                          k=NHOOD_SIZE,
+                                          max_editors=params['hub-editors'],
+                                          hub_idf=params['hub-idf'])
+        return(self.score_index_nhood(index, username, contribs,
+                                      nhood, assoc))
+
+    def get_lsh_index(self, lang, index, exp_threshold):
+        '''
+        Get the MinHash LSH index for the given language, (re)building it
+        if the co-edit index has been reloaded or compacted, or the
+        experience threshold has changed since it was built.  Changes
+        applied from the delta log in between only show up in the exact
+        association of the candidates it finds.
+
+        :param lang: Language code of the Wikipedia we're on
+        :param index: The language's current co-edit index
+        :param exp_threshold: Number of edits to be an experienced user
+        '''
+        (built_from, compacted, lsh) = self.lsh_indexes.get(
+            lang, (None, None, None))
+        if built_from is not index or compacted != index.compacted \
+           or lsh.exp_threshold != exp_threshold:
+            lsh = MinHashIndex(num_perm=config.coedit_minhash_perms,
+                               bands=config.coedit_lsh_bands)
+            lsh.build(index, exp_threshold)
+            self.lsh_indexes[lang] = (index, index.compacted, lsh)
+        return(lsh)
+
+    def get_minhash_candidates(self, lang, username, contribs, params):
+        '''
+        Same as `get_index_candidates()`, but only calculating association
+        for the users that share an LSH bucket with the basket, rather
+        than every editor of every article in it.  The neighbourhood is
+        therefore approximate, while the association of each neighbour
+        is exact.
+        '''
+        index = self.get_index(lang)
+        if index is None:
+            logging.error("No co-edit index available for {}wiki".format(lang))
+            return({}, {})
+
+        lsh = self.get_lsh_index(lang, index, params['filter-threshold'])
+        candidates = lsh.query(index.article_ids(contribs),
+                               config.coedit_lsh_candidates)
+
+        user_id = index.users.get(username)
+        if user_id is not None:
+            candidates = candidates[candidates != user_id]
+
+        (assoc, shared) = index.association(candidates, contribs,
+                                            params['filter-threshold'])
+        keep = (shared > 0) & (assoc >= params['association-threshold'])
+        candidates = candidates[keep]
+        assoc = assoc[keep]
+
+        logging.info("Found {} pre-neighbours".format(len(candidates)))
+
+        order = np.argsort(-assoc, kind='stable')[:NHOOD_SIZE]
+        return(self.score_index_nhood(index, username, contribs,
+                                      candidates[order], assoc[order]))
+
+    def score_index_nhood(self, index, username, contribs, nhood, assoc):
+        '''
+        Score the articles edited by a neighbourhood found in a co-edit
+        index, leaving out the articles in the basket and any article
+        the user edited.  Returns the same tuple as `get_candidates()`.
+
+        :param index: The co-edit index the neighbourhood was found in
+        :param username: Name of the user we're recommending to
+        :param contribs: Titles of the articles the user edited
+        :param nhood: User IDs of the neighbours
+        :param assoc: Association of each neighbour
+        '''
+        (article_ids, scores, counts) = index.score(nhood, assoc)
+
+        # Take out items already given and items edited by the user,
+        # filtering by coedit thresh is done by the caller
+        keep = ~np.isin(article_ids, index.article_ids(contribs)) \
+               & ~np.isin(article_ids, index.articles_by_user(username))
+
+        rec_map = {}
+        coedit_count = {}
+        for (article_id, score, count) in zip(article_ids[keep].tolist(),
+                                              scores[keep].tolist(),
+                                              counts[keep].tolist()):
+            title = index.articles[article_id]
+            rec_map[title] = score
+            coedit_count[title] = count
+        return(rec_map, coedit_count)
+
+    def get_editcount(self, user):
+        '''
+        Get the number of edits the given user has made (in our dataset),
+        preferably from the counts we've already looked up in bulk.
+
+        :param user: The user we're examining.
+        '''
+        try:
+            return(self.editcounts[user])
+        except KeyError:
+            pass
+
+        self.dbcursor.execute(self.get_editcount_query,
+                              {'username': user.encode('utf-8')})
+        row = self.dbcursor.fetchone()
+        self.dbcursor.fetchall() # flush cursor
+        self.editcounts[user] = row['num_edits']
+        return(row['num_edits'])
 
     def user_association(self, user, basket_ref, exp_threshold):
         '''
@@ -347,11 +758,7 @@ class Recommender:
         # If they are (as defined by filter-threshold) we'll only use
         # non-minor, non-reverting article edits for comparison.
         # Otherwise, we use all articles the user edited.
-        self.dbcursor.execute(self.get_editcount_query,
-                              {'username': user.encode('utf-8')})
-        row = self.dbcursor.fetchone()
-        self.dbcursor.fetchall() # flush cursor
-        user_editcount = row['num_edits']
+        user_editcount = self.get_editcount(user)
 
         user_query = self.get_articles_by_user_query # default is non-expert
         if user_editcount >= exp_threshold:
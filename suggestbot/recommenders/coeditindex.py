@@ -0,0 +1,762 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+'''
+In-memory sparse index of who edited which article, used by the co-edit
+recommender to find neighbours and score candidates without issuing
+queries against the revision table for every article and user.
+
+Copyright (C) 2016 SuggestBot Dev Group
+
+This library is free software; you can redistribute it and/or
+modify it under the terms of the GNU Library General Public
+License as published by the Free Software Foundation; either
+version 2 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+Library General Public License for more details.
+
+You should have received a copy of the GNU Library General Public
+License along with this library; if not, write to the
+Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+Boston, MA  02110-1301, USA.
+'''
+
+import os
+import time
+import array
+import logging
+
+import numpy as np
+import scipy.sparse as sp
+
+import MySQLdb
+
+from more_itertools import chunked
+
+from suggestbot import config
+from suggestbot import db
+from suggestbot.utilities.snapshot import read_snapshot, write_snapshot, \
+    string_table_arrays, StringTable
+from suggestbot.utilities.deltalog import delta_log_path, log_position, \
+    read_deltas
+from suggestbot.recommenders.neighbours import editor_hash, \
+    hub_cutoff, hub_weight
+
+def snapshot_path(directory, lang):
+    '''
+    Path of the co-edit index snapshot for the given language.
+
+    :param directory: directory where snapshots are kept
+    :type directory: str
+
+    :param lang: language code of the Wikipedia the index is for
+    :type lang: str
+    '''
+    return(os.path.join(directory, '{}wiki-coedit.snapshot'.format(lang)))
+
+class Interner:
+    '''
+    Two-way mapping between strings (user names or article titles)
+    and dense integer IDs, assigned in order of first appearance.
+    '''
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def intern(self, name):
+        '''
+        Get the ID of the given name, assigning a new one if necessary.
+
+        :param name: the name to look up
+        :type name: str
+        '''
+        try:
+            return(self.ids[name])
+        except KeyError:
+            new_id = len(self.names)
+            self.ids[name] = new_id
+            self.names.append(name)
+            return(new_id)
+
+    def get(self, name, default=None):
+        return(self.ids.get(name, default))
+
+    def __getitem__(self, name_id):
+        return(self.names[name_id])
+
+    def __contains__(self, name):
+        return(name in self.ids)
+
+    def __len__(self):
+        return(len(self.names))
+
+    def __iter__(self):
+        return(iter(self.names))
+
+class CoeditIndex:
+    def __init__(self, lang):
+        '''
+        Instantiate an empty index for the given language.  Call `load()`
+        to populate it from the revision table.
+
+        :param lang: language code of the Wikipedia we're indexing
+        :type lang: str
+        '''
+        self.lang = lang
+
+        self.users = Interner()
+        self.articles = Interner()
+
+        # Users × articles, the value of a cell is the number of edits
+        # the user made to the article.  `by_article` is the transpose,
+        # kept so that looking up the editors of an article is a row slice.
+        self.by_user = None
+        self.by_article = None
+
+        # Same as above, but only counting non-minor, non-reverting edits,
+        # which is what we use to compare experienced users.
+        self.major_by_user = None
+        self.major_by_article = None
+
+        # Per-user totals: number of edits, number of distinct articles
+        # edited, and number of articles with non-minor, non-reverting edits.
+        self.user_edits = None
+        self.user_articles = None
+        self.user_major_articles = None
+
+        # When this index was populated (seconds since the epoch)
+        self.loaded = None
+
+        # Version of the data in this index, increased every time it
+        # changes, and stored in snapshots
+        self.version = 0
+
+        # Position in the delta log (see `apply_deltas()`) up to which
+        # changes are included in this index, as inode and offset
+        self.delta_inode = None
+        self.delta_offset = 0
+
+        # When we last removed users and articles without edits
+        # from the index (seconds since the epoch)
+        self.compacted = None
+
+        # Cached result of `effective_sets()`, a tuple of the
+        # experience threshold and the matrix
+        self._effective = None
+
+        # Cached result of `editor_hashes()`
+        self._hashes = None
+
+    def load(self):
+        '''
+        Populate the index from the language's revision table.  Rows are
+        aggregated per user and article by the database and streamed
+        through a server-side cursor so we never hold the full result set.
+
+        The table is read from a consistent snapshot, and changes logged
+        while we read it are then applied unless the snapshot already
+        has them, so none are missed or counted twice.
+        '''
+
+        index_query = """SELECT rev_user, rev_title,
+                                COUNT(*) AS num_edits,
+                                SUM(rev_is_minor=0
+                                    AND rev_comment_is_revert=0) AS num_major
+                         FROM {}
+                         GROUP BY rev_user, rev_title""".format(
+                             config.revision_table[self.lang])
+
+        sbdb = db.SuggestBotDatabase()
+        if not sbdb.connect():
+            logging.error("Unable to connect to the SuggestBot database")
+            return(False)
+
+        (dbconn, dbcursor) = sbdb.getConnection()
+
+        # Changes logged before we read the table are included in it,
+        # those logged from here on might be (the daemon commits them
+        # before logging them), we sort that out below.
+        if config.coedit_delta_dir:
+            delta_path = delta_log_path(config.coedit_delta_dir, self.lang)
+            (self.delta_inode, self.delta_offset) = log_position(delta_path)
+
+        self.users = Interner()
+        self.articles = Interner()
+        user_ids = array.array('i')
+        article_ids = array.array('i')
+        num_edits = array.array('i')
+        num_major = array.array('i')
+
+        logging.info("loading co-edit index for {}wiki".format(self.lang))
+        start = time.time()
+
+        entries = []
+        ss_cursor = db.cursor(dbconn, 'ss')
+        try:
+            dbcursor.execute('START TRANSACTION WITH CONSISTENT SNAPSHOT')
+            ss_cursor.execute(index_query)
+            for (user, title, n_edits, n_major) in ss_cursor:
+                user_ids.append(self.users.intern(user.decode('utf-8')))
+                article_ids.append(self.articles.intern(title.decode('utf-8')))
+                num_edits.append(n_edits)
+                num_major.append(int(n_major or 0))
+            ss_cursor.close()
+
+            # Changes logged while we read the table, leaving out
+            # those that are in the snapshot we read
+            if config.coedit_delta_dir:
+                result = read_deltas(delta_path, self.delta_inode,
+                                     self.delta_offset)
+                if result is None:
+                    logging.error("delta log for {}wiki was rotated while loading the co-edit index".format(self.lang))
+                    sbdb.disconnect()
+                    return(False)
+                (entries, self.delta_inode, self.delta_offset) = result
+                entries = self.unread_deltas(dbcursor, entries)
+            dbconn.rollback()
+        except MySQLdb.Error as e:
+            logging.error("Unable to read the revision table for {}wiki".format(self.lang))
+            logging.error("MySQL Error {}: {}".format(e.args[0], e.args[1]))
+            ss_cursor.close()
+            sbdb.disconnect()
+            return(False)
+
+        sbdb.disconnect()
+
+        self.build(np.frombuffer(user_ids, dtype=np.int32),
+                   np.frombuffer(article_ids, dtype=np.int32),
+                   np.frombuffer(num_edits, dtype=np.int32),
+                   np.frombuffer(num_major, dtype=np.int32))
+        if entries:
+            self.apply_entries(entries)
+            self._update()
+
+        logging.info("loaded {} edits by {} users to {} articles in {:.1f} seconds".format(
+            self.by_user.nnz, len(self.users), len(self.articles),
+            time.time() - start))
+        return(True)
+
+    def build(self, user_ids, article_ids, num_edits, num_major):
+        '''
+        Build the sparse matrices from parallel arrays of user IDs,
+        article IDs, number of edits and number of non-minor, non-reverting
+        edits, one entry per (user, article) pair.
+        '''
+        shape = (len(self.users), len(self.articles))
+
+        self.by_user = sp.csr_matrix(
+            (num_edits, (user_ids, article_ids)), shape=shape)
+        self.major_by_user = sp.csr_matrix(
+            (num_major, (user_ids, article_ids)), shape=shape)
+        self.major_by_user.eliminate_zeros()
+
+        self.loaded = time.time()
+        self.compacted = self.loaded
+        self._update()
+
+    def _update(self):
+        '''
+        Recalculate everything derived from `by_user` and `major_by_user`
+        after they have changed, and bump the version.
+        '''
+        self.by_article = self.by_user.T.tocsr()
+        self.major_by_article = self.major_by_user.T.tocsr()
+
+        self.user_edits = np.asarray(self.by_user.sum(axis=1)).ravel()
+        self.user_articles = np.diff(self.by_user.indptr)
+        self.user_major_articles = np.diff(self.major_by_user.indptr)
+
+        self.version += 1
+        self._effective = None
+        self._hashes = None
+
+    def apply_deltas(self, compact_interval=3600):
+        '''
+        Apply the revisions inserted and expired since we last read the
+        language's delta log (see suggestbot.utilities.deltalog): new
+        users, articles and edits are added, and expired edits subtracted.
+        Users and articles left without edits keep their IDs until the
+        index is compacted, which happens if it is more than
+        `compact_interval` seconds since the last time.
+
+        Returns False if entries were lost because the log was rotated,
+        in which case the index should be reloaded from the database.
+
+        :param compact_interval: seconds between compactions
+        :type compact_interval: int
+        '''
+        if not config.coedit_delta_dir:
+            return(True)
+
+        result = read_deltas(delta_log_path(config.coedit_delta_dir, self.lang),
+                             self.delta_inode, self.delta_offset)
+        if result is None:
+            logging.warning("delta log for {}wiki was rotated, co-edit index needs reloading".format(self.lang))
+            return(False)
+
+        (entries, self.delta_inode, self.delta_offset) = result
+        if not entries:
+            return(True)
+
+        self.apply_entries(entries)
+        if self.compacted is None \
+           or time.time() - self.compacted > compact_interval:
+            self.compact()
+        self._update()
+
+        logging.info("applied {} delta log entries to the co-edit index for {}wiki, now at version {}".format(
+            len(entries), self.lang, self.version))
+        return(True)
+
+    def unread_deltas(self, db_cursor, entries, slice_size=500):
+        '''
+        Get the delta log entries whose changes are not in the revision
+        table as the given cursor sees it: revisions it doesn't have,
+        and expiries of revisions it still has.  Entries without a key
+        (see suggestbot.utilities.deltalog) are assumed not to be.
+
+        :param db_cursor: dictionary cursor on the SuggestBot database
+        :type db_cursor: MySQLdb.cursors.DictCursor
+
+        :param entries: delta log entries
+        :type entries: list
+
+        :param slice_size: number of revision IDs to look up per query
+        :type slice_size: int
+        '''
+        table = config.revision_table[self.lang]
+
+        rev_ids = [int(key) for (sign, user, title, n_edits, n_major, key)
+                   in entries if sign == '+' and key is not None]
+        known_revisions = set()
+        for subset in chunked(rev_ids, slice_size):
+            db_cursor.execute('''SELECT rev_id FROM {}
+                                 WHERE rev_id IN ({})'''.format(
+                                     table, ','.join(['%s'] * len(subset))),
+                              subset)
+            known_revisions.update(row['rev_id'] for row in db_cursor.fetchall())
+
+        # An expiry is in the table if it has no revisions older than
+        # the cutoff left
+        applied_expiries = set()
+        for cutoff in set(key for (sign, user, title, n_edits, n_major, key)
+                          in entries if sign == '-' and key is not None):
+            db_cursor.execute('''SELECT rev_id FROM {}
+                                 WHERE rev_timestamp < %s
+                                 LIMIT 1'''.format(table), (cutoff,))
+            if not db_cursor.fetchall():
+                applied_expiries.add(cutoff)
+
+        unread = []
+        for entry in entries:
+            (sign, user, title, n_edits, n_major, key) = entry
+            if key is not None:
+                if sign == '+' and int(key) in known_revisions:
+                    continue
+                if sign == '-' and key in applied_expiries:
+                    continue
+            unread.append(entry)
+
+        logging.info("{} of {} changes logged while loading the co-edit index for {}wiki were not in the table".format(
+            len(unread), len(entries), self.lang))
+        return(unread)
+
+    def apply_entries(self, entries):
+        '''
+        Apply delta log entries to the matrices (see `apply_deltas()`).
+        Call `_update()` afterwards.
+
+        :param entries: delta log entries
+        :type entries: list
+        '''
+        # A mapped snapshot's names are read-only,
+        # switch to ones we can add to.
+        if not isinstance(self.users, Interner):
+            self.users = self._to_interner(self.users)
+            self.articles = self._to_interner(self.articles)
+
+        user_ids = []
+        article_ids = []
+        num_edits = []
+        num_major = []
+        for (sign, user, title, n_edits, n_major, key) in entries:
+            if sign == '-':
+                # Expired edits of someone or something we don't know,
+                # e.g. because they were in the table when it was read
+                if user not in self.users or title not in self.articles:
+                    continue
+                n_edits = -n_edits
+                n_major = -n_major
+            user_ids.append(self.users.intern(user))
+            article_ids.append(self.articles.intern(title))
+            num_edits.append(n_edits)
+            num_major.append(n_major)
+
+        shape = (len(self.users), len(self.articles))
+        changed = []
+        for (name, values) in [('by_user', num_edits),
+                               ('major_by_user', num_major)]:
+            delta = sp.csr_matrix((np.array(values, dtype=np.int32),
+                                   (np.array(user_ids, dtype=np.int32),
+                                    np.array(article_ids, dtype=np.int32))),
+                                  shape=shape)
+            matrix = self._grow(getattr(self, name), shape) + delta
+            # Never below zero, e.g. if old-style entries without keys
+            # were logged while the table was being read.
+            matrix.data = np.maximum(matrix.data, 0)
+            matrix.eliminate_zeros()
+            changed.append(matrix)
+        (self.by_user, self.major_by_user) = changed
+        return()
+
+    def compact(self):
+        '''
+        Remove users and articles that no longer have any edits,
+        renumbering the remaining ones.  Call `_update()` afterwards.
+        '''
+        keep_users = np.flatnonzero(np.diff(self.by_user.indptr) > 0)
+        keep_articles = np.flatnonzero(np.bincount(
+            self.by_user.indices, minlength=len(self.articles)) > 0)
+        self.compacted = time.time()
+        if len(keep_users) == len(self.users) \
+           and len(keep_articles) == len(self.articles):
+            return()
+
+        logging.info("compacting co-edit index for {}wiki, removing {} users and {} articles".format(
+            self.lang, len(self.users) - len(keep_users),
+            len(self.articles) - len(keep_articles)))
+
+        self.by_user = self.by_user[keep_users][:, keep_articles].tocsr()
+        self.major_by_user = \
+            self.major_by_user[keep_users][:, keep_articles].tocsr()
+        self.users = self._to_interner(
+            self.users[user_id] for user_id in keep_users.tolist())
+        self.articles = self._to_interner(
+            self.articles[article_id] for article_id in keep_articles.tolist())
+        return()
+
+    def _grow(self, matrix, shape):
+        '''
+        Get a copy of a CSR matrix with its shape grown to `shape`,
+        by adding empty rows and columns.
+        '''
+        extra_rows = shape[0] - matrix.shape[0]
+        indptr = np.concatenate([matrix.indptr,
+                                 np.full(extra_rows, matrix.indptr[-1],
+                                         dtype=matrix.indptr.dtype)])
+        return(sp.csr_matrix((matrix.data, matrix.indices, indptr),
+                             shape=shape))
+
+    def _to_interner(self, strings):
+        interner = Interner()
+        for string in strings:
+            interner.intern(string)
+        return(interner)
+
+    def save_snapshot(self, path):
+        '''
+        Write this index to a snapshot file that `load_snapshot()` can map.
+
+        :param path: path of the snapshot file
+        :type path: str
+        '''
+        arrays = {}
+        for (name, strings) in [('users', self.users),
+                                ('articles', self.articles)]:
+            for (key, values) in string_table_arrays(list(strings)).items():
+                arrays['{}.{}'.format(name, key)] = values
+        for name in ['by_user', 'by_article',
+                     'major_by_user', 'major_by_article']:
+            matrix = getattr(self, name)
+            matrix.sort_indices()
+            arrays['{}.indptr'.format(name)] = matrix.indptr
+            arrays['{}.indices'.format(name)] = matrix.indices
+            arrays['{}.data'.format(name)] = matrix.data
+        arrays['user_edits'] = self.user_edits
+        arrays['user_articles'] = self.user_articles
+        arrays['user_major_articles'] = self.user_major_articles
+
+        write_snapshot(path, arrays, meta={'lang': self.lang,
+                                           'loaded': self.loaded,
+                                           'version': self.version,
+                                           'delta_inode': self.delta_inode,
+                                           'delta_offset': self.delta_offset})
+        logging.info("wrote co-edit index snapshot version {} to {}".format(
+            self.version, path))
+
+    def load_snapshot(self, path):
+        '''
+        Populate the index by mapping a snapshot file written by
+        `save_snapshot()`.  The arrays are read-only and shared with
+        every other process that maps the same file.
+
+        :param path: path of the snapshot file
+        :type path: str
+        '''
+        (meta, arrays) = read_snapshot(path)
+        if meta['lang'] != self.lang:
+            logging.error("snapshot {} is for {}wiki, not {}wiki".format(
+                path, meta['lang'], self.lang))
+            return(False)
+
+        self.users = StringTable(arrays['users.blob'],
+                                 arrays['users.offsets'],
+                                 arrays['users.order'])
+        self.articles = StringTable(arrays['articles.blob'],
+                                    arrays['articles.offsets'],
+                                    arrays['articles.order'])
+        for name in ['by_user', 'by_article',
+                     'major_by_user', 'major_by_article']:
+            if name.endswith('by_user'):
+                shape = (len(self.users), len(self.articles))
+            else:
+                shape = (len(self.articles), len(self.users))
+            matrix = sp.csr_matrix((arrays['{}.data'.format(name)],
+                                    arrays['{}.indices'.format(name)],
+                                    arrays['{}.indptr'.format(name)]),
+                                   shape=shape, copy=False)
+            matrix.has_sorted_indices = True
+            setattr(self, name, matrix)
+        self.user_edits = arrays['user_edits']
+        self.user_articles = arrays['user_articles']
+        self.user_major_articles = arrays['user_major_articles']
+
+        self.loaded = meta['loaded']
+        self.compacted = self.loaded
+        self.version = meta['version']
+        self.delta_inode = meta.get('delta_inode')
+        self.delta_offset = meta.get('delta_offset', 0)
+        self._effective = None
+        self._hashes = None
+
+        logging.info("mapped co-edit index snapshot version {} of {} users and {} articles from {}".format(
+            self.version, len(self.users), len(self.articles), path))
+        return(True)
+
+    def effective_sets(self, exp_threshold):
+        '''
+        Get a users × articles matrix of the articles we compare each user
+        on, which is every article they edited, except for experienced users
+        (those with at least `exp_threshold` edits) where only articles
+        with non-minor, non-reverting edits count.  Cells are 1 or 0.
+
+        :param exp_threshold: number of edits to be an experienced user
+        :type exp_threshold: int
+        '''
+        if self._effective is not None \
+           and self._effective[0] == exp_threshold:
+            return(self._effective[1])
+
+        expert = (self.user_edits >= exp_threshold).astype(np.int8)
+        all_edits = self.by_user.astype(bool).astype(np.int8)
+        major_edits = self.major_by_user.astype(bool).astype(np.int8)
+        effective = (sp.diags(expert, dtype=np.int8).dot(major_edits)
+                     + sp.diags(1 - expert, dtype=np.int8).dot(all_edits)).tocsr()
+        effective.eliminate_zeros()
+        effective.sort_indices()
+
+        self._effective = (exp_threshold, effective)
+        return(effective)
+
+    def editor_hashes(self):
+        '''
+        Get an array of `editor_hash()` of every user in the index,
+        used to sample the editors of hub articles.
+        '''
+        if self._hashes is None:
+            self._hashes = np.fromiter(
+                (editor_hash(user) for user in self.users),
+                dtype=np.uint64, count=len(self.users))
+        return(self._hashes)
+
+    def association(self, user_ids, basket, exp_threshold):
+        '''
+        Calculate the exact association between each of the given users
+        and a basket of articles, using the same definition as
+        `neighbours()`.  Returns an array of associations and an array
+        of the number of shared articles, in the same order as `user_ids`.
+
+        :param user_ids: IDs of the users to calculate association for
+        :type user_ids: numpy.ndarray
+
+        :param basket: titles of the articles the user edited
+        :type basket: list
+
+        :param exp_threshold: number of edits to be an experienced user
+        :type exp_threshold: int
+        '''
+        sets = self.effective_sets(exp_threshold)[user_ids]
+        in_basket = np.isin(sets.indices, self.article_ids(basket))
+        rows = np.repeat(np.arange(len(user_ids)), np.diff(sets.indptr))
+        shared = np.bincount(rows[in_basket], minlength=len(user_ids))
+        size = np.diff(sets.indptr)
+        return(shared / (len(basket) + size - shared), shared)
+
+    def age(self):
+        '''
+        Number of seconds since this index was populated.
+        '''
+        if self.loaded is None:
+            return(float('inf'))
+        return(time.time() - self.loaded)
+
+    def article_ids(self, titles):
+        '''
+        Translate article titles to IDs, dropping titles we do not know.
+
+        :param titles: article titles
+        :type titles: iterable of str
+        '''
+        ids = [self.articles.get(title) for title in titles]
+        return(np.array([i for i in ids if i is not None], dtype=np.int32))
+
+    def neighbours(self, username, basket, exp_threshold, assoc_threshold,
+                   k=250, max_editors=0, hub_idf=False):
+        '''
+        Find the `k` users most associated with a basket of articles.
+
+        A user is a candidate neighbour if they made a non-minor,
+        non-reverting edit to an article in the basket, or if they made
+        any edit to one and have fewer than `exp_threshold` edits.
+        Association is the Jaccard coefficient between the basket and the
+        user's edited articles, where experienced users (those with at
+        least `exp_threshold` edits) only count non-minor, non-reverting
+        edits.
+
+        Editors of hub articles, those with more than `max_editors`
+        distinct editors, are sampled the same way as
+        `NeighbourFinder.sampled_editors()` rather than all considered.
+        If `hub_idf` is set, the association of users found through hub
+        articles only is scaled down by `hub_weight()`.
+
+        Returns a tuple of two arrays: user IDs and their association,
+        sorted by descending association.
+
+        :param username: user we're recommending for, never a neighbour
+        :type username: str
+
+        :param basket: titles of the articles the user edited
+        :type basket: list
+
+        :param exp_threshold: number of edits to be an experienced user
+        :type exp_threshold: int
+
+        :param assoc_threshold: minimum association to be a neighbour
+        :type assoc_threshold: float
+
+        :param k: maximum number of neighbours to return
+        :type k: int
+
+        :param max_editors: maximum number of editors we consider per
+                            article, 0 means we consider all of them
+        :type max_editors: int
+
+        :param hub_idf: down-weight neighbours found through hub articles?
+        :type hub_idf: bool
+        '''
+        n_users = len(self.users)
+        basket_ids = self.article_ids(basket)
+        if not len(basket_ids):
+            return(np.array([], dtype=np.int32), np.array([]))
+
+        # Number of basket articles each user edited at all, and
+        # with non-minor, non-reverting edits.
+        shared_all = np.bincount(self.by_article[basket_ids].indices,
+                                 minlength=n_users)
+        shared_major = np.bincount(self.major_by_article[basket_ids].indices,
+                                   minlength=n_users)
+
+        # Candidate neighbours through each article: its editors who made
+        # non-minor, non-reverting edits to it, or who are not experienced.
+        expert = self.user_edits >= exp_threshold
+        def qualified_editors(article_ids):
+            editors = self.by_article[article_ids].indices
+            return(np.union1d(self.major_by_article[article_ids].indices,
+                              editors[~expert[editors]]))
+
+        # Highest weight of the articles each user is a candidate through,
+        # 0 for users who are not candidates.  Ordinary articles have
+        # weight 1, editors of hub articles are sampled.
+        num_editors = np.diff(self.by_article.indptr)[basket_ids]
+        if max_editors:
+            is_hub = num_editors > max_editors
+        else:
+            is_hub = np.zeros(len(basket_ids), dtype=bool)
+
+        weight = np.zeros(n_users)
+        weight[qualified_editors(basket_ids[~is_hub])] = 1.0
+        for (article_id, n_editors) in zip(basket_ids[is_hub].tolist(),
+                                           num_editors[is_hub].tolist()):
+            editors = qualified_editors([article_id])
+            editors = editors[self.editor_hashes()[editors]
+                              < hub_cutoff(n_editors, max_editors)]
+            weight[editors] = np.maximum(weight[editors],
+                                         hub_weight(n_editors, max_editors))
+        if is_hub.any():
+            logging.info("Sampled editors of {} hub articles".format(
+                is_hub.sum()))
+
+        candidate = weight > 0
+        user_id = self.users.get(username)
+        if user_id is not None:
+            candidate[user_id] = False
+
+        shared = np.where(expert, shared_major, shared_all)
+        size = np.where(expert, self.user_major_articles, self.user_articles)
+
+        candidates = np.flatnonzero(candidate)
+        assoc = shared[candidates] / (
+            len(basket) + size[candidates] - shared[candidates])
+        if hub_idf:
+            assoc *= weight[candidates]
+
+        keep = assoc >= assoc_threshold
+        candidates = candidates[keep]
+        assoc = assoc[keep]
+
+        logging.info("Found {} pre-neighbours".format(len(candidates)))
+
+        if len(candidates) > k:
+            top = np.argpartition(-assoc, k)[:k]
+            candidates = candidates[top]
+            assoc = assoc[top]
+
+        order = np.argsort(-assoc, kind='stable')
+        return(candidates[order], assoc[order])
+
+    def score(self, nhood, assoc):
+        '''
+        Score the articles edited by a neighbourhood of users.  Each edit
+        made by a neighbour adds their association to the article's score,
+        and one to its co-edit count.
+
+        Returns a tuple of three arrays: article IDs, scores
+        and co-edit counts.
+
+        :param nhood: user IDs of the neighbours
+        :type nhood: numpy.ndarray
+
+        :param assoc: association of each neighbour
+        :type assoc: numpy.ndarray
+        '''
+        edits = self.by_user[nhood]
+        scores = edits.T.dot(assoc)
+        counts = np.asarray(edits.sum(axis=0)).ravel()
+
+        article_ids = np.flatnonzero(counts)
+        return(article_ids, scores[article_ids], counts[article_ids])
+
+    def articles_by_user(self, username):
+        '''
+        Get the IDs of all articles edited by the given user.
+
+        :param username: name of the user
+        :type username: str
+        '''
+        user_id = self.users.get(username)
+        if user_id is None:
+            return(np.array([], dtype=np.int32))
+        start, end = self.by_user.indptr[user_id:user_id+2]
+        return(self.by_user.indices[start:end])
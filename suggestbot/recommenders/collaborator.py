@@ -24,10 +24,15 @@ Boston, MA  02110-1301, USA.
 import operator
 import logging
 
+import numpy as np
+import scipy.sparse as sp
+
 import MySQLdb
 
 from suggestbot import config
 from suggestbot import db
+from suggestbot.recommenders.neighbours import NeighbourFinder
+from suggestbot.recommenders import coedit
 
 class RecUser:
     def __init__(self, username, assoc, shared):
@@ -51,7 +56,8 @@ class RecUser:
 
 class CollabRecommender:
     def __init__(self, lang='en', nrecs=100, threshold=3, backoff=0,
-                 min_threshold=1, assoc_threshold=0.0001, exp_threshold=18):
+                 min_threshold=1, assoc_threshold=0.0001, exp_threshold=18,
+                 coedit_recommender=None):
         '''
         Instantiate an object for recommending collaborators.
 
@@ -75,6 +81,12 @@ class CollabRecommender:
 
         :param filter_threshold: threshold for labelling user as experienced
         :type filter_threshold: int
+
+        :param coedit_recommender: co-edit recommender whose in-memory
+                                   co-edit indexes `recommend_batch()` uses,
+                                   one using config.coedit_snapshot_dir
+                                   is created if needed
+        :type coedit_recommender: suggestbot.recommenders.coedit.Recommender
         '''
         
         self.lang = lang
@@ -88,6 +100,11 @@ class CollabRecommender:
         # Database connection and cursor
         self.dbconn = None
         self.dbcursor = None
+
+        # Co-edit recommender whose in-memory co-edit indexes (mapped from
+        # snapshots and kept up to date from the delta log) are used
+        # by `recommend_batch()`
+        self.coedit_recommender = coedit_recommender
         
     def recommend(self, contribs, username, lang, nrecs = 100, threshold = 3, backoff = 0):
 
@@ -154,6 +171,12 @@ class CollabRecommender:
         # Turn contributions into a set, as we'll only use it that way
         contribs = set(contribs)
 
+        if config.coedit_engine == 'batch':
+            recs = self.get_batch_recs(username, contribs)
+            database.disconnect()
+            return([{'item': rec.username, 'value': rec.assoc}
+                    for rec in recs[:nrecs]])
+
         # Get some recs.
         recs = self.get_recs_at_coedit_threshold(username, contribs)
 
@@ -305,6 +328,161 @@ class CollabRecommender:
                       reverse=True)[:k]
         return recs
 
+    def get_batch_recs(self, username, contribs):
+        '''
+        Get recommendations of other users based on a set of contributions,
+        finding all neighbours and their shared articles with a handful of
+        set-based queries.  Neighbours are found once, and the co-edit
+        threshold is then backed off (if allowed) until we have enough.
+
+        :param username: User we are recommending for
+        :type username: str
+
+        :param contribs: Contributions we're recommending based on
+        :type contribs: set
+        '''
+        finder = NeighbourFinder(self.dbcursor, self.lang)
+        try:
+            neighbours = finder.find(username, contribs,
+                                     self.exp_thresh, self.assoc_thresh)
+        except MySQLdb.Error as e:
+            logging.error("unable to execute queries to find neighbours")
+            logging.error("Error {0}: {1}".format(e.args[0], e.args[1]))
+            return([])
+
+        coeditors = sorted(
+            [RecUser(user, assoc, shared)
+             for (user, (assoc, shared)) in neighbours.items()],
+            key=operator.attrgetter('assoc'),
+            reverse=True)
+
+        recs = [rec for rec in coeditors if rec.shared >= self.thresh]
+        while self.backoff and self.thresh > self.min_thresh \
+              and len(recs) < self.nrecs:
+            self.thresh -= 1
+            logging.info('Co-edit threshold is now {0}'.format(self.thresh))
+            recs = [rec for rec in coeditors if rec.shared >= self.thresh]
+
+        return(recs)
+
+    def recommend_batch(self, users, lang, nrecs=100, threshold=3,
+                        backoff=0, contribs=None, chunk_size=500):
+        '''
+        Find `nrecs` neighbours for each of a list of users (e.g. the
+        members of a WikiProject) in one go, using the in-memory co-edit
+        index rather than querying the database per user and neighbour.
+        Neighbours and association are defined as in `recommend()`.
+
+        The overlap between every user in a chunk of `chunk_size` users
+        and everyone in the index is a single sparse matrix product, so
+        memory use is bounded by the chunk size.
+
+        Returns a dictionary mapping each user name to a list of
+        recommendations in the same format as `recommend()`.
+
+        :param users: Names of the users we're recommending for
+        :type users: list
+
+        :param lang: Language code of the Wikipedia we're working on
+        :type lang: str
+
+        :param nrecs: Number of recommendations we seek per user
+        :type nrecs: int
+
+        :param threshold: Number of articles in common to be determined a neighbour
+        :type threshold: int
+
+        :param backoff: Do we apply a backoff strategy on the threshold?
+        :type backoff: int
+
+        :param contribs: The users' contributions, mapping user names
+                         to lists of articles.  Users not in it are
+                         recommended for based on every article they
+                         edited according to the index.
+        :type contribs: dict
+
+        :param chunk_size: Number of users we calculate overlaps for at a time
+        :type chunk_size: int
+        '''
+        recs = {user: [] for user in users}
+        if self.coedit_recommender is None:
+            self.coedit_recommender = coedit.Recommender(
+                snapshot_dir=config.coedit_snapshot_dir)
+        index = self.coedit_recommender.get_index(lang)
+        if index is None:
+            logging.error("No co-edit index available for {}wiki".format(lang))
+            return(recs)
+
+        if contribs is None:
+            contribs = {}
+
+        # Users × articles, the articles we compare each possible
+        # neighbour on, and their number
+        candidates = index.effective_sets(self.exp_thresh).astype(np.int32)
+        set_sizes = np.diff(candidates.indptr)
+
+        for start in range(0, len(users), chunk_size):
+            chunk = users[start:start + chunk_size]
+
+            # Chunk × articles, the basket of each user in the chunk
+            rows = []
+            cols = []
+            basket_sizes = np.zeros(len(chunk))
+            for (i, user) in enumerate(chunk):
+                if user in contribs:
+                    basket = set(contribs[user])
+                    article_ids = index.article_ids(basket)
+                    basket_sizes[i] = len(basket)
+                else:
+                    article_ids = index.articles_by_user(user)
+                    basket_sizes[i] = len(article_ids)
+                rows.append(np.full(len(article_ids), i, dtype=np.int32))
+                cols.append(article_ids)
+            baskets = sp.csr_matrix(
+                (np.ones(sum(len(c) for c in cols), dtype=np.int32),
+                 (np.concatenate(rows), np.concatenate(cols))),
+                shape=(len(chunk), len(index.articles)))
+
+            # Chunk × users, number of shared articles
+            shared = baskets.dot(candidates.T).tocsr()
+
+            for (i, user) in enumerate(chunk):
+                (lo, hi) = shared.indptr[i:i+2]
+                neighbours = shared.indices[lo:hi]
+                num_shared = shared.data[lo:hi]
+
+                keep = neighbours != index.users.get(user, -1)
+                neighbours = neighbours[keep]
+                num_shared = num_shared[keep]
+
+                assoc = num_shared / (basket_sizes[i]
+                                      + set_sizes[neighbours] - num_shared)
+                keep = assoc >= self.assoc_thresh
+                neighbours = neighbours[keep]
+                num_shared = num_shared[keep]
+                assoc = assoc[keep]
+
+                # Same threshold backoff as `get_batch_recs()`
+                thresh = threshold
+                qualified = num_shared >= thresh
+                while backoff and thresh > self.min_thresh \
+                      and qualified.sum() < nrecs:
+                    thresh -= 1
+                    qualified = num_shared >= thresh
+
+                neighbours = neighbours[qualified]
+                assoc = assoc[qualified]
+                top = np.argsort(-assoc, kind='stable')[:nrecs]
+                recs[user] = [{'item': index.users[neighbour], 'value': value}
+                              for (neighbour, value)
+                              in zip(neighbours[top].tolist(),
+                                     assoc[top].tolist())]
+
+            logging.info("Recommended collaborators for {} of {} users".format(
+                min(start + chunk_size, len(users)), len(users)))
+
+        return(recs)
+
     def user_association(self, user, basket):
         '''
         Calculate the association between a given user and a basket
@@ -0,0 +1,231 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+'''
+Offline builder of the item-item co-edit similarity table.  For each
+article it finds the `k` articles most often edited by the same users,
+so that the co-edit recommender's 'itemitem' engine can score candidates
+with a handful of indexed lookups instead of neighbourhood searches.
+
+Copyright (C) 2016 SuggestBot Dev Group
+
+This library is free software; you can redistribute it and/or
+modify it under the terms of the GNU Library General Public
+License as published by the Free Software Foundation; either
+version 2 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+Library General Public License for more details.
+
+You should have received a copy of the GNU Library General Public
+License along with this library; if not, write to the
+Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+Boston, MA  02110-1301, USA.
+'''
+
+import time
+import logging
+import multiprocessing
+
+import numpy as np
+
+import MySQLdb
+
+from suggestbot import config
+from suggestbot import db
+
+# Matrices shared with the worker processes, set up by `_init_worker()`.
+# With the default fork start method they are inherited, not copied.
+_worker_state = {}
+
+def _init_worker(by_article, by_user, norms, k, min_coeditors):
+    _worker_state.update(by_article=by_article, by_user=by_user,
+                         norms=norms, k=k, min_coeditors=min_coeditors)
+
+def _similar_articles(bounds):
+    '''
+    Find the top `k` most similar articles for the articles with
+    IDs in the given range.  Returns a tuple of four arrays: article IDs,
+    neighbour IDs, cosine similarities and number of shared editors.
+
+    :param bounds: first and last (exclusive) article ID in the range
+    :type bounds: tuple
+    '''
+    (start, end) = bounds
+    by_article = _worker_state['by_article']
+    norms = _worker_state['norms']
+    k = _worker_state['k']
+    min_coeditors = _worker_state['min_coeditors']
+
+    # Number of editors each article in the range shares with every
+    # other article, one row per article in the range.
+    coedits = by_article[start:end].dot(_worker_state['by_user']).tocsr()
+
+    sources = []
+    targets = []
+    scores = []
+    counts = []
+    for row in range(end - start):
+        article_id = start + row
+        (lo, hi) = coedits.indptr[row:row+2]
+        neighbours = coedits.indices[lo:hi]
+        shared = coedits.data[lo:hi]
+
+        keep = (neighbours != article_id) & (shared >= min_coeditors)
+        neighbours = neighbours[keep]
+        shared = shared[keep]
+        if not len(neighbours):
+            continue
+
+        similarity = shared / (norms[article_id] * norms[neighbours])
+        if len(neighbours) > k:
+            top = np.argpartition(-similarity, k)[:k]
+            neighbours = neighbours[top]
+            shared = shared[top]
+            similarity = similarity[top]
+
+        sources.append(np.full(len(neighbours), article_id, dtype=np.int32))
+        targets.append(neighbours.astype(np.int32))
+        scores.append(similarity)
+        counts.append(shared)
+
+    if not sources:
+        return(np.array([], dtype=np.int32), np.array([], dtype=np.int32),
+               np.array([]), np.array([], dtype=np.int32))
+    return(np.concatenate(sources), np.concatenate(targets),
+           np.concatenate(scores), np.concatenate(counts))
+
+class SimilarityBuilder:
+    def __init__(self, lang, k=50, min_coeditors=2, max_user_articles=0,
+                 workers=1, chunk_size=2000):
+        '''
+        Instantiate a builder of the item-item similarity table
+        for the given language.
+
+        :param lang: language code of the Wikipedia we're building for
+        :type lang: str
+
+        :param k: number of similar articles we keep per article
+        :type k: int
+
+        :param min_coeditors: minimum number of shared editors for two
+                              articles to be similar
+        :type min_coeditors: int
+
+        :param max_user_articles: users who edited more articles than this
+                                  are left out (they are typically bots or
+                                  patrollers and dominate the cost of the
+                                  build), 0 keeps everyone
+        :type max_user_articles: int
+
+        :param workers: number of worker processes
+        :type workers: int
+
+        :param chunk_size: number of articles a worker handles at a time
+        :type chunk_size: int
+        '''
+        self.lang = lang
+        self.k = k
+        self.min_coeditors = min_coeditors
+        self.max_user_articles = max_user_articles
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    def similarities(self, index):
+        '''
+        Calculate the top `k` most similar articles for every article
+        in a co-edit index.  Similarity is the cosine between the sets
+        of users who edited each article, where experienced users only
+        count with non-minor, non-reverting edits, as in the user-based
+        recommender.  Yields one tuple of arrays (article IDs, neighbour IDs,
+        similarities, shared editors) per chunk of articles.
+
+        :param index: the co-edit index to build from
+        :type index: CoeditIndex
+        '''
+        by_user = index.effective_sets(config.coedit_filter_threshold)
+        by_user = by_user.astype(np.int32)
+        if self.max_user_articles:
+            num_articles = np.diff(by_user.indptr)
+            keep = (num_articles <= self.max_user_articles).astype(np.int32)
+            by_user = by_user.multiply(keep[:, np.newaxis]).tocsr()
+            by_user.eliminate_zeros()
+            logging.info("left out {} users with more than {} articles".format(
+                int((keep == 0).sum()), self.max_user_articles))
+
+        by_article = by_user.T.tocsr()
+        norms = np.sqrt(np.diff(by_article.indptr))
+
+        n_articles = by_article.shape[0]
+        chunks = [(start, min(start + self.chunk_size, n_articles))
+                  for start in range(0, n_articles, self.chunk_size)]
+
+        state = (by_article, by_user, norms, self.k, self.min_coeditors)
+        if self.workers > 1:
+            with multiprocessing.Pool(self.workers, initializer=_init_worker,
+                                      initargs=state) as pool:
+                for result in pool.imap_unordered(_similar_articles, chunks):
+                    yield result
+        else:
+            _init_worker(*state)
+            for bounds in chunks:
+                yield _similar_articles(bounds)
+
+    def build(self, index):
+        '''
+        Build the similarity table from a co-edit index.  Rows are written
+        to a new table which then replaces the current one, so the
+        recommender always sees a complete table.
+
+        :param index: the co-edit index to build from
+        :type index: CoeditIndex
+        '''
+        table = config.coedit_similarity_table[self.lang]
+        new_table = '{}_new'.format(table)
+        old_table = '{}_old'.format(table)
+
+        insert_query = """INSERT INTO {}
+                          (cs_title, cs_neighbour, cs_score, cs_coeditors)
+                          VALUES (%s, %s, %s, %s)""".format(new_table)
+
+        sbdb = db.SuggestBotDatabase()
+        if not sbdb.connect():
+            logging.error("Unable to connect to the SuggestBot database")
+            return(False)
+
+        (dbconn, dbcursor) = sbdb.getConnection()
+
+        logging.info("building item-item similarities for {}wiki".format(
+            self.lang))
+        start = time.time()
+        num_rows = 0
+        try:
+            dbcursor.execute("DROP TABLE IF EXISTS {}".format(new_table))
+            dbcursor.execute("CREATE TABLE {} LIKE {}".format(new_table, table))
+            for (sources, targets, scores, counts) in self.similarities(index):
+                rows = [(index.articles[source].encode('utf-8'),
+                         index.articles[target].encode('utf-8'),
+                         score, count)
+                        for (source, target, score, count)
+                        in zip(sources.tolist(), targets.tolist(),
+                               scores.tolist(), counts.tolist())]
+                if rows:
+                    dbcursor.executemany(insert_query, rows)
+                    dbconn.commit()
+                    num_rows += len(rows)
+
+            dbcursor.execute("DROP TABLE IF EXISTS {}".format(old_table))
+            dbcursor.execute("RENAME TABLE {table} TO {old}, {new} TO {table}".format(
+                table=table, old=old_table, new=new_table))
+            dbcursor.execute("DROP TABLE {}".format(old_table))
+        except MySQLdb.Error as e:
+            logging.error("Unable to build the similarity table for {}wiki".format(self.lang))
+            logging.error("MySQL Error {}: {}".format(e.args[0], e.args[1]))
+            sbdb.disconnect()
+            return(False)
+
+        sbdb.disconnect()
+        logging.info("stored {} similarities for {} articles in {:.1f} seconds".format(
+            num_rows, len(index.articles), time.time() - start))
+        return(True)
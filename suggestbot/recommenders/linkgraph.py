@@ -0,0 +1,432 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+'''
+Offline-built graph of the links between articles in a Wikipedia, used
+by the link recommender to expand a set of articles along their links
+and weight the results by in-link counts without querying the database
+replicas.  Redirects are resolved when the graph is built, and the graph
+is stored as a compact CSR adjacency in a snapshot file that every
+process on a host can map and share.
+
+Copyright (C) 2011-2023 SuggestBot Dev Group
+
+This library is free software; you can redistribute it and/or
+modify it under the terms of the GNU Library General Public
+License as published by the Free Software Foundation; either
+version 2 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+Library General Public License for more details.
+
+You should have received a copy of the GNU Library General Public
+License along with this library; if not, write to the
+Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+Boston, MA  02110-1301, USA.
+'''
+
+import os
+import time
+import array
+import logging
+
+import numpy as np
+
+import MySQLdb
+import MySQLdb.cursors
+
+from suggestbot.utilities.snapshot import read_snapshot, write_snapshot, \
+    string_table_arrays, StringTable
+
+def graph_path(directory, lang):
+    '''
+    Path of the link graph snapshot for the given language.
+
+    :param directory: directory where link graphs are kept
+    :type directory: str
+
+    :param lang: language code of the Wikipedia the graph is for
+    :type lang: str
+    '''
+    return(os.path.join(directory, '{}wiki-links.snapshot'.format(lang)))
+
+class LinkGraph:
+    def __init__(self, lang):
+        '''
+        Instantiate an empty link graph for the given language.  Call
+        `load()` to build it from the database replica, or
+        `load_snapshot()` to map a previously built one.
+
+        Articles are identified by dense IDs, which are their positions
+        in `page_ids`, the sorted page IDs of all articles.
+
+        :param lang: language code of the Wikipedia the graph is for
+        :type lang: str
+        '''
+        self.lang = lang
+
+        # Page ID of each article, sorted, and the article titles
+        # (with underscores, as in the database) in the same order.
+        self.page_ids = None
+        self.titles = None
+
+        # Titles of redirects in the main namespace, and the dense ID
+        # of the article each of them points to.
+        self.redirects = None
+        self.redirect_targets = None
+
+        # Outgoing links as CSR arrays: the links from article i are
+        # `targets[offsets[i]:offsets[i+1]]`, with redirects resolved,
+        # links to double redirects dropped, and duplicates removed.
+        self.offsets = None
+        self.targets = None
+
+        # Number of distinct articles linking to each article
+        self.in_degree = None
+
+        # When the graph was built (seconds since the epoch)
+        self.built = None
+
+    def __len__(self):
+        return(len(self.page_ids))
+
+    def load(self, db_conn):
+        '''
+        Build the graph from the replicated Wikipedia database.  All
+        queries are streamed through server-side cursors, and their results
+        kept in flat arrays, so memory use stays close to the size of
+        the finished graph.
+
+        :param db_conn: connection to the Wikipedia's database replica
+        :type db_conn: MySQLdb.Connection
+        '''
+
+        # Articles in the main namespace, in page ID order
+        article_query = '''SELECT page_id, page_title
+                           FROM page
+                           WHERE page_namespace=0
+                           AND page_is_redirect=0
+                           ORDER BY page_id'''
+
+        # Redirects in the main namespace that point to an article
+        redirect_query = '''SELECT p.page_title, target.page_id
+                            FROM page p
+                            JOIN redirect rd
+                            ON p.page_id=rd.rd_from
+                            JOIN page target
+                            ON (rd.rd_namespace=target.page_namespace
+                                AND rd.rd_title=target.page_title)
+                            WHERE p.page_namespace=0
+                            AND target.page_namespace=0
+                            AND target.page_is_redirect=0'''
+
+        # Links between articles.  Single redirects are resolved,
+        # double redirects are marked so they can be ignored.
+        link_query = '''SELECT pl.pl_from AS from_id,
+                               link.page_id AS lpage,
+                               redir.page_id AS rpage,
+                               redir.page_is_redirect AS is_double_redirect
+                        FROM pagelinks AS pl
+                        JOIN page AS link
+                        ON (pl.pl_namespace=link.page_namespace
+                            AND pl.pl_title=link.page_title)
+                        LEFT JOIN redirect AS rd
+                        ON link.page_id=rd.rd_from
+                        LEFT JOIN page AS redir
+                        ON (rd.rd_namespace=redir.page_namespace
+                            AND rd.rd_title=redir.page_title)
+                        WHERE pl.pl_from_namespace=0
+                        AND pl.pl_namespace=0'''
+
+        logging.info("building link graph for {}wiki".format(self.lang))
+        start = time.time()
+
+        page_ids = array.array('q')
+        titles = []
+        redirect_titles = []
+        redirect_pages = array.array('q')
+        sources = array.array('q')
+        targets = array.array('q')
+
+        ss_cursor = db_conn.cursor(MySQLdb.cursors.SSCursor)
+        try:
+            ss_cursor.execute(article_query)
+            for (page_id, page_title) in ss_cursor:
+                page_ids.append(page_id)
+                titles.append(page_title.decode('utf-8'))
+            logging.info("read {} articles".format(len(page_ids)))
+
+            ss_cursor.execute(redirect_query)
+            for (page_title, target_id) in ss_cursor:
+                redirect_titles.append(page_title.decode('utf-8'))
+                redirect_pages.append(target_id)
+            logging.info("read {} redirects".format(len(redirect_titles)))
+
+            ss_cursor.execute(link_query)
+            for (from_id, lpage, rpage, is_double_redirect) in ss_cursor:
+                if is_double_redirect:
+                    continue
+                sources.append(from_id)
+                targets.append(rpage or lpage)
+            logging.info("read {} links".format(len(sources)))
+        except MySQLdb.Error as e:
+            logging.error("Unable to build the link graph for {}wiki".format(self.lang))
+            logging.error("MySQL Error {}: {}".format(e.args[0], e.args[1]))
+            ss_cursor.close()
+            return(False)
+
+        ss_cursor.close()
+
+        self.build(np.frombuffer(page_ids, dtype=np.int64), titles,
+                   np.frombuffer(sources, dtype=np.int64),
+                   np.frombuffer(targets, dtype=np.int64),
+                   redirect_titles,
+                   np.frombuffer(redirect_pages, dtype=np.int64))
+
+        logging.info("built link graph of {} articles and {} links in {:.1f} seconds".format(
+            len(self), len(self.targets), time.time() - start))
+        return(True)
+
+    def build(self, page_ids, titles, sources, targets,
+              redirect_titles=[], redirect_pages=[]):
+        '''
+        Build the graph from arrays of page IDs.  Links from or to pages
+        that are not among the articles are left out, as are redirects
+        to pages that are not.
+
+        :param page_ids: page IDs of the articles, sorted
+        :type page_ids: numpy.ndarray
+
+        :param titles: titles of the articles, in the same order
+        :type titles: list of str
+
+        :param sources: page IDs of the article each link is from
+        :type sources: numpy.ndarray
+
+        :param targets: page IDs of the article each link is to,
+                        with redirects already resolved
+        :type targets: numpy.ndarray
+
+        :param redirect_titles: titles of redirects to articles
+        :type redirect_titles: list of str
+
+        :param redirect_pages: page ID of the article each redirect
+                               points to
+        :type redirect_pages: numpy.ndarray
+        '''
+        self.page_ids = np.asarray(page_ids, dtype=np.int32)
+        n_articles = len(self.page_ids)
+
+        # Dense IDs of the links' endpoints, dropping those that aren't
+        # articles and any duplicates after resolving redirects.
+        (src, valid_src) = self.dense_ids(sources)
+        (dst, valid_dst) = self.dense_ids(targets)
+        valid = valid_src & valid_dst
+        links = np.unique(src[valid].astype(np.int64) * n_articles
+                          + dst[valid])
+        src = (links // n_articles).astype(np.int32)
+
+        self.offsets = np.zeros(n_articles + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n_articles),
+                  out=self.offsets[1:])
+        self.targets = (links % n_articles).astype(np.int32)
+        self.in_degree = np.bincount(self.targets,
+                                     minlength=n_articles).astype(np.int32)
+
+        self.titles = self._string_table(titles)
+
+        (redirect_targets, valid) = self.dense_ids(redirect_pages)
+        self.redirects = self._string_table(
+            [title for (title, keep) in zip(redirect_titles, valid) if keep])
+        self.redirect_targets = redirect_targets[valid]
+
+        self.built = time.time()
+
+    def _string_table(self, strings):
+        arrays = string_table_arrays(strings)
+        return(StringTable(arrays['blob'], arrays['offsets'], arrays['order']))
+
+    def dense_ids(self, page_ids):
+        '''
+        Translate page IDs to dense IDs.  Returns a tuple of the dense
+        IDs and a boolean mask of which page IDs are articles in the graph
+        (the dense IDs of the others are meaningless).
+
+        :param page_ids: the page IDs to translate
+        :type page_ids: numpy.ndarray
+        '''
+        page_ids = np.asarray(page_ids, dtype=np.int64)
+        if not len(self.page_ids):
+            return(np.zeros(len(page_ids), dtype=np.int32),
+                   np.zeros(len(page_ids), dtype=bool))
+        positions = np.searchsorted(self.page_ids, page_ids)
+        positions = np.minimum(positions, len(self.page_ids) - 1)
+        return(positions.astype(np.int32), self.page_ids[positions] == page_ids)
+
+    def resolve(self, title):
+        '''
+        Get the dense ID of the article with the given title, following
+        a single redirect if necessary.  Returns None if there is no
+        such article.
+
+        :param title: title of the article, with underscores or spaces
+        :type title: str
+        '''
+        title = title.replace(' ', '_')
+        article_id = self.titles.get(title)
+        if article_id is not None:
+            return(article_id)
+        redirect_id = self.redirects.get(title)
+        if redirect_id is not None:
+            return(int(self.redirect_targets[redirect_id]))
+        return(None)
+
+    def links(self, article_ids):
+        '''
+        Get the outgoing links of the given articles, as one array of
+        the dense IDs of the linked articles with one entry per link.
+
+        :param article_ids: dense IDs of the articles
+        :type article_ids: numpy.ndarray
+        '''
+        article_ids = np.asarray(article_ids, dtype=np.int64)
+        starts = self.offsets[article_ids]
+        lengths = self.offsets[article_ids + 1] - starts
+        total = int(lengths.sum())
+        if not total:
+            return(np.array([], dtype=np.int32))
+
+        # Position of every link in `targets`: each article's start,
+        # repeated once per link, plus the link's position within
+        # that article's run.
+        run_starts = np.repeat(starts - np.cumsum(lengths) + lengths,
+                               lengths)
+        return(self.targets[run_starts + np.arange(total)])
+
+    def personalized_pagerank(self, seeds, damping=0.85, max_iter=10,
+                              tol=1e-4, min_score=1e-6):
+        '''
+        Personalized PageRank (random walk with restart) from a set of
+        articles.  The scores are kept as a sparse vector and each
+        iteration spreads them along the outgoing links, so only the
+        neighbourhood the walk reaches is ever touched.  Returns a tuple
+        of the dense IDs of the reached articles (sorted) and their scores.
+
+        :param seeds: dense IDs of the articles the walk restarts at
+        :type seeds: numpy.ndarray
+
+        :param damping: probability of following a link rather than
+                        restarting
+        :type damping: float
+
+        :param max_iter: maximum number of iterations
+        :type max_iter: int
+
+        :param tol: stop when the scores change by less than this
+                    (L1 distance) between iterations
+        :type tol: float
+
+        :param min_score: scores below this are dropped after each
+                          iteration, which keeps the walk local
+        :type min_score: float
+        '''
+        seeds = np.unique(np.asarray(seeds, dtype=np.int32))
+        if not len(seeds):
+            return(seeds, np.zeros(0))
+
+        restart = np.full(len(seeds), 1.0 / len(seeds))
+        ids = seeds
+        scores = restart
+
+        for iteration in range(max_iter):
+            out_degree = self.offsets[ids + 1] - self.offsets[ids]
+            has_links = out_degree > 0
+
+            # Articles without links send their walkers back to the seeds
+            dangling = scores[~has_links].sum()
+            spread = np.repeat(scores[has_links] / out_degree[has_links],
+                               out_degree[has_links])
+
+            (new_ids, inverse) = np.unique(
+                np.concatenate([self.links(ids[has_links]), seeds]),
+                return_inverse=True)
+            new_scores = np.bincount(
+                inverse,
+                weights=np.concatenate(
+                    [damping * spread,
+                     (1.0 - damping + damping * dangling) * restart]),
+                minlength=len(new_ids))
+
+            keep = new_scores >= min_score
+            new_ids = new_ids[keep]
+            new_scores = new_scores[keep]
+
+            # L1 distance between the old and new score vectors
+            (_, inverse) = np.unique(np.concatenate([ids, new_ids]),
+                                     return_inverse=True)
+            change = np.abs(np.bincount(
+                inverse, weights=np.concatenate([-scores, new_scores]))).sum()
+
+            ids = new_ids
+            scores = new_scores
+            logging.info("personalized PageRank iteration {}, {} articles, change {:.2g}".format(iteration + 1, len(ids), change))
+            if change < tol:
+                break
+
+        return(ids, scores)
+
+    def save_snapshot(self, path):
+        '''
+        Write this graph to a snapshot file that `load_snapshot()` can map.
+
+        :param path: path of the snapshot file
+        :type path: str
+        '''
+        arrays = {'page_ids': self.page_ids,
+                  'offsets': self.offsets,
+                  'targets': self.targets,
+                  'in_degree': self.in_degree,
+                  'redirect_targets': self.redirect_targets}
+        for (name, table) in [('titles', self.titles),
+                              ('redirects', self.redirects)]:
+            arrays['{}.blob'.format(name)] = table.blob
+            arrays['{}.offsets'.format(name)] = table.offsets
+            arrays['{}.order'.format(name)] = table.order
+
+        write_snapshot(path, arrays, meta={'lang': self.lang,
+                                           'built': self.built})
+        logging.info("wrote link graph snapshot of {} articles to {}".format(
+            len(self), path))
+
+    def load_snapshot(self, path):
+        '''
+        Populate the graph by mapping a snapshot file written by
+        `save_snapshot()`.  The arrays are read-only and shared with
+        every other process that maps the same file.
+
+        :param path: path of the snapshot file
+        :type path: str
+        '''
+        (meta, arrays) = read_snapshot(path)
+        if meta['lang'] != self.lang:
+            logging.error("snapshot {} is for {}wiki, not {}wiki".format(
+                path, meta['lang'], self.lang))
+            return(False)
+
+        self.page_ids = arrays['page_ids']
+        self.offsets = arrays['offsets']
+        self.targets = arrays['targets']
+        self.in_degree = arrays['in_degree']
+        self.redirect_targets = arrays['redirect_targets']
+        self.titles = StringTable(arrays['titles.blob'],
+                                  arrays['titles.offsets'],
+                                  arrays['titles.order'])
+        self.redirects = StringTable(arrays['redirects.blob'],
+                                     arrays['redirects.offsets'],
+                                     arrays['redirects.order'])
+        self.built = meta['built']
+
+        logging.info("mapped link graph snapshot of {} articles and {} links from {}".format(
+            len(self), len(self.targets), path))
+        return(True)
@@ -25,14 +25,28 @@ import os
 import re
 import json
 import math
+import queue
 import logging
 import operator
+import threading
+
+import numpy as np
 
 import MySQLdb
 import MySQLdb.cursors
 
 from collections import defaultdict
+from functools import partial
 from more_itertools import chunked
+from concurrent.futures import ThreadPoolExecutor
+
+from suggestbot.recommenders.linkgraph import LinkGraph, graph_path
+from suggestbot.utilities.titleclass import MONTHS, LISTS, MONTHS_RE, \
+    LISTS_RE, YEAR_RE, CLASSIFIED, LINK_EXCLUDED, mapped_title_classes
+
+# Inlink count of pages missing from the inlink count table in the arrays
+# exported by tool-labs/link-rec/inlink-table-updater.py
+MISSING_INLINK_COUNT = np.iinfo(np.uint32).max
 
 class DatabaseConnectionError(Exception):
     """
@@ -40,9 +54,158 @@ class DatabaseConnectionError(Exception):
     """
     pass
 
+class ConnectionPool:
+    def __init__(self, connect, max_size, timeout=60):
+        '''
+        Bounded pool of database connections shared by the threads that
+        fetch slices concurrently.  Connections are opened as needed,
+        up to `max_size`, and kept for reuse by later requests.
+
+        @param connect: function that opens a new connection
+        @type connect: callable
+
+        @param max_size: maximum number of open connections
+        @type max_size: int
+
+        @param timeout: number of seconds to wait for a connection to be
+                        released when the pool is full
+        @type timeout: int
+        '''
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.num_open = 0
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        '''
+        Get a connection from the pool, opening a new one if none are idle
+        and the pool isn't full, otherwise waiting for one to be released.
+        Idle connections are pinged first, as they might have timed out.
+        Raises DatabaseConnectionError if we can't open a connection or
+        none is released within the timeout.
+        '''
+        while True:
+            try:
+                db_conn = self.idle.get_nowait()
+            except queue.Empty:
+                with self.lock:
+                    can_open = self.num_open < self.max_size
+                    if can_open:
+                        self.num_open += 1
+                if not can_open:
+                    try:
+                        db_conn = self.idle.get(timeout=self.timeout)
+                    except queue.Empty:
+                        logging.error("no database connection released within {} seconds".format(self.timeout))
+                        raise DatabaseConnectionError
+                else:
+                    try:
+                        return(self.connect())
+                    except:
+                        with self.lock:
+                            self.num_open -= 1
+                        raise DatabaseConnectionError
+
+            try:
+                db_conn.ping()
+                return(db_conn)
+            except MySQLdb.Error:
+                self.discard(db_conn)
+
+    def release(self, db_conn):
+        '''
+        Return a connection to the pool.  Its transaction is rolled back
+        first, otherwise the next user of the connection would keep
+        reading from the snapshot that transaction started with.
+        '''
+        try:
+            db_conn.rollback()
+        except MySQLdb.Error:
+            self.discard(db_conn)
+            return()
+        self.idle.put(db_conn)
+
+    def discard(self, db_conn):
+        '''
+        Close a connection that is no longer usable instead of
+        returning it to the pool.
+        '''
+        try:
+            db_conn.close()
+        except:
+            pass
+        with self.lock:
+            self.num_open -= 1
+
+def resolve_titles(db_cursor, titles, slice_size=100):
+    '''
+    Resolve article titles to page IDs, a slice of titles per query.
+    Single redirects are followed to the article they point to, while
+    titles of double redirects and of pages that are not articles are
+    left out.  Returns a dictionary mapping the resolved titles to
+    page IDs.
+
+    @param db_cursor: dictionary cursor on the Wikipedia database
+    @type db_cursor: MySQLdb.cursors.DictCursor
+
+    @param titles: titles of the articles, with spaces or underscores
+    @type titles: list
+
+    @param slice_size: number of titles to resolve per query
+    @type slice_size: int
+    '''
+
+    # Query to get the page IDs of a list of pages and for those
+    # that are redirects also get the page ID of the page they redirect to
+    get_page_ids_query = '''SELECT p.page_title, p.page_id,
+                                     p.page_is_redirect,
+                                     redir.page_id AS redir_page_id,
+                                     redir.page_is_redirect AS double_redirect
+                              FROM page p LEFT JOIN redirect rd
+                              ON p.page_id=rd.rd_from
+                              LEFT JOIN page redir
+                              ON (rd.rd_namespace=redir.page_namespace
+                                  AND rd.rd_title=redir.page_title)
+                              WHERE p.page_namespace=0
+                              AND p.page_title IN ({titlelist})'''
+
+    # Titles as they are stored in the database, mapped to the titles
+    # we were given (e.g. both "A B" and "A_B" become "A_B")
+    db_titles = defaultdict(list)
+    for title in titles:
+        db_titles[re.sub(' ', '_', title).encode('utf-8')].append(title)
+
+    page_ids = {}
+    for subset in chunked(db_titles.keys(), slice_size):
+        try:
+            db_cursor.execute(
+                get_page_ids_query.format(
+                    titlelist=','.join(['%s'] * len(subset))),
+                subset)
+            for row in db_cursor:
+                if not row['page_is_redirect']:
+                    page_id = row['page_id']
+                elif row['redir_page_id'] and not row['double_redirect']:
+                    page_id = row['redir_page_id']
+                else:
+                    continue
+
+                for title in db_titles[row['page_title']]:
+                    page_ids[title] = page_id
+        except MySQLdb.Error as e:
+            logging.warning("Failed to get page IDs for {n} titles".format(n=len(subset)))
+            logging.warning("MySQL error {0}: {1}".format(e.args[0], e.args[1]))
+
+    return(page_ids)
+
 class Recommender():
     def __init__(self, lang='en', nrecs=10, max_depth=2, verbose=False,
-                 sliceSize=25, n_docs=1000):
+                 sliceSize=25, n_docs=1000, graph_dir=None, max_frontier=0,
+                 scoring='links', ppr_damping=0.85, ppr_iterations=10,
+                 ppr_tolerance=1e-4, ilc_dir=None, workers=None,
+                 slice_sizes=None, title_class_dir=None):
         '''
         Initialize the link recommender object.
 
@@ -64,6 +227,57 @@ class Recommender():
         @param n_docs: The number of links used as a basis to regard an article
                        as popular.
         @type n_docs: int
+
+        @param graph_dir: Directory with link graph snapshots (built by
+                          bin/build-link-graph.py).  Languages with a graph
+                          are expanded in-process instead of by querying
+                          the database replicas.
+        @type graph_dir: str
+
+        @param max_frontier: Maximum number of newly found articles we
+                             find links for at each depth, the ones with
+                             the highest scores are kept.  0 means no limit.
+        @type max_frontier: int
+
+        @param scoring: How candidates are scored when we have a link graph,
+                        'links' counts links from the user's articles and
+                        penalises popular articles, 'pagerank' runs
+                        a personalized PageRank that restarts at the
+                        user's articles.
+        @type scoring: str
+
+        @param ppr_damping: Probability that the personalized PageRank's
+                            walk follows a link rather than restarting.
+        @type ppr_damping: float
+
+        @param ppr_iterations: Maximum number of personalized PageRank
+                               iterations.
+        @type ppr_iterations: int
+
+        @param ppr_tolerance: Personalized PageRank stops when the scores
+                              change less than this between iterations.
+        @type ppr_tolerance: float
+
+        @param ilc_dir: Directory with inlink count arrays exported by
+                        the inlink count table updater, used instead of
+                        querying the inlink count tables.
+        @type ilc_dir: str
+
+        @param workers: Number of slices we fetch concurrently, per
+                        language code.  Languages not in it fetch one
+                        slice at a time.
+        @type workers: dict
+
+        @param slice_sizes: How many articles we find links for at a time,
+                            per language code.  Languages not in it use
+                            `sliceSize`.
+        @type slice_sizes: dict
+
+        @param title_class_dir: Directory with title class snapshots (built
+                                by bin/build-title-classes.py), used to
+                                exclude articles (e.g. lists, dates) without
+                                matching their titles.
+        @type title_class_dir: str
         '''
         self.lang = lang
         self.nrecs = nrecs
@@ -71,11 +285,18 @@ class Recommender():
         self.verbose = verbose
         self.sliceSize = sliceSize
         self.n_docs = n_docs
+        self.max_frontier = max_frontier
+        self.scoring = scoring
+        self.ppr_damping = ppr_damping
+        self.ppr_iterations = ppr_iterations
+        self.ppr_tolerance = ppr_tolerance
 
         ## Database connection to the replicated Wikipedia database,
-        ## and the tool database with our inlink count tables.
+        ## and the tool database with our inlink count tables,
+        ## and the language they are for.
         self.wiki_db_conn = None
         self.tool_db_conn = None
+        self.db_lang = None
 
         self.db_config = os.path.expandvars('$HOME/replica.my.cnf')
 
@@ -90,46 +311,37 @@ class Recommender():
         self.wiki_db_name = '{lang_code}wiki_p'
         self.wiki_host = '{lang_code}wiki.analytics.db.svc.eqiad.wmflabs'
 
-        # Regular expressions for things that we exclude.
-        # Note that we use match() to anchor these at the beginning
-        # of the string, instead of using "^" and search(), and that we use
-        # non-capturing groups since we're not using the results.
-        # Also note that Swedish and Norwegian Wikipedia specify dates as
-        # "xx. Januar" rather than "January 1" as they do in English.
-        self.months = {
-            'en': r'(January|February|March|April|May|June|July|August|September|October|November|December)[ _]\d+',
-            'no': r'\d+\.[ _]+(:[Jj]anuar|[Ff]ebruar|[Mm]ars|[Aa]pril|[Mm]ai|[Jj]uni|[Jj]uli|[Aa]ugust|[Ss]eptember|[Oo]ktober|[Nn]ovember|[Dd]esember)',
-            'sv': r'\d+\.[ _]+(:[Jj]anuari|[Ff]ebruari|[Mm]ars|[Aa]pril|[Mm]aj|[Jj]uni|[Jj]uli|[Aa]ugusti|[Ss]eptember|[Oo]ktober|[Nn]ovember|[Dd]ecember)',
-            'pt': r'\d+[ _]+de[ _]+(:[Jj]aneiro|[Ff]evereiro|[Mm]arço|[Aa]bril|[Mm]aio|[Jj]unho|[Jj]ulho|[Aa]gosto|[Ss]etembro|[Oo]utubro|[Nn]ovembro|[Dd]ezembro)',
-            'hu': r'Január|Február|Március|Április|Május|Június|Július|Augusztus|Szeptember|Október|November|December',
-            'fa': 'دسامب|نوامب|اکتب|سپتامب|اوت|ژوئی|ژوئن|مه|آوریل|مارس|فوریه|ژانویه',
-            'ru': r'(:Январь|Февраль|Март|Апрель|Май|Июнь|Июль|Август|Сентябрь|Октябрь|Ноябрь|Декабрь)|(:\d+[ _]+(:января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря))',
-            ## Note the negative lookahead (?! ...) to allow us to match
-            ## the actual months, but not dates.
-            'fr': r'(\d+[ _](?!.*[ _]\d+$))?([Jj]anvier|[Ff]évrier|[Mm]ars|[Aa]vril|[Mm]ai|[Jj]uin|[Jj]uillet|[Aa]oût|[Ss]eptembre|[Oo]ctobre|[Nn]ovembre|[Dd]écembre)(\d+)?',
-            }
-
-        # Note: compatible with both ' '  and '_' as spaces
-        self.lists = {
-            'en': r'^List[ _]of[ _]',
-            'no': r'^Liste[ _]over[ _]',
-            'sv': r'^Lista[ _]över[ _]',
-            'pt': r'^Lista[ _]de[ _]',
-            'hu': r'[ _]listája$',
-            'fa': r'^فهرست',
-            'ru': r'(^Список|(:Алфавитный[ _]|Хронологический[ _])список)|—[ _]список',
-            'fr': r"[Ll]iste[ _]d[e']",
-            }
-
-        # Compile the regular expressions
-        self.months_re = dict()
-        self.lists_re = dict()
-        for lang in self.months.keys():
-            self.months_re[lang] = re.compile(self.months[lang], re.U|re.I)
-            self.lists_re[lang] = re.compile(self.lists[lang], re.U|re.I)
+        # Regular expressions for things that we exclude,
+        # shared with the title classes.
+        self.months = MONTHS
+        self.lists = LISTS
+        self.months_re = MONTHS_RE
+        self.lists_re = LISTS_RE
 
         self.rec_map = defaultdict(int)
 
+        ## Mapped link graphs, keyed by language code, as tuples
+        ## of the graph and the modification time of its snapshot.
+        self.graph_dir = graph_dir
+        self.graphs = {}
+
+        ## Mapped inlink count arrays, keyed by language code, as tuples
+        ## of the array and the modification time of its file.
+        self.ilc_dir = ilc_dir
+        self.inlink_counts = {}
+
+        self.workers = workers or {}
+        self.slice_sizes = slice_sizes or {}
+
+        ## Mapped title classes, keyed by language code, as tuples
+        ## of the classes and the modification time of their snapshot.
+        self.title_class_dir = title_class_dir
+        self.title_classes = {}
+
+        ## Connection pools, keyed by database ('wiki' or 'tool')
+        ## and language code.
+        self.pools = {}
+
     def checkLang(self):
         '''
         Were we instantiated with a language we support?
@@ -153,8 +365,7 @@ class Recommender():
             return(False)
 
         # date
-        ## FIXME: what's the false positive rate on this one?
-        if re.search(r'\d{4}', item):
+        if YEAR_RE.search(item):
             return(True)
 
         # is a list
@@ -167,10 +378,71 @@ class Recommender():
 
         return(False)
 
-    def get_links(self):
-        '''Get all links from the articles in self.rec_map'''
-        if not self.rec_map:
-            return(None)
+    def exclude_page(self, classes, page_id, page_title):
+        '''
+        Do we exclude the given article (e.g. lists, dates)?  Looks up
+        its class bits if we have title classes and it was classified,
+        and otherwise matches its title with `exclude_item()`.
+
+        @param classes: title classes of the wiki we're working with,
+                        or None if we have none
+        @type classes: TitleClasses
+
+        @param page_id: page ID of the article
+        @type page_id: int
+
+        @param page_title: title of the article
+        @type page_title: str
+        '''
+        if classes is not None and page_id < len(classes.flags):
+            flags = int(classes.flags[page_id])
+            if flags & CLASSIFIED:
+                return(bool(flags & LINK_EXCLUDED))
+        return(self.exclude_item(page_title))
+
+    def get_title_classes(self, lang):
+        '''
+        Get the title classes for the given language, mapping their
+        snapshot if we haven't already or it has been rebuilt since.
+        Returns None if there are no classes for the language.
+
+        @param lang: language code of the wiki we're working with
+        @type lang: str
+        '''
+        return(mapped_title_classes(self.title_class_dir, lang,
+                                    self.title_classes))
+
+    def cap_frontier(self, frontier, scores):
+        '''
+        Limit a frontier of articles to expand to the `max_frontier`
+        with the highest scores, keeping the frontier's order for ties.
+
+        @param frontier: page IDs of the articles in the frontier
+        @type frontier: list
+
+        @param scores: current score of each page ID
+        @type scores: dict
+        '''
+        if not self.max_frontier or len(frontier) <= self.max_frontier:
+            return(frontier)
+        logging.info("capping frontier of {} articles to {}".format(len(frontier), self.max_frontier))
+        return(sorted(frontier, key=lambda page_id: -scores[page_id])[:self.max_frontier])
+
+    def get_links(self, frontier, lang):
+        '''
+        Get all links from the articles in the given frontier, adding
+        them to self.rec_map.  Returns the page IDs of the linked
+        articles that were not already in self.rec_map, which
+        form the frontier of the next depth.
+
+        @param frontier: page IDs of the articles to find links for
+        @type frontier: list
+
+        @param lang: language code of the wiki we're working with
+        @type lang: str
+        '''
+        if not frontier:
+            return([])
 
         # SQL query to get linked articles from an input set of page IDs.
         # Single redirects are resolved, double redirects are marked
@@ -193,54 +465,53 @@ class Recommender():
                                   WHERE pl.pl_namespace=0
                                   AND pl.pl_from IN ({idlist})'''
 
-        logging.info("Ready to find recs based on {n} articles.".format(n=len(self.rec_map)))
-
-        # Get a snapshot of the current set of recommendations,
-        # and extend recommendations based on it.
-        current_recs = list(self.rec_map.keys())
-        i = 0
-        with self.wiki_db_conn.cursor(MySQLdb.cursors.DictCursor) as db_cursor:
-            for subset in chunked(current_recs, self.sliceSize):
-                logging.info("fetching links for slice {}".format(i))
+        logging.info("Ready to find recs based on {n} articles.".format(n=len(frontier)))
 
-                # Get linked pages
-                try:
-                    db_cursor.execute(
-                        getLinkedPagesQuery.format(
-                            idlist=','.join([str(p) for p in subset])))
-                    for row in db_cursor:
-                        # If the link is a double redirect, we skip it
-                        if row['is_double_redirect']:
-                            continue
-                        
-                        pageId = None
-                        pageTitle = None
-                        numLinks = None
-
-                        ## If the page is a redirect, use the rediected page
-                        if row['rpage']:
-                            pageId = row['rpage']
-                            pageTitle = row['rpage_title'].decode('utf-8')
-                        else:
-                            pageId = row['lpage']
-                            pageTitle = row['lpage_title'].decode('utf-8')
-                        
-                        # Does the link go to a page that we exclude?
-                        # (e.g. lists, dates)
-                        if self.exclude_item(pageTitle):
-                            continue
-
-                        self.rec_map[pageId] += 1
+        classes = self.get_title_classes(lang)
 
-                except MySQLdb.Error as e:
-                    logging.warning("Failed to get page links")
-                    logging.warning("MySQL error {0}: {1}".format(e.args[0], e.args[1]))
+        def fetch_links(db_cursor, subset):
+            links = []
+            try:
+                db_cursor.execute(
+                    getLinkedPagesQuery.format(
+                        idlist=','.join([str(p) for p in subset])))
+                for row in db_cursor:
+                    # If the link is a double redirect, we skip it
+                    if row['is_double_redirect']:
+                        continue
+
+                    ## If the page is a redirect, use the rediected page
+                    if row['rpage']:
+                        pageId = row['rpage']
+                        pageTitle = row['rpage_title'].decode('utf-8')
+                    else:
+                        pageId = row['lpage']
+                        pageTitle = row['lpage_title'].decode('utf-8')
+
+                    # Does the link go to a page that we exclude?
+                    # (e.g. lists, dates)
+                    if self.exclude_page(classes, pageId, pageTitle):
+                        continue
+
+                    links.append(pageId)
+            except MySQLdb.Error as e:
+                logging.warning("Failed to get page links")
+                logging.warning("MySQL error {0}: {1}".format(e.args[0], e.args[1]))
+            return(links)
+
+        # Merge the slices' links in order, so the frontier
+        # doesn't depend on which slice finished first
+        new_pages = []
+        for links in self.fetch_slices(lang, 'wiki', frontier, fetch_links):
+            for pageId in links:
+                if pageId not in self.rec_map:
+                    new_pages.append(pageId)
+                self.rec_map[pageId] += 1
+
+        logging.info("rec_map now contains {0} items".format(len(self.rec_map)))
 
-                logging.info("rec_map now contains {0} items".format(len(self.rec_map)))
-                i += 1
-                
         # OK, done
-        return()
+        return(new_pages)
 
     def recommend(self, user, lang, user_edits, n_recs):
         '''
@@ -261,18 +532,9 @@ class Recommender():
         @type n_recs: int
         '''
 
-        # Query to get the page ID of a given page and if it's
-        # a redirect also get the page ID of the page it redirects to
-        getPageIdQuery = '''SELECT p.page_id, p.page_is_redirect,
-                                   redir.page_id AS redir_page_id,
-                                   redir.page_is_redirect AS double_redirect
-                            FROM page p LEFT JOIN redirect rd
-                            ON p.page_id=rd.rd_from
-                            LEFT JOIN page redir
-                            ON (rd.rd_namespace=redir.page_namespace
-                                AND rd.rd_title=redir.page_title)
-                            WHERE p.page_namespace=0
-                            AND p.page_title=%(title)s'''
+        graph = self.get_graph(lang)
+        if graph:
+            return(self.recommend_from_graph(graph, user_edits, n_recs))
 
         # Query to get the page titles for a list of page IDs
         getPageTitlesQuery = '''SELECT page_id, page_title
@@ -284,162 +546,434 @@ class Recommender():
                                    FROM {ilc_table}
                                    WHERE ilc_page_id IN ({idlist})'''
 
+        classes = self.get_title_classes(lang)
+
         # Connect to the database servers using the correct language
         self.connect(lang)
-        
-        # We create our dictionary of recommendations by fetching page IDs
-        # for all items we've received that are not to be excluded,
-        # resolving single redirects in the process and ignoring double redirects.
-        # We also swap the keys in item_map from page titles to IDs
-        # so we can use them for removal of edited articles later.
-        self.rec_map = defaultdict(int)
-        newItemMap = {}
-        with self.wiki_db_conn.cursor(MySQLdb.cursors.DictCursor) as db_cursor:
+        try:
+            # We create our dictionary of recommendations by fetching page IDs
+            # for all items we've received that are not to be excluded,
+            # resolving single redirects in the process and ignoring double redirects.
+            # We also swap the keys in item_map from page titles to IDs
+            # so we can use them for removal of edited articles later.
+            self.rec_map = defaultdict(int)
+            newItemMap = {}
+            with self.wiki_db_conn.cursor(MySQLdb.cursors.DictCursor) as db_cursor:
+                page_ids = resolve_titles(db_cursor, user_edits)
+
             for page_title in user_edits:
+                page_id = page_ids.get(page_title)
+                if page_id:
+                    # Store `val` in new item map, add page ID to rec seed
+                    # if not an item to exclude
+                    newItemMap[page_id] = 1
+                    if not self.exclude_page(classes, page_id, page_title):
+                        self.rec_map[page_id] = 0
+
+            item_map = newItemMap
+            newItemMap = None
+
+            depth = 0
+            max_depth = self.max_depth
+            n_items = len(item_map)
+
+            # Breadth-first search, at each depth we only find links for
+            # the articles found at the previous one.
+            frontier = list(self.rec_map.keys())
+            while (len(self.rec_map) - n_items) < n_recs \
+                    and depth < max_depth and frontier:
+                frontier = self.cap_frontier(frontier, self.rec_map)
+                logging.info("Calling get_links(), with {n} recs in the map and {f} in the frontier.".format(n=len(self.rec_map), f=len(frontier)))
+                frontier = self.get_links(frontier, lang)
+                depth += 1
+
+            # Delete any articles that the user already edited
+            for pageId in item_map.keys():
+                if pageId in self.rec_map:
+                    del(self.rec_map[pageId])
+
+            logging.info("Deleted edited pages, rec set now contains {n} articles".format(n=len(self.rec_map)))
+
+            ## Grab inlink counts and use that to calculate new scores,
+            ## from the exported array if we have one
+            inlink_counts = self.get_inlink_counts(lang)
+            if inlink_counts is not None:
+                page_ids = np.fromiter(self.rec_map.keys(), dtype=np.int64,
+                                       count=len(self.rec_map))
+                scores = np.fromiter(self.rec_map.values(), dtype=np.float64,
+                                     count=len(self.rec_map))
+
+                # Pages missing from the table, or created after the export,
+                # are left unweighted, as when we query the table
+                num_links = np.full(len(page_ids), MISSING_INLINK_COUNT,
+                                    dtype=np.int64)
+                known = page_ids < len(inlink_counts)
+                num_links[known] = inlink_counts[page_ids[known]]
+                known = num_links != MISSING_INLINK_COUNT
+
+                scores[known] *= np.log(
+                    self.n_docs / np.fabs(math.exp(3) - num_links[known]))
+                self.rec_map = dict(zip(page_ids.tolist(), scores.tolist()))
+
+            else:
+                def fetch_inlink_counts(db_cursor, subset):
+                    counts = []
+                    try:
+                        db_cursor.execute(get_inlinkcount_query.format(
+                            ilc_table=self.tool_ilc_table.format(lang_code = lang),
+                            idlist=','.join([str(p) for p in subset])))
+                        counts = [(row['ilc_page_id'], row['ilc_numlinks'])
+                                  for row in db_cursor]
+                    except MySQLdb.Error as e:
+                        logging.warning("Failed to get inlink counts")
+                        logging.warning("MySQL error {0}: {1}".format(e.args[0], e.args[1]))
+                    return(counts)
+
+                for rows in self.fetch_slices(lang, 'tool', list(self.rec_map.keys()),
+                                              fetch_inlink_counts):
+                    for (pageId, numLinks) in rows:
+                        # Classic idf = log(N/df).  We'd like to not give
+                        # singly-linked items quite so much clout, and so
+                        # we put the highest weight on things that have
+                        # a few links.  How to estimate?  The "right" way
+                        # is to make it a parameter and test against people.
+
+                        # calculate penalty for popular links using
+                        # a classic idf = log(N/df)
+
+                        idf = math.log(
+                            self.n_docs/math.fabs(math.exp(3)-numLinks))
+
+                        self.rec_map[pageId] *= idf
+
+            logging.info('Applied TF/IDF scores to all pages, rec set now contains {} articles'.format(len(self.rec_map)))
+                    
+            # Sort the recs in descending order by score,
+            # limit size to self.nrecs if larger than that,
+            # then recreate as a dict for mapping page IDs to values.
+            self.rec_map = dict(sorted(self.rec_map.items(),
+                                       key=operator.itemgetter(1),
+                                       reverse=True)[:n_recs])
+
+            logging.info("Sorted and attempted truncation to {nrecs}, rec set now contains {n} articles".format(nrecs = n_recs, n=len(self.rec_map)))
+
+            def fetch_titles(db_cursor, subset):
+                titles = []
                 try:
-                    db_cursor.execute(
-                        getPageIdQuery,
-                        {'title':
-                         re.sub(b' ', b'_', page_title.encode('utf-8'))
-                         }
-                    )
-                    row = db_cursor.fetchone()
-                    db_cursor.fetchall() # flush cursor
-                    page_id = None
-                    if row:
-                        # Article exists, set pageId accordingly
-                        if not row['page_is_redirect']:
-                            page_id = row['page_id']
-                        elif not row ['double_redirect']:
-                            page_id = row['redir_page_id']
-
-                    if page_id:
-                        # Store `val` in new item map, add page ID to rec seed
-                        # if not an item to exclude
-                        newItemMap[page_id] = 1
-                        if not self.exclude_item(page_title):
-                            self.rec_map[page_id] = 0
+                    db_cursor.execute(getPageTitlesQuery.format(
+                        idlist=','.join([str(p) for p in subset])))
+                    for row in db_cursor:
+                        titles.append((row['page_id'],
+                                       row['page_title'].decode('utf-8')))
                 except MySQLdb.Error as e:
-                    logging.warning("Failed to get page ID for {title}".format(title=page_title))
+                    logging.warning("Failed to get page titles")
                     logging.warning("MySQL error {0}: {1}".format(e.args[0], e.args[1]))
+                return(titles)
+
+            recs = {}
+            for titles in self.fetch_slices(lang, 'wiki', list(self.rec_map.keys()),
+                                            fetch_titles):
+                for (pageId, pageTitle) in titles:
+                    pageTitle = re.sub('_', ' ', pageTitle)
+                    recs[pageTitle] = self.rec_map[pageId]
+        finally:
+            # Return our connections to their pools, even if we failed
+            self.close()
+                    
+        # Sort (again) and translate from tuples to dicts with item and value keys
+        recs = sorted(recs.items(),
+                      key=operator.itemgetter(1),
+                      reverse=True)
+        recs = [{'item': pageTitle, 'value': recVal} for (pageTitle, recVal) in recs]
 
-        item_map = newItemMap
-        newItemMap = None
+        return(recs)
 
-        depth = 0
-        max_depth = self.max_depth
-        n_items = len(item_map)
+    def get_graph(self, lang):
+        '''
+        Get the link graph for the given language, mapping its snapshot
+        if we haven't already or it has been rebuilt since.  Returns None
+        if there is no graph for the language.
 
-        while (len(self.rec_map) - n_items) < n_recs \
-                and depth < max_depth:
-            logging.info("Calling get_links(), with {n} recs in the map.".format(n=len(self.rec_map)))
-            self.get_links()
+        @param lang: language code of the wiki we're working with
+        @type lang: str
+        '''
+        if not self.graph_dir:
+            return(None)
+
+        path = graph_path(self.graph_dir, lang)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return(None)
+
+        (graph, graph_mtime) = self.graphs.get(lang, (None, None))
+        if graph_mtime != mtime:
+            graph = LinkGraph(lang)
+            if not graph.load_snapshot(path):
+                return(None)
+            self.graphs[lang] = (graph, mtime)
+        return(graph)
+
+    def get_inlink_counts(self, lang):
+        '''
+        Get the inlink counts for the given language as an array
+        indexed by page ID, mapping the exported array if we haven't
+        already or it has been exported since.  Returns None if there
+        is no array for the language.
+
+        @param lang: language code of the wiki we're working with
+        @type lang: str
+        '''
+        if not self.ilc_dir:
+            return(None)
+
+        path = os.path.join(self.ilc_dir, '{}.npy'.format(
+            self.tool_ilc_table.format(lang_code=lang)))
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return(None)
+
+        (counts, counts_mtime) = self.inlink_counts.get(lang, (None, None))
+        if counts_mtime != mtime:
+            counts = np.load(path, mmap_mode='r')
+            self.inlink_counts[lang] = (counts, mtime)
+            logging.info("mapped inlink counts of {} page IDs from {}".format(len(counts), path))
+        return(counts)
+
+    def recommend_from_graph(self, graph, user_edits, n_recs):
+        '''
+        Get recommendations by expanding the user's articles along
+        the links in a link graph, scoring them the same way as
+        `recommend()` does with the database replicas.
+
+        @param graph: link graph of the wiki we're recommending for
+        @type graph: LinkGraph
+
+        @param user_edits: titles of the articles the user has edited
+        @type user_edits: list
+
+        @param n_recs: number of recommendations we are to return
+        @type n_recs: int
+        '''
+
+        classes = self.get_title_classes(graph.lang)
+
+        # Dense IDs of the articles the user edited, and of those
+        # that we expand from (the ones that are not excluded).
+        edited = set()
+        seeds = set()
+        for page_title in user_edits:
+            article_id = graph.resolve(page_title)
+            if article_id is None:
+                continue
+            edited.add(article_id)
+            if not self.exclude_page(classes, int(graph.page_ids[article_id]),
+                                     page_title):
+                seeds.add(article_id)
+
+        # Found articles and their scores, sorted by dense ID
+        rec_ids = np.array(sorted(seeds), dtype=np.int32)
+        rec_scores = np.zeros(len(rec_ids))
+
+        if self.scoring == 'pagerank':
+            return(self.recommend_from_pagerank(graph, classes, rec_ids,
+                                                edited, n_recs))
+
+        depth = 0
+        frontier = rec_ids
+        while (len(rec_ids) - len(edited)) < n_recs \
+                and depth < self.max_depth and len(frontier):
+            # As in get_links(), each link from an article in the frontier
+            # adds one to the linked article's score, and the next frontier
+            # is the articles we hadn't found before.
+            if self.max_frontier and len(frontier) > self.max_frontier:
+                frontier_scores = rec_scores[np.searchsorted(rec_ids, frontier)]
+                frontier = frontier[np.argsort(-frontier_scores,
+                                               kind='stable')[:self.max_frontier]]
+
+            (link_ids, link_counts) = np.unique(graph.links(frontier),
+                                                return_counts=True)
+            # Articles are excluded by their class bits, those we don't
+            # have classes for by matching their titles.
+            if classes is not None:
+                flags = classes.page_flags(graph.page_ids[link_ids])
+            else:
+                flags = np.zeros(len(link_ids), dtype=np.uint8)
+            keep = (flags & LINK_EXCLUDED) == 0
+            unclassified = np.flatnonzero((flags & CLASSIFIED) == 0)
+            keep[unclassified] = [not self.exclude_item(graph.titles[link_id])
+                                  for link_id in link_ids[unclassified].tolist()]
+            link_ids = link_ids[keep]
+            frontier = np.setdiff1d(link_ids, rec_ids, assume_unique=True)
+
+            (rec_ids, inverse) = np.unique(
+                np.concatenate([rec_ids, link_ids]),
+                return_inverse=True)
+            rec_scores = np.bincount(
+                inverse,
+                weights=np.concatenate([rec_scores, link_counts[keep]]),
+                minlength=len(rec_ids))
             depth += 1
+            logging.info("expanded to depth {}, rec set now contains {} articles".format(depth, len(rec_ids)))
 
         # Delete any articles that the user already edited
-        for pageId in item_map.keys():
-            if pageId in self.rec_map:
-                del(self.rec_map[pageId])
+        keep = ~np.isin(rec_ids, np.array(list(edited), dtype=np.int32))
+        rec_ids = rec_ids[keep]
+        rec_scores = rec_scores[keep]
 
-        logging.info("Deleted edited pages, rec set now contains {n} articles".format(n=len(self.rec_map)))
+        # Penalise popular articles, see recommend()
+        rec_scores *= np.log(
+            self.n_docs / np.fabs(math.exp(3) - graph.in_degree[rec_ids]))
 
-        ## Grab inlink counts and use that to calculate new scores
-        with self.tool_db_conn.cursor(MySQLdb.cursors.DictCursor) as db_cursor:
-            for subset in chunked(self.rec_map.keys(), self.sliceSize):
-                db_cursor.execute(get_inlinkcount_query.format(
-                    ilc_table=self.tool_ilc_table.format(lang_code = lang),
-                    idlist=','.join([str(p) for p in subset])))
+        top = np.argsort(-rec_scores, kind='stable')[:n_recs]
+        recs = [{'item': graph.titles[rec_id].replace('_', ' '),
+                 'value': rec_score}
+                for (rec_id, rec_score) in zip(rec_ids[top].tolist(),
+                                               rec_scores[top].tolist())]
 
-                for row in db_cursor:
-                    # Classic idf = log(N/df).  We'd like to not give
-                    # singly-linked items quite so much clout, and so
-                    # we put the highest weight on things that have
-                    # a few links.  How to estimate?  The "right" way
-                    # is to make it a parameter and test against people.
-            
-                    # calculate penalty for popular links using
-                    # a classic idf = log(N/df)
-                    
-                    idf = math.log(
-                        self.n_docs/math.fabs(math.exp(3)-row['ilc_numlinks']))
-            
-                    self.rec_map[row['ilc_page_id']] *= idf
+        logging.info("returning {} recommendations from the link graph".format(len(recs)))
+        return(recs)
 
-        logging.info('Applied TF/IDF scores to all pages, rec set now contains {} articles'.format(len(self.rec_map)))
-                    
-        # Sort the recs in descending order by score,
-        # limit size to self.nrecs if larger than that,
-        # then recreate as a dict for mapping page IDs to values.
-        self.rec_map = dict(sorted(self.rec_map.items(),
-                                   key=operator.itemgetter(1),
-                                   reverse=True)[:n_recs])
-
-        logging.info("Sorted and attempted truncation to {nrecs}, rec set now contains {n} articles".format(nrecs = n_recs, n=len(self.rec_map)))
-
-        recs = {}
-        with self.wiki_db_conn.cursor(MySQLdb.cursors.DictCursor) as db_cursor:
-            for subset in chunked(self.rec_map.keys(), self.sliceSize):
-                try:
-                    db_cursor.execute(getPageTitlesQuery.format(
-                        idlist=','.join([str(p) for p in subset])))
-                    for row in db_cursor:
-                        pageId = row['page_id']
-                        pageTitle = row['page_title'].decode('utf-8')
-                        pageTitle = re.sub('_', ' ', pageTitle)
-                        recs[pageTitle] = self.rec_map[pageId]
+    def recommend_from_pagerank(self, graph, classes, seeds, edited, n_recs):
+        '''
+        Get recommendations by running a personalized PageRank over
+        a link graph, restarting at the user's articles, and returning
+        the highest ranked articles the user hasn't edited.
 
-                except pymysql.Error as e:
-                    logging.warning("Failed to get page titles")
-                    logging.warning("MySQL error {0}: {1}".format(e.args[0], e.args[1]))
+        @param graph: link graph of the wiki we're recommending for
+        @type graph: LinkGraph
 
-        # Disconnect from the database servers
-        self.close()
-                    
-        # Sort (again) and translate from tuples to dicts with item and value keys
-        recs = sorted(recs.items(),
-                      key=operator.itemgetter(1),
-                      reverse=True)
-        recs = [{'item': pageTitle, 'value': recVal} for (pageTitle, recVal) in recs]
+        @param classes: title classes of the wiki, or None if we have none
+        @type classes: TitleClasses
+
+        @param seeds: dense IDs of the articles the walk restarts at
+        @type seeds: numpy.ndarray
+
+        @param edited: dense IDs of the articles the user has edited
+        @type edited: set
 
+        @param n_recs: number of recommendations we are to return
+        @type n_recs: int
+        '''
+        (rec_ids, rec_scores) = graph.personalized_pagerank(
+            seeds, damping=self.ppr_damping, max_iter=self.ppr_iterations,
+            tol=self.ppr_tolerance)
+
+        # Go through the articles in order of score, skipping those
+        # the user edited and those we exclude (e.g. lists, dates)
+        recs = []
+        for i in np.argsort(-rec_scores, kind='stable').tolist():
+            rec_id = int(rec_ids[i])
+            if rec_id in edited:
+                continue
+            page_title = graph.titles[rec_id]
+            if self.exclude_page(classes, int(graph.page_ids[rec_id]),
+                                 page_title):
+                continue
+            recs.append({'item': page_title.replace('_', ' '),
+                         'value': float(rec_scores[i])})
+            if len(recs) == n_recs:
+                break
+
+        logging.info("returning {} recommendations from personalized PageRank".format(len(recs)))
         return(recs)
 
-    def connect(self, lang):
+    def get_pool(self, lang, database):
         '''
-        Connect to the appropriate Wikipedia and user databases.
-        
+        Get the connection pool for the given language and database,
+        creating it if necessary.  Pools hold one connection per worker,
+        plus the one held by `connect()`.
+
         @param lang: language code of the wiki we're working with
         @type lang: str
+
+        @param database: which database, 'wiki' for the replicated
+                         Wikipedia database, 'tool' for the Tool database
+        @type database: str
         '''
         try:
-            self.wiki_db_conn = MySQLdb.connect(
-                host = self.wiki_host.format(lang_code = lang),
-                database = self.wiki_db_name.format(lang_code = lang),
-                read_default_file = self.db_config,
-                charset = 'utf8'
-        )
-        except:
-            raise DatabaseConnectionError
+            return(self.pools[(database, lang)])
+        except KeyError:
+            if database == 'wiki':
+                connect = partial(MySQLdb.connect,
+                                  host = self.wiki_host.format(lang_code = lang),
+                                  database = self.wiki_db_name.format(lang_code = lang),
+                                  read_default_file = self.db_config,
+                                  charset = 'utf8')
+            else:
+                connect = partial(MySQLdb.connect,
+                                  host = self.tool_host,
+                                  database = self.tool_db.format(lang_code = lang),
+                                  read_default_file = self.db_config,
+                                  charset = 'utf8')
+            pool = ConnectionPool(connect, self.workers.get(lang, 1) + 1)
+            self.pools[(database, lang)] = pool
+            return(pool)
+
+    def fetch_slices(self, lang, database, page_ids, fetch):
+        '''
+        Split the given page IDs into slices and call `fetch` with a
+        dictionary cursor and each slice, running up to the language's
+        number of workers concurrently, each on its own pooled connection.
+        Returns the results of `fetch`, in the order of the slices.
+
+        @param lang: language code of the wiki we're working with
+        @type lang: str
+
+        @param database: which database to use, see `get_pool()`
+        @type database: str
+
+        @param page_ids: page IDs to split into slices
+        @type page_ids: list
+
+        @param fetch: function taking a cursor and a slice of page IDs
+        @type fetch: callable
+        '''
+        pool = self.get_pool(lang, database)
+        slices = list(chunked(page_ids, self.slice_sizes.get(lang, self.sliceSize)))
+
+        def fetch_slice(subset):
+            db_conn = pool.acquire()
+            try:
+                with db_conn.cursor(MySQLdb.cursors.DictCursor) as db_cursor:
+                    return(fetch(db_cursor, subset))
+            finally:
+                pool.release(db_conn)
+
+        n_workers = min(self.workers.get(lang, 1), len(slices))
+        logging.info("fetching {} slices from the {} database with {} workers".format(len(slices), database, n_workers))
+        if n_workers <= 1:
+            return([fetch_slice(subset) for subset in slices])
 
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            return(list(executor.map(fetch_slice, slices)))
+
+    def connect(self, lang):
+        '''
+        Connect to the appropriate Wikipedia and user databases,
+        using connections from our pools.
+        
+        @param lang: language code of the wiki we're working with
+        @type lang: str
+        '''
+        self.wiki_db_conn = self.get_pool(lang, 'wiki').acquire()
+        self.db_lang = lang
         try:
-            self.tool_db_conn = MySQLdb.connect(
-                host = self.tool_host,
-                database = self.tool_db.format(lang_code = lang),
-                read_default_file = self.db_config,
-                charset = 'utf8'
-            )
-        except:
-            raise DatabaseConnectionError
+            self.tool_db_conn = self.get_pool(lang, 'tool').acquire()
+        except DatabaseConnectionError:
+            self.get_pool(lang, 'wiki').release(self.wiki_db_conn)
+            raise
 
         ## all ok
         return()
 
     def close(self):
-        '''Close our database connections.'''
-        try:
-            self.wiki_db_conn.close()
-            self.tool_db_conn.close()
-        except:
-            raise DatabaseConnectionError
+        '''Return our database connections to their pools.'''
+        self.get_pool(self.db_lang, 'wiki').release(self.wiki_db_conn)
+        self.get_pool(self.db_lang, 'tool').release(self.tool_db_conn)
+        self.wiki_db_conn = None
+        self.tool_db_conn = None
 
         ## all ok
         return()
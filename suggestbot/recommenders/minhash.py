@@ -0,0 +1,192 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+'''
+MinHash signatures and locality-sensitive hashing (LSH) over the article
+sets in a co-edit index, used by the co-edit recommender to find likely
+neighbours from an index lookup rather than enumerating every editor
+of every article in the basket.
+
+Copyright (C) 2016 SuggestBot Dev Group
+
+This library is free software; you can redistribute it and/or
+modify it under the terms of the GNU Library General Public
+License as published by the Free Software Foundation; either
+version 2 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+Library General Public License for more details.
+
+You should have received a copy of the GNU Library General Public
+License along with this library; if not, write to the
+Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+Boston, MA  02110-1301, USA.
+'''
+
+import time
+import logging
+
+import numpy as np
+
+# Hash functions are h(x) = (a*x + b) mod MERSENNE_PRIME, with article IDs
+# smaller than the prime, so the products fit comfortably in 64 bits.
+MERSENNE_PRIME = (1 << 31) - 1
+
+# Number of (user, article) cells we hash at a time when building signatures
+CHUNK_SIZE = 1 << 17
+
+class MinHashIndex:
+    def __init__(self, num_perm=64, bands=32, seed=1):
+        '''
+        Instantiate an empty MinHash LSH index.
+
+        :param num_perm: number of hash functions in a signature
+        :type num_perm: int
+
+        :param bands: number of LSH bands the signature is split into,
+                      must divide `num_perm`.  More bands (of fewer rows)
+                      finds neighbours with lower similarity, at the cost
+                      of more candidates to check.
+        :type bands: int
+
+        :param seed: seed for generating the hash functions
+        :type seed: int
+        '''
+        if num_perm % bands:
+            raise ValueError('number of bands must divide the number of permutations')
+
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        rng = np.random.RandomState(seed)
+        self.hash_a = rng.randint(1, MERSENNE_PRIME,
+                                  size=num_perm).astype(np.uint64)
+        self.hash_b = rng.randint(0, MERSENNE_PRIME,
+                                  size=num_perm).astype(np.uint64)
+
+        # Random odd multipliers used to combine the rows of a band
+        # into a single 64-bit bucket key.
+        self.band_mult = (rng.randint(1, 1 << 62, size=self.rows,
+                                      dtype=np.int64).astype(np.uint64)
+                          | np.uint64(1))
+
+        # For each band, the bucket keys of all users, sorted,
+        # and the user IDs in the same order.
+        self.band_keys = []
+        self.band_users = []
+
+        # Experience threshold the index was built with
+        self.exp_threshold = None
+
+    def signatures(self, sets):
+        '''
+        Calculate MinHash signatures for every row in a sparse matrix of sets.
+        Rows with empty sets get a signature that never matches anything.
+
+        :param sets: rows × items matrix, non-zero cells are set members
+        :type sets: scipy.sparse.csr_matrix
+        '''
+        n_rows = sets.shape[0]
+        sigs = np.full((n_rows, self.num_perm), MERSENNE_PRIME,
+                       dtype=np.uint64)
+        indptr = sets.indptr
+        items = sets.indices.astype(np.uint64)
+
+        # Process whole rows, roughly CHUNK_SIZE cells at a time
+        start_row = 0
+        while start_row < n_rows:
+            end_row = int(np.searchsorted(indptr, indptr[start_row] + CHUNK_SIZE,
+                                          side='right')) - 1
+            end_row = min(max(end_row, start_row + 1), n_rows)
+
+            lo, hi = indptr[start_row], indptr[end_row]
+            row_starts = indptr[start_row:end_row] - lo
+            non_empty = np.diff(indptr[start_row:end_row+1]) > 0
+            if hi > lo:
+                hashed = (np.outer(items[lo:hi], self.hash_a)
+                          + self.hash_b) % np.uint64(MERSENNE_PRIME)
+                mins = np.minimum.reduceat(hashed,
+                                           row_starts[non_empty], axis=0)
+                sigs[start_row:end_row][non_empty] = mins
+            start_row = end_row
+
+        return(sigs)
+
+    def band_hashes(self, sigs):
+        '''
+        Combine each band of the given signatures into a 64-bit bucket key.
+        Returns a rows × bands array.
+        '''
+        sigs = sigs.reshape(sigs.shape[0], self.bands, self.rows)
+        return((sigs * self.band_mult).sum(axis=2, dtype=np.uint64))
+
+    def build(self, coedit_index, exp_threshold):
+        '''
+        Build the LSH buckets for every user in a co-edit index, based on
+        the articles we compare them on (see `CoeditIndex.effective_sets()`).
+
+        :param coedit_index: the co-edit index to build from
+        :type coedit_index: CoeditIndex
+
+        :param exp_threshold: number of edits to be an experienced user
+        :type exp_threshold: int
+        '''
+        start = time.time()
+        sets = coedit_index.effective_sets(exp_threshold)
+        keys = self.band_hashes(self.signatures(sets))
+
+        # Users with no articles to compare on never match anything
+        has_articles = np.flatnonzero(np.diff(sets.indptr) > 0)
+        keys = keys[has_articles]
+
+        self.band_keys = []
+        self.band_users = []
+        for band in range(self.bands):
+            order = np.argsort(keys[:, band], kind='stable')
+            self.band_keys.append(keys[order, band])
+            self.band_users.append(has_articles[order].astype(np.int32))
+
+        self.exp_threshold = exp_threshold
+        logging.info("built LSH index of {} users with {} bands of {} rows in {:.1f} seconds".format(
+            len(has_articles), self.bands, self.rows, time.time() - start))
+
+    def query(self, article_ids, max_candidates):
+        '''
+        Find the users whose article sets are most likely to be similar
+        to the given set of articles.  Returns up to `max_candidates`
+        user IDs, ordered by how many bands they share with the query.
+
+        :param article_ids: IDs of the articles in the query set
+        :type article_ids: numpy.ndarray
+
+        :param max_candidates: maximum number of users to return
+        :type max_candidates: int
+        '''
+        if not len(article_ids):
+            return(np.array([], dtype=np.int32))
+
+        sig = np.min((np.outer(np.asarray(article_ids, dtype=np.uint64),
+                               self.hash_a)
+                      + self.hash_b) % np.uint64(MERSENNE_PRIME), axis=0)
+        keys = self.band_hashes(sig[np.newaxis, :])[0]
+
+        matches = []
+        for band in range(self.bands):
+            band_keys = self.band_keys[band]
+            lo = np.searchsorted(band_keys, keys[band], side='left')
+            hi = np.searchsorted(band_keys, keys[band], side='right')
+            if hi > lo:
+                matches.append(self.band_users[band][lo:hi])
+
+        if not matches:
+            return(np.array([], dtype=np.int32))
+
+        (users, collisions) = np.unique(np.concatenate(matches),
+                                        return_counts=True)
+        if len(users) > max_candidates:
+            top = np.argpartition(-collisions, max_candidates)[:max_candidates]
+            users = users[top]
+            collisions = collisions[top]
+        return(users[np.argsort(-collisions, kind='stable')])
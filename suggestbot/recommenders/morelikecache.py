@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8  -*-
+'''
+Disk-backed cache of morelike search results, so the text recommender
+doesn't ask CirrusSearch for the neighbours of the same popular articles
+for every user.  The cache is an SQLite database, so every text server
+process on a host can share it.
+
+Entries expire after a given time, and when we know the article has been
+edited since its results were cached.  The cache is kept to a given
+number of entries by evicting the least recently used ones.
+
+Copyright (C) 2016 SuggestBot Dev Group
+
+This library is free software; you can redistribute it and/or
+modify it under the terms of the GNU Library General Public
+License as published by the Free Software Foundation; either
+version 2 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+Library General Public License for more details.
+
+You should have received a copy of the GNU Library General Public
+License along with this library; if not, write to the
+Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+Boston, MA  02110-1301, USA.
+'''
+
+import json
+import time
+import logging
+import sqlite3
+
+class MorelikeCache:
+    def __init__(self, path, ttl=604800, max_entries=100000):
+        '''
+        Open the cache, creating it if it doesn't exist.
+
+        :param path: path of the SQLite database file
+        :type path: str
+
+        :param ttl: number of seconds a cached result is used for
+        :type ttl: int
+
+        :param max_entries: maximum number of cached results, 0 means
+                            no limit
+        :type max_entries: int
+        '''
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        # Lookups since the cache was opened
+        self.hits = 0
+        self.misses = 0
+
+        # Other processes may be writing, wait for them rather than fail
+        self.db_conn = sqlite3.connect(path, timeout=30)
+        self.db_conn.execute('PRAGMA journal_mode=WAL')
+        self.db_conn.execute('''CREATE TABLE IF NOT EXISTS morelike (
+                                    lang TEXT NOT NULL,
+                                    title TEXT NOT NULL,
+                                    revision INTEGER,
+                                    srlimit INTEGER NOT NULL,
+                                    results TEXT NOT NULL,
+                                    fetched REAL NOT NULL,
+                                    used REAL NOT NULL,
+                                    PRIMARY KEY (lang, title))''')
+        self.db_conn.execute('''CREATE INDEX IF NOT EXISTS morelike_used
+                                ON morelike (used)''')
+        self.db_conn.commit()
+
+    def get(self, lang, title, srlimit, revision=None):
+        '''
+        Get the cached results for the given article, or None if there
+        are none we can use: none cached, they have expired, they were
+        fetched with a lower limit, or the article has been edited since.
+
+        :param lang: language code of the Wikipedia the article is from
+        :type lang: str
+
+        :param title: title of the article
+        :type title: str
+
+        :param srlimit: number of results we want
+        :type srlimit: int
+
+        :param revision: ID of the article's current revision, if known
+        :type revision: int
+        '''
+        row = self.db_conn.execute(
+            '''SELECT revision, srlimit, results, fetched
+               FROM morelike
+               WHERE lang=? AND title=?''', (lang, title)).fetchone()
+
+        now = time.time()
+        if row is None \
+           or row[1] < srlimit \
+           or now - row[3] > self.ttl \
+           or (revision is not None and row[0] is not None
+               and row[0] != revision):
+            self.misses += 1
+            return(None)
+
+        self.db_conn.execute('''UPDATE morelike SET used=?
+                                WHERE lang=? AND title=?''',
+                             (now, lang, title))
+        self.db_conn.commit()
+        self.hits += 1
+        return(json.loads(row[2])[:srlimit])
+
+    def put(self, lang, title, srlimit, results, revision=None):
+        '''
+        Cache the results for the given article.
+
+        :param lang: language code of the Wikipedia the article is from
+        :type lang: str
+
+        :param title: title of the article
+        :type title: str
+
+        :param srlimit: the limit the results were fetched with
+        :type srlimit: int
+
+        :param results: titles of the articles found, most similar first
+        :type results: list
+
+        :param revision: ID of the article's revision the results are for,
+                         if known
+        :type revision: int
+        '''
+        now = time.time()
+        self.db_conn.execute(
+            '''INSERT OR REPLACE INTO morelike
+               (lang, title, revision, srlimit, results, fetched, used)
+               VALUES (?, ?, ?, ?, ?, ?, ?)''',
+            (lang, title, revision, srlimit, json.dumps(results), now, now))
+        self.db_conn.commit()
+
+    def trim(self):
+        '''
+        Evict the least recently used results if the cache has grown
+        beyond `max_entries`.
+        '''
+        if not self.max_entries:
+            return()
+
+        (num_entries,) = self.db_conn.execute(
+            'SELECT COUNT(*) FROM morelike').fetchone()
+        if num_entries <= self.max_entries:
+            return()
+
+        self.db_conn.execute(
+            '''DELETE FROM morelike
+               WHERE rowid IN (SELECT rowid FROM morelike
+                               ORDER BY used
+                               LIMIT ?)''',
+            (num_entries - self.max_entries,))
+        self.db_conn.commit()
+        logging.info("evicted {} morelike results from the cache".format(
+            num_entries - self.max_entries))
+        return()
+
+    def stats(self):
+        '''
+        Get the hit and miss counts since the cache was opened, and the
+        resulting hit rate, as a dictionary.
+        '''
+        lookups = self.hits + self.misses
+        return({'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0})
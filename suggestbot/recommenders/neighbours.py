@@ -0,0 +1,452 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+'''
+Set-based SQL queries for finding co-editing neighbours, shared by the
+co-edit article recommender and the collaborator recommender.  Rather than
+asking for the editors of one article and the articles of one user at a
+time, these queries ask about the whole basket or a slice of users at once
+and let the database do the counting.
+
+Copyright (C) 2016 SuggestBot Dev Group
+
+This library is free software; you can redistribute it and/or
+modify it under the terms of the GNU Library General Public
+License as published by the Free Software Foundation; either
+version 2 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+Library General Public License for more details.
+
+You should have received a copy of the GNU Library General Public
+License along with this library; if not, write to the
+Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+Boston, MA  02110-1301, USA.
+'''
+
+import math
+import hashlib
+import logging
+
+from more_itertools import chunked
+
+from suggestbot import config
+
+# SQL expression matching `editor_hash()`, the first 32 bits of the MD5
+# digest of the user name as an unsigned integer.
+EDITOR_HASH_SQL = "CONV(LEFT(MD5(rev_user), 8), 16, 10)"
+
+def editor_hash(user):
+    '''
+    Stable 32-bit hash of a user name, used to pick the same sample
+    of editors of a hub article every time, in SQL and in Python.
+
+    :param user: name of the user
+    :type user: str
+    '''
+    return(int(hashlib.md5(user.encode('utf-8')).hexdigest()[:8], 16))
+
+def hub_cutoff(num_editors, max_editors):
+    '''
+    Hash value below which an editor of an article with `num_editors`
+    editors is sampled, so that we expect to keep `max_editors` of them.
+
+    :param num_editors: number of distinct editors of the article
+    :type num_editors: int
+
+    :param max_editors: maximum number of editors we consider per article
+    :type max_editors: int
+    '''
+    return((max_editors << 32) // num_editors)
+
+def hub_weight(num_editors, max_editors):
+    '''
+    IDF-style weight of neighbours found through an article with
+    `num_editors` editors: 1 for articles with at most `max_editors`
+    editors, falling off logarithmically for larger ones.
+
+    :param num_editors: number of distinct editors of the article
+    :type num_editors: int
+
+    :param max_editors: maximum number of editors we consider per article
+    :type max_editors: int
+    '''
+    return(min(1.0, math.log1p(max_editors) / math.log1p(num_editors)))
+
+class UserStats:
+    def __init__(self, num_edits, num_articles, num_major_articles):
+        '''
+        Summary of a user's edits in the revision table.
+
+        :param num_edits: number of edits
+        :type num_edits: int
+
+        :param num_articles: number of distinct articles edited
+        :type num_articles: int
+
+        :param num_major_articles: number of distinct articles with
+                                   non-minor, non-reverting edits
+        :type num_major_articles: int
+        '''
+        self.num_edits = num_edits
+        self.num_articles = num_articles
+        self.num_major_articles = num_major_articles
+
+class NeighbourFinder:
+    def __init__(self, dbcursor, lang, slice_size=500):
+        '''
+        Instantiate a neighbour finder.
+
+        :param dbcursor: dictionary cursor connected to the SuggestBot database
+        :type dbcursor: MySQLdb.cursors.DictCursor
+
+        :param lang: language code of the Wikipedia we're working on
+        :type lang: str
+
+        :param slice_size: number of users we ask about in a single query
+        :type slice_size: int
+        '''
+        self.dbcursor = dbcursor
+        self.lang = lang
+        self.slice_size = slice_size
+
+        # Editors of any of a set of articles, with the number of those
+        # articles they edited at all, and with non-minor, non-reverting edits.
+        self.shared_articles_query = """
+            SELECT rev_user,
+                   COUNT(DISTINCT rev_title) AS num_shared,
+                   COUNT(DISTINCT IF(rev_is_minor=0
+                                     AND rev_comment_is_revert=0,
+                                     rev_title, NULL)) AS num_major_shared
+            FROM {table}
+            WHERE rev_title IN ({{titles}}){{users}}
+            GROUP BY rev_user""".format(table=config.revision_table[lang])
+
+        # A sample of the editors of a hub article, those whose
+        # hash is below a given cutoff, and whether they made
+        # non-minor, non-reverting edits to it.
+        self.sampled_editors_query = """
+            SELECT rev_user,
+                   MAX(rev_is_minor=0
+                       AND rev_comment_is_revert=0) AS made_major
+            FROM {table}
+            WHERE rev_title=%s
+            AND {hash} < %s
+            GROUP BY rev_user""".format(table=config.revision_table[lang],
+                                        hash=EDITOR_HASH_SQL)
+
+        # Number of distinct editors of a set of articles.
+        self.article_stats_query = """
+            SELECT rev_title, COUNT(DISTINCT rev_user) AS num_editors
+            FROM {table}
+            WHERE rev_title IN ({{titles}})
+            GROUP BY rev_title""".format(table=config.revision_table[lang])
+
+        # Same as above, read from the per-article summary table if there
+        # is one for this language.  Articles missing from it (e.g. while
+        # it's being populated) are looked up with the query above.
+        self.summary_article_stats_query = None
+        if lang in config.article_stats_table:
+            self.summary_article_stats_query = """
+                SELECT as_title AS rev_title,
+                       as_num_editors AS num_editors
+                FROM {table}
+                WHERE as_title IN ({{titles}})""".format(
+                    table=config.article_stats_table[lang])
+
+        # Number of edits, distinct articles, and distinct articles with
+        # non-minor, non-reverting edits for a set of users.
+        self.user_stats_query = """
+            SELECT rev_user,
+                   COUNT(*) AS num_edits,
+                   COUNT(DISTINCT rev_title) AS num_articles,
+                   COUNT(DISTINCT IF(rev_is_minor=0
+                                     AND rev_comment_is_revert=0,
+                                     rev_title, NULL)) AS num_major_articles
+            FROM {table}
+            WHERE rev_user IN ({{users}})
+            GROUP BY rev_user""".format(table=config.revision_table[lang])
+
+        # Same as above, read from the per-user summary table if there
+        # is one for this language.  Users missing from it are looked up
+        # with the query above.
+        self.summary_user_stats_query = None
+        if lang in config.user_stats_table:
+            self.summary_user_stats_query = """
+                SELECT us_user AS rev_user,
+                       us_num_edits AS num_edits,
+                       us_num_articles AS num_articles,
+                       us_num_major_articles AS num_major_articles
+                FROM {table}
+                WHERE us_user IN ({{users}})""".format(
+                    table=config.user_stats_table[lang])
+
+        # All edits made by a set of users, one row per revision.
+        self.articles_by_users_query = """
+            SELECT rev_user, rev_title
+            FROM {table}
+            WHERE rev_user IN ({{users}})""".format(
+                table=config.revision_table[lang])
+
+    def _placeholders(self, values):
+        return(','.join(['%s'] * len(values)))
+
+    def shared_articles(self, basket, users=None):
+        '''
+        Find everyone who edited an article in the basket, in a single query.
+
+        Returns a dictionary mapping user names to a tuple of the number
+        of basket articles they edited, and the number of basket articles
+        they made non-minor, non-reverting edits to.
+
+        :param basket: titles of the articles to find editors of
+        :type basket: iterable of str
+
+        :param users: only look at these users, asking about
+                      `self.slice_size` of them at a time
+        :type users: iterable of str
+        '''
+        titles = [title.encode('utf-8') for title in basket]
+        shared = {}
+        if not titles:
+            return(shared)
+
+        if users is None:
+            queries = [(self.shared_articles_query.format(
+                titles=self._placeholders(titles), users=''), titles)]
+        else:
+            queries = []
+            for subset in chunked(users, self.slice_size):
+                usernames = [user.encode('utf-8') for user in subset]
+                queries.append((self.shared_articles_query.format(
+                    titles=self._placeholders(titles),
+                    users=' AND rev_user IN ({})'.format(
+                        self._placeholders(usernames))),
+                                titles + usernames))
+
+        for (query, args) in queries:
+            self.dbcursor.execute(query, args)
+            for row in self.dbcursor.fetchall():
+                shared[row['rev_user'].decode('utf-8')] = (
+                    row['num_shared'], row['num_major_shared'])
+        return(shared)
+
+    def article_editors(self, titles):
+        '''
+        Get the number of distinct editors of each of the given articles,
+        asking about `self.slice_size` articles at a time.
+
+        :param titles: titles of the articles to look up
+        :type titles: iterable of str
+        '''
+        editors = {}
+        titles = list(titles)
+        for query in [self.summary_article_stats_query,
+                      self.article_stats_query]:
+            if not query:
+                continue
+            for subset in chunked([title for title in titles
+                                   if title not in editors],
+                                  self.slice_size):
+                page_titles = [title.encode('utf-8') for title in subset]
+                self.dbcursor.execute(
+                    query.format(titles=self._placeholders(page_titles)),
+                    page_titles)
+                for row in self.dbcursor.fetchall():
+                    editors[row['rev_title'].decode('utf-8')] = row['num_editors']
+        return(editors)
+
+    def hub_articles(self, titles, max_editors):
+        '''
+        Find the hub articles among the given ones, those with more
+        than `max_editors` distinct editors.  Returns a dictionary
+        mapping their titles to their number of editors.
+
+        :param titles: titles of the articles to check
+        :type titles: iterable of str
+
+        :param max_editors: maximum number of editors we consider per
+                            article, 0 means we consider all of them
+        :type max_editors: int
+        '''
+        if not max_editors:
+            return({})
+        return({title: num_editors for (title, num_editors)
+                in self.article_editors(titles).items()
+                if num_editors > max_editors})
+
+    def sampled_editors(self, title, num_editors, max_editors):
+        '''
+        Get a deterministic sample of about `max_editors` of the editors
+        of a hub article, picked by `editor_hash()`.  Returns a list of
+        tuples of user name and whether they made non-minor,
+        non-reverting edits to the article.
+
+        :param title: title of the article
+        :type title: str
+
+        :param num_editors: number of distinct editors of the article
+        :type num_editors: int
+
+        :param max_editors: number of editors we want to sample
+        :type max_editors: int
+        '''
+        self.dbcursor.execute(self.sampled_editors_query,
+                              (title.encode('utf-8'),
+                               hub_cutoff(num_editors, max_editors)))
+        return([(row['rev_user'].decode('utf-8'), bool(row['made_major']))
+                for row in self.dbcursor.fetchall()])
+
+    def user_stats(self, users):
+        '''
+        Get a `UserStats` object for each of the given users, asking about
+        `self.slice_size` users at a time.  Users missing from the summary
+        table, if we have one, are summarised from the revision table.
+
+        :param users: names of the users to look up
+        :type users: iterable of str
+        '''
+        stats = {}
+        users = list(users)
+        for query in [self.summary_user_stats_query, self.user_stats_query]:
+            if not query:
+                continue
+            for subset in chunked([user for user in users
+                                   if user not in stats],
+                                  self.slice_size):
+                usernames = [user.encode('utf-8') for user in subset]
+                self.dbcursor.execute(
+                    query.format(users=self._placeholders(usernames)),
+                    usernames)
+                for row in self.dbcursor.fetchall():
+                    stats[row['rev_user'].decode('utf-8')] = UserStats(
+                        row['num_edits'], row['num_articles'],
+                        row['num_major_articles'])
+        return(stats)
+
+    def articles_by_users(self, users):
+        '''
+        Iterate over (user, title) tuples for every edit made by
+        the given users, asking about `self.slice_size` users at a time.
+
+        :param users: names of the users to look up
+        :type users: iterable of str
+        '''
+        for subset in chunked(users, self.slice_size):
+            usernames = [user.encode('utf-8') for user in subset]
+            self.dbcursor.execute(
+                self.articles_by_users_query.format(
+                    users=self._placeholders(usernames)),
+                usernames)
+            for row in self.dbcursor.fetchall():
+                yield (row['rev_user'].decode('utf-8'),
+                       row['rev_title'].decode('utf-8'))
+
+    def find(self, username, basket, exp_threshold, assoc_threshold,
+             max_editors=0, hub_idf=False):
+        '''
+        Find the neighbours of a user based on a basket of edited articles.
+
+        A user is a candidate neighbour if they made a non-minor,
+        non-reverting edit to an article in the basket, or if they made
+        any edit to one and have fewer than `exp_threshold` edits.
+        Association is the Jaccard coefficient between the basket and the
+        user's edited articles, where experienced users (those with at
+        least `exp_threshold` edits) only count non-minor, non-reverting
+        edits.
+
+        Editors of hub articles, those with more than `max_editors`
+        distinct editors, are sampled with `sampled_editors()` rather
+        than all considered.  If `hub_idf` is set, the association of users
+        found through hub articles only is scaled down by `hub_weight()`.
+
+        Returns a dictionary mapping user names to a tuple of their
+        association and the number of basket articles they share.
+
+        :param username: user we're finding neighbours for
+        :type username: str
+
+        :param basket: titles of the articles the user edited
+        :type basket: set
+
+        :param exp_threshold: number of edits to be an experienced user
+        :type exp_threshold: int
+
+        :param assoc_threshold: minimum association to be a neighbour
+        :type assoc_threshold: float
+
+        :param max_editors: maximum number of editors we consider per
+                            article, 0 means we consider all of them
+        :type max_editors: int
+
+        :param hub_idf: down-weight neighbours found through hub articles?
+        :type hub_idf: bool
+        '''
+        hubs = self.hub_articles(basket, max_editors)
+
+        # If there are hub articles, maps users to the articles we found
+        # them through, as a list of tuples of hub weight and whether they
+        # made non-minor, non-reverting edits to the article.
+        found = None
+        if not hubs:
+            shared = self.shared_articles(basket)
+        else:
+            # Everyone who edited an ordinary article, plus a sample of
+            # the editors of each hub, then count what they share with
+            # the whole basket.
+            found = {}
+            for (user, (num_shared, num_major_shared)) in \
+                self.shared_articles([title for title in basket
+                                      if title not in hubs]).items():
+                found[user] = [(1.0, num_major_shared > 0)]
+            for (title, num_editors) in hubs.items():
+                weight = hub_weight(num_editors, max_editors)
+                for (user, made_major) in self.sampled_editors(
+                        title, num_editors, max_editors):
+                    found.setdefault(user, []).append((weight, made_major))
+            logging.info("Sampled editors of {} hub articles".format(
+                len(hubs)))
+            found.pop(username, None)
+            shared = self.shared_articles(basket, users=list(found))
+        shared.pop(username, None)
+        stats = self.user_stats(shared.keys())
+
+        neighbours = {}
+        for (user, (num_shared, num_major_shared)) in shared.items():
+            try:
+                user_stats = stats[user]
+            except KeyError:
+                continue
+
+            is_expert = user_stats.num_edits >= exp_threshold
+
+            # Highest weight of the articles we found the user through
+            # where they qualify as a candidate neighbour
+            weight = 1.0
+            if found is not None:
+                weight = max([article_weight for (article_weight, made_major)
+                              in found[user]
+                              if made_major or not is_expert] or [0.0])
+                if not weight:
+                    continue
+
+            if is_expert:
+                # Experienced user, only non-minor, non-reverting edits count
+                if not num_major_shared:
+                    continue
+                num_shared = num_major_shared
+                num_articles = user_stats.num_major_articles
+            else:
+                num_articles = user_stats.num_articles
+
+            assoc = num_shared / (len(basket) + num_articles - num_shared)
+            if hub_idf:
+                assoc *= weight
+            if assoc < assoc_threshold:
+                continue
+
+            neighbours[user] = (assoc, num_shared)
+
+        logging.info("Found {} pre-neighbours".format(len(neighbours)))
+        return(neighbours)
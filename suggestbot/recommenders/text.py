@@ -22,16 +22,191 @@ Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
 Boston, MA  02110-1301, USA.
 '''
 
+import os
 import logging
-import operator
-import itertools
 import collections
 
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from more_itertools import chunked
+
 from suggestbot import config
+from suggestbot.recommenders.morelikecache import MorelikeCache
+from suggestbot.recommenders.textindex import TextIndex, index_path
+from suggestbot.utilities.sites import get_site
 
 import pywikibot
 
+# CirrusSearch refuses search queries longer than this
+MAX_QUERY_LENGTH = 300
+
+# Maximum number of search results the API returns, without and with
+# the apihighlimits right
+MAX_SRLIMIT = 500
+MAX_SRLIMIT_HIGH = 5000
+
 class Recommender:
+    def __init__(self, workers=1, cache_path=None, cache_ttl=604800,
+                 cache_size=100000, index_dir=None, batch_size=1):
+        '''
+        Initialize the text-based recommender.
+
+        :param workers: Number of morelike searches we run concurrently.
+                        All of them go through the same site object, so its
+                        throttle (which pauses every request when the API
+                        reports replication lag) is shared between them.
+        :type workers: int
+
+        :param cache_path: Path of the SQLite database we cache morelike
+                           results in, None disables the cache.
+        :type cache_path: str
+
+        :param cache_ttl: Number of seconds cached results are used for.
+        :type cache_ttl: int
+
+        :param cache_size: Maximum number of cached results.
+        :type cache_size: int
+
+        :param index_dir: Directory with text index snapshots (built by
+                          bin/build-text-index.py).  Languages with an index
+                          are searched locally instead of through
+                          CirrusSearch.
+        :type index_dir: str
+
+        :param batch_size: Maximum number of articles we ask CirrusSearch
+                           for similar articles to in a single morelike
+                           query.  1 searches for each article separately.
+        :type batch_size: int
+        '''
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+
+        self.cache = None
+        if cache_path:
+            self.cache = MorelikeCache(cache_path, ttl=cache_ttl,
+                                       max_entries=cache_size)
+
+        ## Mapped text indexes, keyed by language code, as tuples
+        ## of the index and the modification time of its snapshot.
+        self.index_dir = index_dir
+        self.indexes = {}
+
+    def get_index(self, lang):
+        '''
+        Get the text index for the given language, mapping its snapshot
+        if we haven't already or it has been rebuilt since.  Returns None
+        if there is no index for the language.
+
+        :param lang: language code of the Wikipedia we're working with
+        :type lang: str
+        '''
+        if not self.index_dir:
+            return(None)
+
+        path = index_path(self.index_dir, lang)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return(None)
+
+        (index, index_mtime) = self.indexes.get(lang, (None, None))
+        if index_mtime != mtime:
+            index = TextIndex(lang)
+            if not index.load_snapshot(path):
+                return(None)
+            self.indexes[lang] = (index, mtime)
+        return(index)
+
+    def get_revisions(self, site, titles):
+        '''
+        Get the IDs of the current revisions of the given articles,
+        as a dictionary mapping titles to revision IDs.  Articles that
+        don't exist, or that we fail to look up, are left out.
+
+        :param site: the Wikipedia the articles are from
+        :type site: pywikibot.Site
+
+        :param titles: titles of the articles
+        :type titles: list
+        '''
+        revisions = {}
+        for subset in chunked(titles, 50):
+            q = pywikibot.data.api.Request(site=site,
+                                           action='query')
+            q['prop'] = 'info'
+            q['titles'] = subset
+            try:
+                reqdata = q.submit()
+            except pywikibot.Error as e:
+                logging.warning('failed to get revisions of {n} articles: {error}'.format(n=len(subset), error=e))
+                continue
+
+            if not 'query' in reqdata:
+                continue
+
+            # Map titles the API normalised back to the ones we asked for
+            normalized = {norm['to']: norm['from']
+                          for norm in reqdata['query'].get('normalized', [])}
+            for page in reqdata['query'].get('pages', {}).values():
+                if 'lastrevid' in page:
+                    title = normalized.get(page['title'], page['title'])
+                    revisions[title] = page['lastrevid']
+        return(revisions)
+
+    def group_titles(self, searches):
+        '''
+        Group the articles we search for into batches of at most
+        `batch_size` articles, keeping each batch's morelike query within
+        the length CirrusSearch accepts.  Returns a list of tuples of the
+        position of the batch's first article and the batch's titles.
+
+        :param searches: positions in the basket and titles of the articles
+        :type searches: list of tuples
+        '''
+        groups = []
+        for (i, page_title) in searches:
+            if groups:
+                (_, titles) = groups[-1]
+                query_length = len('morelike:') + sum(len(t) + 1 for t in titles) + len(page_title)
+                if len(titles) < self.batch_size \
+                   and query_length <= MAX_QUERY_LENGTH:
+                    titles.append(page_title)
+                    continue
+            groups.append((i, [page_title]))
+        return(groups)
+
+    def search_morelike(self, site, page_title, srlimit):
+        '''
+        Search for articles similar to the given article.  Returns the
+        titles of the articles found, most similar first, or None if the
+        search returned no results.
+
+        :param site: the Wikipedia we're searching
+        :type site: pywikibot.Site
+
+        :param page_title: title of the article to find similar articles
+                           to, or titles of several articles separated by
+                           "|" to find articles similar to all of them
+        :type page_title: str
+
+        :param srlimit: maximum number of results
+        :type srlimit: int
+        '''
+        q = pywikibot.data.api.Request(site=site,
+                                       action='query')
+        q['list'] = 'search'
+        # q['srbackend'] = u'CirrusSearch'
+        q['srnamespace'] = 0
+        # FIXME: add quotes around title and escape quotes in title?
+        q['srsearch'] = 'morelike:{title}'.format(title=page_title)
+        q['srlimit'] = srlimit
+        reqdata = q.submit()
+
+        if not 'query' in reqdata \
+           or not 'search' in reqdata['query']:
+            return(None)
+        return([article['title'] for article in reqdata['query']['search']])
+
     def recommend(self, user, lang, articles, params):
         """
         Find articles matching a given set of articles for a given user.
@@ -59,15 +234,26 @@ class Recommender:
         # print got request info
         logging.info("got request for {lang}:User:{username} to find {nrecs} recommend articles based on {num} articles".format(lang=lang, username=user, nrecs=nrecs, num=numArticles))
 
-        # initialize Pywikibot site
-        site = pywikibot.Site(lang)
-        site.login()
-
         # Can we get more results back? (Note: we don't necessarily need
         # too many, as we're looking for _similar_ articles)
         srlimit = 50
-        if site.has_right('apihighlimits'):
-            srlimit = 100
+
+        # Search the local text index if we have one for this language,
+        # otherwise CirrusSearch.  Both are called with the query and
+        # the number of results we want.
+        index = self.get_index(lang)
+        if index:
+            search = index.morelike
+            max_srlimit = srlimit
+        else:
+            # get the shared Pywikibot site, logged in once per process
+            site = get_site(lang, login=True)
+
+            max_srlimit = MAX_SRLIMIT
+            if site.has_right('apihighlimits'):
+                srlimit = 100
+                max_srlimit = MAX_SRLIMIT_HIGH
+            search = partial(self.search_morelike, site)
         
         # dict of resulting recommendations mapping titles to Borda scores
         # (as ints, defaults are 0)
@@ -81,35 +267,88 @@ class Recommender:
         # srlimit=50 (tested by trial & error, bots can get <= 500)
         # format=json
 
+        # The position of each title's first appearance, as the index
+        # of the basket article and the rank in its results, so ties are
+        # broken the same way no matter what order the searches finish in
+        first_seen = {}
+
         # FIXME: start timing
 
-        for page_title in articles:
-            q = pywikibot.data.api.Request(site=site,
-                                           action='query')
-            q['list'] = 'search'
-            # q['srbackend'] = u'CirrusSearch'
-            q['srnamespace'] = 0
-            # FIXME: add quotes around title and escape quotes in title?
-            q['srsearch'] = 'morelike:{title}'.format(title=page_title)
-            q['srlimit'] = srlimit
-            reqdata = q.submit()
-
-            if not 'query' in reqdata \
-               or not 'search' in reqdata['query']:
-                logging.warning('no results for query on {title}'.format(title=page_title))
-            else:
-                results = reqdata['query']['search']
-                # calculate a Borda score for each article (len(list) - rank)
-                # and throw it into the result set.
-                n = len(results)
-                score = itertools.count(n, step=-1)
-                for article in results:
-                    s = next(score)
-                    recs[article['title']] += s
-                
+        def add_scores(i, results, batch_size=1):
+            # calculate a Borda score for each article (len(list) - rank)
+            # and throw it into the result set.  The results of a batched
+            # search stand in for those of searching for each of its
+            # articles separately, interleaved, so an article at a given
+            # rank gets the score it would have at rank // batch_size in
+            # one of those.
+            n = -(-len(results) // batch_size)
+            for (rank, title) in enumerate(results):
+                s = n - rank // batch_size
+                recs[title] += s
+                first_seen[title] = min((i, rank),
+                                        first_seen.get(title, (i, rank)))
+
+        # Use cached results where we can, and search for the rest.
+        # Cached results are invalid if the article has been edited since.
+        revisions = {}
+        searches = list(enumerate(articles))
+        if self.cache and not index:
+            revisions = self.get_revisions(site, articles)
+            searches = []
+            for (i, page_title) in enumerate(articles):
+                results = self.cache.get(lang, page_title, srlimit,
+                                         revisions.get(page_title))
+                if results is None:
+                    searches.append((i, page_title))
+                else:
+                    add_scores(i, results)
+
+            logging.info('found cached results for {n} articles'.format(n=len(articles) - len(searches)))
+
+        # Batch the CirrusSearch queries, as a morelike query can ask
+        # for articles similar to several articles at once.  The local
+        # index costs us no API calls, so it searches for each separately.
+        if index:
+            groups = [(i, [page_title]) for (i, page_title) in searches]
+        else:
+            groups = self.group_titles(searches)
+            logging.info('searching for {n} articles in {m} queries'.format(n=len(searches), m=len(groups)))
+
+        # Run the searches concurrently, adding each one's Borda scores
+        # as soon as it finishes
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # A batch asks for as many results as its articles would
+            # get separately, as far as the API allows
+            futures = {executor.submit(search, '|'.join(titles),
+                                       min(srlimit * len(titles),
+                                           max_srlimit)): (i, titles)
+                       for (i, titles) in groups}
+            for future in as_completed(futures):
+                (i, titles) = futures[future]
+                page_title = '|'.join(titles)
+                try:
+                    results = future.result()
+                except pywikibot.Error as e:
+                    logging.warning('search for {title} failed: {error}'.format(title=page_title, error=e))
+                    continue
+
+                if results is None:
+                    logging.warning('no results for query on {title}'.format(title=page_title))
+                    continue
+
+                add_scores(i, results, batch_size=len(titles))
+                # Only results for a single article can be reused
+                if self.cache and not index and len(titles) == 1:
+                    self.cache.put(lang, page_title, srlimit, results,
+                                   revisions.get(page_title))
+
                 logging.info('completed fetching recommendations for {title}'.format(title=page_title))
                 logging.info('number of recommendations currently {0}'.format(len(recs)))
 
+        if self.cache and not index:
+            self.cache.trim()
+            logging.info('morelike cache: {hits} hits, {misses} misses, hit rate {hit_rate:.2f}'.format(**self.cache.stats()))
+
         # FIXME: end timing, write out if verbose
 
         # take out edits from results
@@ -123,8 +362,8 @@ class Recommender:
         # a list of dictionaries, which we'll then return
         result = []
         for (page_title, score) in sorted(recs.items(),
-                                          key=operator.itemgetter(1),
-                                          reverse=True)[:nrecs]:
+                                          key=lambda rec: (-rec[1],
+                                                           first_seen[rec[0]]))[:nrecs]:
             result.append({'item': page_title,
                            'value': score});
 
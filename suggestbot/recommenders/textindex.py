@@ -0,0 +1,406 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+'''
+Offline-built TF-IDF index of the text of the articles in a Wikipedia,
+used by the text recommender to find articles similar to a given one
+without querying CirrusSearch.  Terms are hashed into a fixed number of
+features, so the index needs no vocabulary, and article vectors are
+normalised so that the dot product of two of them is their cosine
+similarity.  The index is stored in a snapshot file that every process
+on a host can map and share, both by article (to get an article's
+vector) and by feature (to find the articles that share its terms).
+
+Copyright (C) 2015-2016 SuggestBot Dev Group
+
+This library is free software; you can redistribute it and/or
+modify it under the terms of the GNU Library General Public
+License as published by the Free Software Foundation; either
+version 2 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+Library General Public License for more details.
+
+You should have received a copy of the GNU Library General Public
+License along with this library; if not, write to the
+Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+Boston, MA  02110-1301, USA.
+'''
+
+import os
+import re
+import bz2
+import time
+import zlib
+import array
+import logging
+
+import xml.etree.ElementTree as etree
+
+from functools import lru_cache
+
+import numpy as np
+import scipy.sparse as sp
+
+import mwparserfromhell as mwp
+
+from suggestbot.utilities.snapshot import read_snapshot, write_snapshot, \
+    string_table_arrays, StringTable
+
+# Terms are runs of at least two letters
+TOKEN_RE = re.compile(r'[^\W\d_]{2,}', re.U)
+
+def index_path(directory, lang):
+    '''
+    Path of the text index snapshot for the given language.
+
+    :param directory: directory where text indexes are kept
+    :type directory: str
+
+    :param lang: language code of the Wikipedia the index is for
+    :type lang: str
+    '''
+    return(os.path.join(directory, '{}wiki-text.snapshot'.format(lang)))
+
+@lru_cache(maxsize=2**20)
+def feature(term, n_features):
+    '''
+    Hash a term into one of `n_features` features.  Uses CRC32 rather
+    than `hash()`, which differs between processes.
+
+    :param term: the term
+    :type term: str
+
+    :param n_features: number of features
+    :type n_features: int
+    '''
+    return(zlib.crc32(term.encode('utf-8')) % n_features)
+
+def read_dump(path):
+    '''
+    Read the articles in a pages-articles XML dump (optionally
+    bz2-compressed).  Yields a tuple of title and wikitext for every
+    article in the main namespace, and of title and redirect target
+    title (with None for the text) for every redirect.
+
+    :param path: path of the dump file
+    :type path: str
+    '''
+    if path.endswith('.bz2'):
+        infile = bz2.open(path, 'rb')
+    else:
+        infile = open(path, 'rb')
+
+    with infile:
+        context = etree.iterparse(infile, events=('start', 'end'))
+        (_, root) = next(context)
+        for (event, elem) in context:
+            if event != 'end' or not elem.tag.endswith('}page'):
+                continue
+
+            # Tags are namespaced with the export format version
+            fields = {child.tag.rsplit('}', 1)[-1]: child for child in elem}
+            if fields['ns'].text == '0':
+                title = fields['title'].text
+                if 'redirect' in fields:
+                    yield(title, None, fields['redirect'].get('title'))
+                else:
+                    text = None
+                    for child in fields['revision']:
+                        if child.tag.endswith('}text'):
+                            text = child.text
+                    yield(title, text or '', None)
+
+            # Throw away the pages we've read so memory use stays flat
+            root.clear()
+
+class TextIndex:
+    def __init__(self, lang, n_features=2**20):
+        '''
+        Instantiate an empty text index for the given language.  Call
+        `load()` to build it from a dump, or `load_snapshot()` to map
+        a previously built one.
+
+        Articles are identified by dense IDs, their positions in `titles`.
+
+        :param lang: language code of the Wikipedia the index is for
+        :type lang: str
+
+        :param n_features: number of features terms are hashed into
+        :type n_features: int
+        '''
+        self.lang = lang
+        self.n_features = n_features
+
+        # Article titles (with spaces, as in the API), and titles of
+        # redirects and the dense ID of the article each points to.
+        self.titles = None
+        self.redirects = None
+        self.redirect_targets = None
+
+        # Inverse document frequency of each feature
+        self.idf = None
+
+        # Normalised TF-IDF vectors of the articles, as CSR arrays
+        # (the features of article i are
+        # `features[article_offsets[i]:article_offsets[i+1]]`, with
+        # their weights in `article_weights`) and the same matrix as
+        # CSC arrays (the articles with feature j are
+        # `articles[feature_offsets[j]:feature_offsets[j+1]]`).
+        self.article_offsets = None
+        self.features = None
+        self.article_weights = None
+        self.feature_offsets = None
+        self.articles = None
+        self.feature_weights = None
+
+        # When the index was built (seconds since the epoch)
+        self.built = None
+
+    def __len__(self):
+        return(len(self.titles))
+
+    def load(self, path):
+        '''
+        Build the index from a pages-articles XML dump.
+
+        :param path: path of the dump file
+        :type path: str
+        '''
+        logging.info("building text index for {}wiki from {}".format(self.lang, path))
+        start = time.time()
+
+        titles = []
+        redirect_titles = []
+        redirect_targets = []
+
+        def articles():
+            for (title, text, target) in read_dump(path):
+                if target is not None:
+                    redirect_titles.append(title)
+                    redirect_targets.append(target)
+                    continue
+                titles.append(title)
+                if len(titles) % 100000 == 0:
+                    logging.info("read {} articles".format(len(titles)))
+                yield(mwp.parse(text).strip_code())
+
+        self.build(articles(), titles, redirect_titles, redirect_targets)
+
+        logging.info("built text index of {} articles in {:.1f} seconds".format(
+            len(self), time.time() - start))
+        return(True)
+
+    def build(self, texts, titles, redirect_titles=[], redirect_targets=[]):
+        '''
+        Build the index from the plain text of the articles.  Terms are
+        weighted by sublinear term frequency (1 + log(tf)) and smoothed
+        inverse document frequency, and each article's vector is
+        normalised to unit length.
+
+        :param texts: plain text of the articles, in the order of `titles`
+        :type texts: iterable of str
+
+        :param titles: titles of the articles, filled in by the time
+                       `texts` is exhausted if it's a generator
+        :type titles: list of str
+
+        :param redirect_titles: titles of redirects to articles
+        :type redirect_titles: list of str
+
+        :param redirect_targets: titles of the articles the redirects
+                                 point to, in the same order
+        :type redirect_targets: list of str
+        '''
+        offsets = array.array('q', [0])
+        features = array.array('i')
+        counts = array.array('f')
+        for text in texts:
+            terms = np.fromiter(
+                (feature(term, self.n_features)
+                 for term in TOKEN_RE.findall(text.lower())),
+                dtype=np.int32)
+            (doc_features, doc_counts) = np.unique(terms, return_counts=True)
+            features.frombytes(doc_features.tobytes())
+            counts.frombytes(doc_counts.astype(np.float32).tobytes())
+            offsets.append(len(features))
+
+        article_offsets = np.frombuffer(offsets, dtype=np.int64)
+        doc_features = np.frombuffer(features, dtype=np.int32)
+        weights = np.frombuffer(counts, dtype=np.float32)
+
+        n_docs = len(article_offsets) - 1
+        doc_freq = np.bincount(doc_features, minlength=self.n_features)
+        self.idf = (np.log((1 + n_docs) / (1 + doc_freq)) + 1).astype(np.float32)
+
+        weights = (1 + np.log(weights)) * self.idf[doc_features]
+        doc_ids = np.repeat(np.arange(n_docs), np.diff(article_offsets))
+        norms = np.sqrt(np.bincount(doc_ids, weights=weights.astype(np.float64)**2,
+                                    minlength=n_docs))
+        weights = (weights / np.maximum(norms, 1e-12)[doc_ids]).astype(np.float32)
+
+        matrix = sp.csr_matrix((weights, doc_features, article_offsets),
+                               shape=(n_docs, self.n_features))
+        self.article_offsets = article_offsets
+        self.features = doc_features
+        self.article_weights = weights
+
+        matrix = matrix.tocsc()
+        self.feature_offsets = matrix.indptr.astype(np.int64)
+        self.articles = matrix.indices.astype(np.int32)
+        self.feature_weights = matrix.data.astype(np.float32)
+
+        self.titles = self._string_table(titles)
+
+        # Keep the redirects that point to an article
+        targets = [self.titles.get(target) for target in redirect_targets]
+        self.redirects = self._string_table(
+            [title for (title, target) in zip(redirect_titles, targets)
+             if target is not None])
+        self.redirect_targets = np.array(
+            [target for target in targets if target is not None],
+            dtype=np.int32)
+
+        self.built = time.time()
+
+    def _string_table(self, strings):
+        arrays = string_table_arrays(strings)
+        return(StringTable(arrays['blob'], arrays['offsets'], arrays['order']))
+
+    def resolve(self, title):
+        '''
+        Get the dense ID of the article with the given title, following
+        a redirect if necessary.  Returns None if there is no such article.
+
+        :param title: title of the article, with underscores or spaces
+        :type title: str
+        '''
+        title = title.replace('_', ' ')
+        article_id = self.titles.get(title)
+        if article_id is not None:
+            return(article_id)
+        redirect_id = self.redirects.get(title)
+        if redirect_id is not None:
+            return(int(self.redirect_targets[redirect_id]))
+        return(None)
+
+    def morelike(self, title, limit=50, max_query_terms=25):
+        '''
+        Find the articles most similar to the given article, like
+        CirrusSearch's morelike: the article's highest weighted terms
+        form a query, and articles are ranked by their cosine similarity
+        to it.  Returns the titles of the `limit` most similar articles,
+        most similar first, or None if the article isn't in the index.
+
+        :param title: title of the article
+        :type title: str
+
+        :param limit: number of articles to return
+        :type limit: int
+
+        :param max_query_terms: number of the article's terms we query with
+        :type max_query_terms: int
+        '''
+        article_id = self.resolve(title)
+        if article_id is None:
+            return(None)
+
+        start = self.article_offsets[article_id]
+        end = self.article_offsets[article_id + 1]
+        query_features = self.features[start:end]
+        query_weights = self.article_weights[start:end]
+        if len(query_features) > max_query_terms:
+            # A stable sort so ties are broken the same way every time
+            top = np.argsort(-query_weights, kind='stable')[:max_query_terms]
+            query_features = query_features[top]
+            query_weights = query_weights[top]
+        if not len(query_features):
+            return([])
+
+        # Gather the postings of the query's features, each article's
+        # score is the sum of its weights times the query's weights
+        starts = self.feature_offsets[query_features]
+        lengths = self.feature_offsets[query_features + 1] - starts
+        total = int(lengths.sum())
+        run_starts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions = run_starts + np.arange(total)
+        (candidates, inverse) = np.unique(self.articles[positions],
+                                          return_inverse=True)
+        scores = np.bincount(
+            inverse,
+            weights=self.feature_weights[positions] * np.repeat(query_weights,
+                                                                lengths),
+            minlength=len(candidates))
+
+        # Leave out the article itself, then keep the top `limit`
+        scores[candidates == article_id] = -np.inf
+        limit = min(limit, len(candidates) - 1)
+        if limit <= 0:
+            return([])
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.lexsort((candidates[top], -scores[top]))]
+        return([self.titles[article] for article in candidates[top].tolist()])
+
+    def save_snapshot(self, path):
+        '''
+        Write this index to a snapshot file that `load_snapshot()` can map.
+
+        :param path: path of the snapshot file
+        :type path: str
+        '''
+        arrays = {'idf': self.idf,
+                  'article_offsets': self.article_offsets,
+                  'features': self.features,
+                  'article_weights': self.article_weights,
+                  'feature_offsets': self.feature_offsets,
+                  'articles': self.articles,
+                  'feature_weights': self.feature_weights,
+                  'redirect_targets': self.redirect_targets}
+        for (name, table) in [('titles', self.titles),
+                              ('redirects', self.redirects)]:
+            arrays['{}.blob'.format(name)] = table.blob
+            arrays['{}.offsets'.format(name)] = table.offsets
+            arrays['{}.order'.format(name)] = table.order
+
+        write_snapshot(path, arrays, meta={'lang': self.lang,
+                                           'n_features': self.n_features,
+                                           'built': self.built})
+        logging.info("wrote text index snapshot of {} articles to {}".format(
+            len(self), path))
+
+    def load_snapshot(self, path):
+        '''
+        Populate the index by mapping a snapshot file written by
+        `save_snapshot()`.  The arrays are read-only and shared with
+        every other process that maps the same file.
+
+        :param path: path of the snapshot file
+        :type path: str
+        '''
+        (meta, arrays) = read_snapshot(path)
+        if meta['lang'] != self.lang:
+            logging.error("snapshot {} is for {}wiki, not {}wiki".format(
+                path, meta['lang'], self.lang))
+            return(False)
+
+        self.n_features = meta['n_features']
+        self.idf = arrays['idf']
+        self.article_offsets = arrays['article_offsets']
+        self.features = arrays['features']
+        self.article_weights = arrays['article_weights']
+        self.feature_offsets = arrays['feature_offsets']
+        self.articles = arrays['articles']
+        self.feature_weights = arrays['feature_weights']
+        self.redirect_targets = arrays['redirect_targets']
+        self.titles = StringTable(arrays['titles.blob'],
+                                  arrays['titles.offsets'],
+                                  arrays['titles.order'])
+        self.redirects = StringTable(arrays['redirects.blob'],
+                                     arrays['redirects.offsets'],
+                                     arrays['redirects.order'])
+        self.built = meta['built']
+
+        logging.info("mapped text index snapshot of {} articles from {}".format(
+            len(self), path))
+        return(True)
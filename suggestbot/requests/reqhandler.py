@@ -55,6 +55,7 @@ import mwparserfromhell as mwp
 import request
 from suggestbot import config
 from suggestbot import db
+from suggestbot.utilities.sites import get_site
 from suggestbot import SuggestBot, PageNotSavedError
 
 # FIXME: figure out a way to store pages with issues, e.g. {{nobots}}?
@@ -90,7 +91,7 @@ class RequestTemplateHandler:
         self.lang = lang
         self.templates = templates
         self.db = db.SuggestBotDatabase()
-        self.site = pywikibot.Site(self.lang)
+        self.site = get_site(self.lang)
 
         # For each defined template, create a set of templates unicode strings
         # we'll be looking for.
@@ -138,9 +139,9 @@ class RequestTemplateHandler:
             try:
                 if not self.db.connect():
                     raise DBConnectionError
-                # Trying to fix issue with tokens by not keeping the site
-                # object around for too long
-                self.site = pywikibot.Site(self.lang)
+                # Trying to fix issue with tokens by not keeping them
+                # around for too long, the shared site clears old ones
+                self.site = get_site(self.lang)
                 recRequests = self.getRequests()
                 for (page, pageData) in recRequests.items():
                     self.processSingleRequest(userPage=page,
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8  -*-
+'''
+Append-only log of changes to a revision table, written by the recent
+changes daemon and read by long-running processes (e.g. the co-edit
+server) that keep an in-memory copy of the table and want to stay
+fresh without reloading it.
+
+Each line is tab-separated:
+
+  sign | user name | page title | number of edits | number of major edits | key
+
+where the sign is '+' for inserted revisions and '-' for expired ones,
+and major edits are those that are neither minor nor reverts.  The key
+is the revision ID of an inserted revision, or the cutoff timestamp of
+the expiry ('YYYY-MM-DD HH:MM:SS', revisions older than it were
+deleted), so a reader that also reads the revision table can tell
+whether the change is already in what it read.  Lines written before
+keys were added have five fields, their key is None.
+
+Copyright (C) 2016 SuggestBot Dev Group
+
+This library is free software; you can redistribute it and/or
+modify it under the terms of the GNU Library General Public
+License as published by the Free Software Foundation; either
+version 2 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+Library General Public License for more details.
+
+You should have received a copy of the GNU Library General Public
+License along with this library; if not, write to the
+Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+Boston, MA  02110-1301, USA.
+'''
+
+import os
+import logging
+
+def delta_log_path(directory, lang):
+    '''
+    Path of the delta log for the given language.
+
+    :param directory: directory where delta logs are kept
+    :type directory: str
+
+    :param lang: language code of the Wikipedia the log is for
+    :type lang: str
+    '''
+    return(os.path.join(directory, '{}wiki-revisions.delta'.format(lang)))
+
+def append_deltas(path, entries, max_bytes=0):
+    '''
+    Append entries to a delta log.  If the log has grown beyond
+    `max_bytes`, it is first rotated to `path`.1, which readers notice
+    (see `read_deltas()`) and handle by reloading from the database.
+
+    :param path: path of the delta log
+    :type path: str
+
+    :param entries: tuples of sign, user name, page title,
+                    number of edits, number of major edits and key
+                    (None if there is none)
+    :type entries: list
+
+    :param max_bytes: size at which the log is rotated, 0 never rotates it
+    :type max_bytes: int
+    '''
+    if not entries:
+        return()
+
+    if max_bytes and os.path.exists(path) \
+       and os.path.getsize(path) > max_bytes:
+        logging.info("rotating delta log {}".format(path))
+        os.replace(path, '{}.1'.format(path))
+
+    lines = ['{}\t{}\t{}\t{}\t{}\t{}\n'.format(
+        sign, user, title, num_edits, num_major, '' if key is None else key)
+             for (sign, user, title, num_edits, num_major, key) in entries]
+    with open(path, 'a', encoding='utf-8') as outfile:
+        outfile.write(''.join(lines))
+    return()
+
+def log_position(path):
+    '''
+    Get the current end of a delta log, as a tuple of its inode
+    and size.  If there is no log yet, both are None and 0.
+
+    :param path: path of the delta log
+    :type path: str
+    '''
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return(None, 0)
+    return(stat.st_ino, stat.st_size)
+
+def read_deltas(path, inode, offset):
+    '''
+    Read the complete entries added to a delta log since the given
+    position.  Returns a tuple of the list of entries (as tuples of
+    sign, user name, page title, number of edits, number of major
+    edits and key) and the new inode and offset, or None if the log has been
+    rotated or truncated since, meaning entries were lost.
+
+    :param path: path of the delta log
+    :type path: str
+
+    :param inode: inode of the log at the last read, None if there was
+                  no log at the time
+    :type inode: int
+
+    :param offset: offset in the log after the last read
+    :type offset: int
+    '''
+    try:
+        infile = open(path, 'rb')
+    except FileNotFoundError:
+        if inode is None:
+            return([], inode, offset)
+        return(None)
+
+    with infile:
+        stat = os.fstat(infile.fileno())
+        if inode is None:
+            # The log was created after our last read
+            offset = 0
+        elif stat.st_ino != inode or stat.st_size < offset:
+            return(None)
+
+        infile.seek(offset)
+        data = infile.read()
+
+    # Only complete lines, the daemon might be in the middle of writing one
+    data = data[:data.rfind(b'\n') + 1]
+
+    entries = []
+    for line in data.decode('utf-8').splitlines():
+        fields = line.split('\t')
+        if len(fields) == 5:
+            fields.append(None)
+        try:
+            (sign, user, title, num_edits, num_major, key) = fields
+            entries.append((sign, user, title, int(num_edits), int(num_major),
+                            key or None))
+        except ValueError:
+            logging.warning("skipping malformed delta log line {!r}".format(line))
+
+    return(entries, stat.st_ino, offset + len(data))
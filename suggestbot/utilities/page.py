@@ -58,6 +58,7 @@ from scipy import stats
 
 from suggestbot import config
 import suggestbot.utilities.qualmetrics as qm
+from suggestbot.utilities.sites import get_session
 
 
 class InvalidRating(Exception):
@@ -98,7 +99,7 @@ class Page(pywikibot.Page):
         :type http_session: requests.session
         """
         if not http_session:
-            http_session = requests.Session()
+            http_session = get_session()
 
         today = date.today()
         start_date = today - timedelta(days=15)
@@ -287,7 +288,7 @@ class Page(pywikibot.Page):
         rating = None
         num_attempts = 0
         while not rating and num_attempts < config.max_url_attempts:
-            r = requests.get(url, headers=self._headers)
+            r = get_session().get(url, headers=self._headers)
             num_attempts += 1
             if r.status_code == 200:
                 try:
@@ -332,7 +333,7 @@ class Page(pywikibot.Page):
         num_attempts = 0
         while not rating and num_attempts < config.max_url_attempts:
             try:
-                r = requests.post(url, headers=post_headers, data=json.dumps(data))
+                r = get_session().post(url, headers=post_headers, data=json.dumps(data))
                 num_attempts += 1
 
                 if r.status_code == 200:
@@ -24,13 +24,12 @@ Boston, MA  02110-1301, USA.
 
 import logging
 
-import requests
-
 import pywikibot
 from pywikibot.pagegenerators import PagesFromTitlesGenerator, PreloadingGenerator
 
 from suggestbot import config
 import suggestbot.utilities.page as sup
+from suggestbot.utilities.sites import get_site, get_session
 
 
 def get_popquals(lang, titles, do_tasks=False):
@@ -45,7 +44,7 @@ def get_popquals(lang, titles, do_tasks=False):
     :type do_tasks: bool
     """
 
-    site = pywikibot.Site(lang)
+    site = get_site(lang)
 
     # Make our titles into Page objects
     pages = [sup.Page(site, title) for title in titles]
@@ -53,8 +52,8 @@ def get_popquals(lang, titles, do_tasks=False):
     # List of dictionaries with popularity and quality data
     result = []
 
-    # Create HTTP session to pool pageview HTTP requests
-    http_session = requests.Session()
+    # Use the shared HTTP session to pool pageview HTTP requests
+    http_session = get_session()
 
     for page in PreloadingGenerator(
         sup.PredictionGenerator(site, sup.RatingGenerator(pages))
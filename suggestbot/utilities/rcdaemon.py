@@ -17,10 +17,12 @@ import pywikibot
 import MySQLdb
 
 from time import sleep
+from more_itertools import chunked
 
 from suggestbot import config
 from suggestbot import db
 import suggestbot.utilities.reverts as sur
+from suggestbot.utilities.deltalog import delta_log_path, append_deltas
 
 
 class RecentChangesDaemon:
@@ -287,9 +289,30 @@ class RecentChangesDaemon:
 
         # The key u'minor' exists if it's a minor edit.
 
+        # Query to find users and articles with revisions older than a given
+        # timestamp, their summaries need updating once those are deleted,
+        # and the number of (major) edits that expire go in the delta log
+        expiring_users_query = """SELECT rev_user, rev_title,
+                                   COUNT(*) AS num_edits,
+                                   SUM(rev_is_minor=0
+                                       AND rev_comment_is_revert=0) AS num_major
+                                   FROM {}
+                                   WHERE rev_timestamp < %(timestamp)s
+                                   GROUP BY rev_user, rev_title""".format(
+            config.revision_table[lang]
+        )
+
         # Regular expression used to identify reverts
         revert_re = sur.REVERT_RE[lang]
 
+        # Users and articles whose revisions we've inserted or deleted
+        changed_users = set()
+        changed_articles = set()
+
+        # Entries for the delta log, see suggestbot.utilities.deltalog
+        inserted_deltas = []
+        expired_deltas = []
+
         # list of revisions, pushed to executemany()
         revisions = []
 
@@ -361,29 +384,234 @@ class RecentChangesDaemon:
                     },
                 )
                 num_inserted_revisions += 1
+                changed_users.add(revdata["user"])
+                changed_articles.add(revdata["title"])
+
+                # A row count of 1 means a new revision, 2 means we
+                # updated one we already had.
+                if db_cursor.rowcount == 1:
+                    inserted_deltas.append(
+                        (
+                            "+",
+                            revdata["user"],
+                            revdata["title"],
+                            1,
+                            int(not (is_minor or is_revert)),
+                            revdata["revid"],
+                        )
+                    )
             except MySQLdb.Error as e:
                 logging.error("failed to insert revision data")
                 logging.error("MySQL Error: {} : {}".format(e.args[0], e.args[1]))
             if num_inserted_revisions == 500:
                 logging.info("inserted 500 revisions, committing")
-                db_conn.commit()
+                self.commit_revisions(lang, db_conn, inserted_deltas)
+                inserted_deltas = []
                 num_inserted_revisions = 0
 
         # Commit any outstanding data
+        self.commit_revisions(lang, db_conn, inserted_deltas)
+
         logging.info("done inserting revisions, deleting old revisions")
 
         # Delete old revisions, a simple now - RC_KEEP days calculation...
         cutoff = datetime.datetime.utcnow() - datetime.timedelta(
             days=config.rc_keep[lang]
         )
+        cutoff_key = cutoff.strftime("%Y-%m-%d %H:%M:%S")
         try:
+            db_cursor.execute(expiring_users_query, {"timestamp": cutoff})
+            for row in db_cursor.fetchall():
+                user = row["rev_user"].decode("utf-8")
+                title = row["rev_title"].decode("utf-8")
+                changed_users.add(user)
+                changed_articles.add(title)
+                expired_deltas.append(
+                    (
+                        "-",
+                        user,
+                        title,
+                        row["num_edits"],
+                        int(row["num_major"] or 0),
+                        cutoff_key,
+                    )
+                )
             db_cursor.execute(delete_query, {"timestamp": cutoff})
             db_conn.commit()
+            self.log_deltas(lang, expired_deltas)
         except MySQLdb.Error as e:
             logging.error("unable to delete revisions from database")
-            logging.error("MySQL Error {}: {}" % (e.args[0], e.args[1]))
+            logging.error("MySQL Error {}: {}".format(e.args[0], e.args[1]))
 
         logging.info("info: done deleting old revisions")
 
+        self.update_user_stats(lang, changed_users)
+        self.update_article_stats(lang, changed_articles)
+
         # ok, done
         return ()
+
+    def commit_revisions(self, lang, db_conn, entries):
+        """
+        Commit the revisions inserted since the last commit, then log
+        their delta entries.  If the commit fails, the entries are dropped,
+        since those revisions never made it into the revision table.
+
+        :param lang: Wikipedia language edition we're updating
+        :type lang: str
+
+        :param db_conn: connection to the SuggestBot database
+        :type db_conn: MySQLdb.Connection
+
+        :param entries: delta log entries of the uncommitted revisions
+        :type entries: list
+        """
+
+        try:
+            db_conn.commit()
+        except MySQLdb.Error as e:
+            logging.error("unable to commit revisions")
+            logging.error("MySQL Error {}: {}".format(e.args[0], e.args[1]))
+            return ()
+
+        self.log_deltas(lang, entries)
+        return ()
+
+    def log_deltas(self, lang, entries):
+        """
+        Append inserted or expired revisions to the language's delta log,
+        if we keep one, so running co-edit indexes can apply them.
+
+        :param lang: Wikipedia language edition we're updating
+        :type lang: str
+
+        :param entries: delta log entries, see suggestbot.utilities.deltalog
+        :type entries: list
+        """
+
+        if not config.coedit_delta_dir or not entries:
+            return ()
+
+        try:
+            append_deltas(
+                delta_log_path(config.coedit_delta_dir, lang),
+                entries,
+                max_bytes=config.coedit_delta_max_bytes,
+            )
+        except OSError as e:
+            logging.error("unable to write to the delta log: {}".format(e))
+        return ()
+
+    def update_user_stats(self, lang, users, slice_size=500):
+        """
+        Recompute the per-user summary of the revision table for the given
+        users, e.g. because we added or deleted some of their revisions.
+        Users who no longer have any revisions are removed from the summary.
+
+        :param lang: Wikipedia language edition we're updating
+        :type lang: str
+
+        :param users: names of the users whose summaries we update
+        :type users: iterable of str
+
+        :param slice_size: number of users we update at a time
+        :type slice_size: int
+        """
+
+        if lang not in config.user_stats_table:
+            return ()
+
+        delete_query = """DELETE FROM {stats_table}
+                          WHERE us_user IN ({{users}})""".format(
+            stats_table=config.user_stats_table[lang]
+        )
+
+        insert_query = """INSERT INTO {stats_table}
+                          (us_user, us_num_edits, us_num_articles,
+                           us_num_major_articles, us_is_expert)
+                          SELECT rev_user, COUNT(*),
+                                 COUNT(DISTINCT rev_title),
+                                 COUNT(DISTINCT IF(rev_is_minor=0
+                                                   AND rev_comment_is_revert=0,
+                                                   rev_title, NULL)),
+                                 COUNT(*) >= %s
+                          FROM {revision_table}
+                          WHERE rev_user IN ({{users}})
+                          GROUP BY rev_user""".format(
+            stats_table=config.user_stats_table[lang],
+            revision_table=config.revision_table[lang],
+        )
+
+        logging.info("updating user summaries for {} users".format(len(users)))
+
+        (db_conn, db_cursor) = self.db.getConnection()
+        for subset in chunked(users, slice_size):
+            usernames = [user.encode("utf-8") for user in subset]
+            placeholders = ",".join(["%s"] * len(usernames))
+            try:
+                db_cursor.execute(delete_query.format(users=placeholders), usernames)
+                db_cursor.execute(
+                    insert_query.format(users=placeholders),
+                    [config.coedit_filter_threshold] + usernames,
+                )
+                db_conn.commit()
+            except MySQLdb.Error as e:
+                logging.error("unable to update user summaries")
+                logging.error("MySQL Error {}: {}".format(e.args[0], e.args[1]))
+                db_conn.rollback()
+
+        logging.info("done updating user summaries")
+        return ()
+
+    def update_article_stats(self, lang, titles, slice_size=500):
+        """
+        Recompute the per-article summary of the revision table for the
+        given articles, e.g. because we added or deleted some of their
+        revisions.  Articles that no longer have any revisions are removed
+        from the summary.
+
+        :param lang: Wikipedia language edition we're updating
+        :type lang: str
+
+        :param titles: titles of the articles whose summaries we update
+        :type titles: iterable of str
+
+        :param slice_size: number of articles we update at a time
+        :type slice_size: int
+        """
+
+        if lang not in config.article_stats_table:
+            return ()
+
+        delete_query = """DELETE FROM {stats_table}
+                          WHERE as_title IN ({{titles}})""".format(
+            stats_table=config.article_stats_table[lang]
+        )
+
+        insert_query = """INSERT INTO {stats_table}
+                          (as_title, as_num_edits, as_num_editors)
+                          SELECT rev_title, COUNT(*), COUNT(DISTINCT rev_user)
+                          FROM {revision_table}
+                          WHERE rev_title IN ({{titles}})
+                          GROUP BY rev_title""".format(
+            stats_table=config.article_stats_table[lang],
+            revision_table=config.revision_table[lang],
+        )
+
+        logging.info("updating article summaries for {} articles".format(len(titles)))
+
+        (db_conn, db_cursor) = self.db.getConnection()
+        for subset in chunked(titles, slice_size):
+            page_titles = [title.encode("utf-8") for title in subset]
+            placeholders = ",".join(["%s"] * len(page_titles))
+            try:
+                db_cursor.execute(delete_query.format(titles=placeholders), page_titles)
+                db_cursor.execute(insert_query.format(titles=placeholders), page_titles)
+                db_conn.commit()
+            except MySQLdb.Error as e:
+                logging.error("unable to update article summaries")
+                logging.error("MySQL Error {}: {}".format(e.args[0], e.args[1]))
+                db_conn.rollback()
+
+        logging.info("done updating article summaries")
+        return ()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8  -*-
+'''
+Per-process pool of Pywikibot sites and HTTP sessions, so the servers
+and daemons log in to a Wikipedia once and reuse the connection rather
+than setting it up again for every request they handle.
+
+A site is logged in the first time it is asked for with `login=True`.
+Its tokens are cleared once the site has been in use for longer than
+`config.site_token_max_age` seconds, and Pywikibot then fetches new ones
+when it next needs them.  Other HTTP requests (to the pageview API,
+Lift Wing, etc.) go through one shared `requests.Session`, which keeps
+its connections alive between requests.
+
+Copyright (C) 2016 SuggestBot Dev Group
+
+This library is free software; you can redistribute it and/or
+modify it under the terms of the GNU Library General Public
+License as published by the Free Software Foundation; either
+version 2 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+Library General Public License for more details.
+
+You should have received a copy of the GNU Library General Public
+License along with this library; if not, write to the
+Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+Boston, MA  02110-1301, USA.
+'''
+
+import time
+import logging
+import threading
+
+import requests
+import pywikibot
+
+from suggestbot import config
+
+# Sites handed out so far, keyed by language code, as lists of the site,
+# when we logged in (None if we haven't), and when its tokens were last
+# cleared.  The servers search from several threads, hence the lock.
+_sites = {}
+_lock = threading.Lock()
+
+# Shared HTTP session for requests that don't go through Pywikibot
+_session = None
+
+def get_site(lang, login=False):
+    '''
+    Get the shared site object for the given Wikipedia.
+
+    :param lang: language code of the Wikipedia
+    :type lang: str
+
+    :param login: log in to the site if we haven't already
+    :type login: bool
+    '''
+    with _lock:
+        now = time.time()
+        if lang not in _sites:
+            _sites[lang] = [pywikibot.Site(lang), None, now]
+        (site, logged_in, tokens_cleared) = _sites[lang]
+
+        if now - tokens_cleared > config.site_token_max_age:
+            logging.info("clearing tokens of {}wiki".format(lang))
+            site.tokens.clear()
+            _sites[lang][2] = now
+
+        if login and logged_in is None:
+            logging.info("logging in to {}wiki".format(lang))
+            site.login()
+            _sites[lang][1] = now
+    return(site)
+
+def get_session():
+    '''
+    Get the shared HTTP session.
+    '''
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+    return(_session)
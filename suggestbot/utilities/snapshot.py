@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8  -*-
+'''
+Versioned on-disk snapshots of numpy arrays in a flat binary layout,
+read back through a read-only memory map.  Loading a snapshot only maps
+the file, so processes start instantly and every process on a host that
+maps the same snapshot shares its physical pages.
+
+A snapshot file is laid out as:
+
+  magic (8 bytes) | header length (uint64, little-endian) | JSON header |
+  padding | array | padding | array | ...
+
+The header holds the format version, free-form metadata, and the dtype,
+shape and offset of every array.  Arrays start at 64-byte boundaries.
+
+Copyright (C) 2016 SuggestBot Dev Group
+
+This library is free software; you can redistribute it and/or
+modify it under the terms of the GNU Library General Public
+License as published by the Free Software Foundation; either
+version 2 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+Library General Public License for more details.
+
+You should have received a copy of the GNU Library General Public
+License along with this library; if not, write to the
+Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+Boston, MA  02110-1301, USA.
+'''
+
+import os
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b'SBSNAP\x00\x00'
+
+# Version of the file layout, bumped on incompatible changes
+FORMAT_VERSION = 1
+
+ALIGNMENT = 64
+
+class SnapshotError(Exception):
+    '''
+    Raised when a snapshot file is not one we can read.
+    '''
+    pass
+
+def _padding(offset):
+    return(-offset % ALIGNMENT)
+
+def write_snapshot(path, arrays, meta=None):
+    '''
+    Write the given arrays to a snapshot file.  The snapshot is written
+    to a temporary file first and then renamed into place, so readers
+    never see a partial snapshot.
+
+    :param path: path of the snapshot file
+    :type path: str
+
+    :param arrays: arrays to store, keyed by name
+    :type arrays: dict
+
+    :param meta: metadata to store with the arrays, must be
+                 serialisable as JSON
+    :type meta: dict
+    '''
+    arrays = {name: np.ascontiguousarray(array)
+              for (name, array) in arrays.items()}
+
+    # Offsets are relative to the start of the data section,
+    # which starts at the first aligned position after the header.
+    toc = {}
+    offset = 0
+    for (name, array) in arrays.items():
+        offset += _padding(offset)
+        toc[name] = {'dtype': array.dtype.str,
+                     'shape': list(array.shape),
+                     'offset': offset}
+        offset += array.nbytes
+
+    header = json.dumps({'format': FORMAT_VERSION,
+                         'meta': meta or {},
+                         'arrays': toc}).encode('utf-8')
+
+    tmp_path = '{}.tmp.{}'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as outfile:
+        outfile.write(MAGIC)
+        outfile.write(struct.pack('<Q', len(header)))
+        outfile.write(header)
+        data_start = len(MAGIC) + 8 + len(header)
+        outfile.write(b'\x00' * _padding(data_start))
+
+        position = 0
+        for (name, array) in arrays.items():
+            outfile.write(b'\x00' * (toc[name]['offset'] - position))
+            outfile.write(array.tobytes())
+            position = toc[name]['offset'] + array.nbytes
+        outfile.flush()
+        os.fsync(outfile.fileno())
+
+    os.replace(tmp_path, path)
+
+def read_snapshot(path):
+    '''
+    Map a snapshot file read-only.  Returns a tuple of the metadata
+    dictionary and a dictionary of the arrays, keyed by name.
+
+    :param path: path of the snapshot file
+    :type path: str
+    '''
+    with open(path, 'rb') as infile:
+        magic = infile.read(len(MAGIC))
+        if magic != MAGIC:
+            raise SnapshotError('{} is not a snapshot file'.format(path))
+        (header_length,) = struct.unpack('<Q', infile.read(8))
+        header = json.loads(infile.read(header_length).decode('utf-8'))
+
+    if header['format'] != FORMAT_VERSION:
+        raise SnapshotError('{} has format version {}, expected {}'.format(
+            path, header['format'], FORMAT_VERSION))
+
+    data_start = len(MAGIC) + 8 + header_length
+    data_start += _padding(data_start)
+
+    # An empty data section can't be mapped
+    if os.path.getsize(path) > data_start:
+        data = np.memmap(path, dtype=np.uint8, mode='r', offset=data_start)
+    else:
+        data = np.zeros(0, dtype=np.uint8)
+
+    arrays = {}
+    for (name, info) in header['arrays'].items():
+        dtype = np.dtype(info['dtype'])
+        count = int(np.prod(info['shape'], dtype=np.int64))
+        if not count:
+            arrays[name] = np.zeros(info['shape'], dtype=dtype)
+            continue
+        arrays[name] = np.frombuffer(
+            data, dtype=dtype, count=count,
+            offset=info['offset']).reshape(info['shape'])
+    return(header['meta'], arrays)
+
+def string_table_arrays(strings):
+    '''
+    Pack a list of strings into the arrays of a `StringTable`,
+    where string number i keeps ID i.
+
+    :param strings: the strings to pack
+    :type strings: list of str
+    '''
+    encoded = [string.encode('utf-8') for string in strings]
+    lengths = np.fromiter((len(s) for s in encoded), dtype=np.int64,
+                          count=len(encoded))
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+    # IDs in order of their UTF-8 bytes, for binary search
+    order = np.array(sorted(range(len(encoded)), key=encoded.__getitem__),
+                     dtype=np.int32)
+    return({'blob': blob, 'offsets': offsets, 'order': order})
+
+class StringTable:
+    def __init__(self, blob, offsets, order):
+        '''
+        Read-only mapping between strings and dense integer IDs, backed
+        by flat arrays (see `string_table_arrays()`) so it can live in
+        a snapshot.  Offers the same lookups as
+        `suggestbot.recommenders.coeditindex.Interner`.
+
+        :param blob: UTF-8 bytes of all strings, concatenated in ID order
+        :type blob: numpy.ndarray
+
+        :param offsets: start of each string in `blob`, plus the end
+                        of the last one
+        :type offsets: numpy.ndarray
+
+        :param order: IDs sorted by their string's UTF-8 bytes
+        :type order: numpy.ndarray
+        '''
+        self.blob = blob
+        self.offsets = offsets
+        self.order = order
+
+    def _bytes(self, string_id):
+        return(self.blob[self.offsets[string_id]:
+                         self.offsets[string_id+1]].tobytes())
+
+    def get(self, name, default=None):
+        key = name.encode('utf-8')
+        lo = 0
+        hi = len(self.order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(self.order[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.order) and self._bytes(self.order[lo]) == key:
+            return(int(self.order[lo]))
+        return(default)
+
+    def __getitem__(self, string_id):
+        return(self._bytes(string_id).decode('utf-8'))
+
+    def __contains__(self, name):
+        return(self.get(name) is not None)
+
+    def __len__(self):
+        return(len(self.order))
+
+    def __iter__(self):
+        for string_id in range(len(self)):
+            yield self[string_id]
@@ -29,6 +29,7 @@ import logging
 
 from suggestbot import config
 import suggestbot.db as db
+from suggestbot.utilities.sites import get_site
 
 import pywikibot
 import MySQLdb
@@ -59,7 +60,7 @@ class TaskUpdater:
         else:
             self.task_def = task_def
 
-        self.site = pywikibot.Site(self.lang)
+        self.site = get_site(self.lang)
             
         # RegEx used for proper quoting of single quotes in SQL queries,
         # and escaping '\' (because there _is_ an article named 'Control-\');
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# -*- coding: utf-8  -*-
+'''
+Precomputed classification of article titles, so that the link
+recommender and the recommendation filter can tell whether an article
+is a list, a date or has a year in its title with a lookup instead of
+running regular expressions on every candidate.  Titles are classified
+offline (see bin/build-title-classes.py) into one byte of class bits per
+page ID, stored in a snapshot file that every process on a host can map.
+
+Copyright (C) 2016 SuggestBot Dev Group
+
+This library is free software; you can redistribute it and/or
+modify it under the terms of the GNU Library General Public
+License as published by the Free Software Foundation; either
+version 2 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+Library General Public License for more details.
+
+You should have received a copy of the GNU Library General Public
+License along with this library; if not, write to the
+Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+Boston, MA  02110-1301, USA.
+'''
+
+import os
+import re
+import time
+import array
+import logging
+
+import numpy as np
+
+import MySQLdb
+import MySQLdb.cursors
+
+from suggestbot import config
+from suggestbot.utilities.snapshot import read_snapshot, write_snapshot, \
+    string_table_arrays, StringTable
+
+## Class bits.  Every article we classified has CLASSIFIED set, so that
+## pages created since (which have no bits) can be told apart.
+YEAR = 1 << 0  # has four digits in its title, typically a year
+LIST = 1 << 1  # a list article, as the link recommender defines them
+DATE = 1 << 2  # starts with a month name or a date
+FILTER_LIST = 1 << 3  # a list article, as config.list_re defines them
+CLASSIFIED = 1 << 7
+
+## Classes the link recommender excludes
+LINK_EXCLUDED = YEAR | LIST | DATE
+
+# Regular expressions for things that the link recommender excludes.
+# Note that we use match() to anchor these at the beginning
+# of the string, instead of using "^" and search(), and that we use
+# non-capturing groups since we're not using the results.
+# Also note that Swedish and Norwegian Wikipedia specify dates as
+# "xx. Januar" rather than "January 1" as they do in English.
+MONTHS = {
+    'en': r'(January|February|March|April|May|June|July|August|September|October|November|December)[ _]\d+',
+    'no': r'\d+\.[ _]+(:[Jj]anuar|[Ff]ebruar|[Mm]ars|[Aa]pril|[Mm]ai|[Jj]uni|[Jj]uli|[Aa]ugust|[Ss]eptember|[Oo]ktober|[Nn]ovember|[Dd]esember)',
+    'sv': r'\d+\.[ _]+(:[Jj]anuari|[Ff]ebruari|[Mm]ars|[Aa]pril|[Mm]aj|[Jj]uni|[Jj]uli|[Aa]ugusti|[Ss]eptember|[Oo]ktober|[Nn]ovember|[Dd]ecember)',
+    'pt': r'\d+[ _]+de[ _]+(:[Jj]aneiro|[Ff]evereiro|[Mm]arço|[Aa]bril|[Mm]aio|[Jj]unho|[Jj]ulho|[Aa]gosto|[Ss]etembro|[Oo]utubro|[Nn]ovembro|[Dd]ezembro)',
+    'hu': r'Január|Február|Március|Április|Május|Június|Július|Augusztus|Szeptember|Október|November|December',
+    'fa': 'دسامب|نوامب|اکتب|سپتامب|اوت|ژوئی|ژوئن|مه|آوریل|مارس|فوریه|ژانویه',
+    'ru': r'(:Январь|Февраль|Март|Апрель|Май|Июнь|Июль|Август|Сентябрь|Октябрь|Ноябрь|Декабрь)|(:\d+[ _]+(:января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря))',
+    ## Note the negative lookahead (?! ...) to allow us to match
+    ## the actual months, but not dates.
+    'fr': r'(\d+[ _](?!.*[ _]\d+$))?([Jj]anvier|[Ff]évrier|[Mm]ars|[Aa]vril|[Mm]ai|[Jj]uin|[Jj]uillet|[Aa]oût|[Ss]eptembre|[Oo]ctobre|[Nn]ovembre|[Dd]écembre)(\d+)?',
+    }
+
+# Note: compatible with both ' '  and '_' as spaces
+LISTS = {
+    'en': r'^List[ _]of[ _]',
+    'no': r'^Liste[ _]over[ _]',
+    'sv': r'^Lista[ _]över[ _]',
+    'pt': r'^Lista[ _]de[ _]',
+    'hu': r'[ _]listája$',
+    'fa': r'^فهرست',
+    'ru': r'(^Список|(:Алфавитный[ _]|Хронологический[ _])список)|—[ _]список',
+    'fr': r"[Ll]iste[ _]d[e']",
+    }
+
+# Compile the regular expressions
+MONTHS_RE = dict()
+LISTS_RE = dict()
+for lang_code in MONTHS.keys():
+    MONTHS_RE[lang_code] = re.compile(MONTHS[lang_code], re.U|re.I)
+    LISTS_RE[lang_code] = re.compile(LISTS[lang_code], re.U|re.I)
+
+## FIXME: what's the false positive rate on this one?
+YEAR_RE = re.compile(r'\d{4}')
+
+def classify(title, lang):
+    '''
+    Get the class bits of an article title, including CLASSIFIED.
+
+    :param title: title of the article, with spaces or underscores
+    :type title: str
+
+    :param lang: language code of the Wikipedia the article is from
+    :type lang: str
+    '''
+    classes = CLASSIFIED
+    if YEAR_RE.search(title):
+        classes |= YEAR
+    if lang in LISTS_RE and LISTS_RE[lang].search(title):
+        classes |= LIST
+    if lang in MONTHS_RE and MONTHS_RE[lang].match(title):
+        classes |= DATE
+    if lang in config.list_re and re.match(config.list_re[lang], title):
+        classes |= FILTER_LIST
+    return(classes)
+
+def title_class_path(directory, lang):
+    '''
+    Path of the title class snapshot for the given language.
+
+    :param directory: directory where title class snapshots are kept
+    :type directory: str
+
+    :param lang: language code of the Wikipedia the classes are for
+    :type lang: str
+    '''
+    return(os.path.join(directory, '{}wiki-titleclass.snapshot'.format(lang)))
+
+def mapped_title_classes(directory, lang, mapped):
+    '''
+    Get the title classes for the given language, mapping the snapshot
+    if it isn't already or it has been rebuilt since.  Returns None if
+    there is no snapshot for the language.
+
+    :param directory: directory where title class snapshots are kept
+    :type directory: str
+
+    :param lang: language code of the Wikipedia the classes are for
+    :type lang: str
+
+    :param mapped: the caller's mapped classes, keyed by language code,
+                   as tuples of the classes and the snapshot's modification
+                   time, updated as needed
+    :type mapped: dict
+    '''
+    if not directory:
+        return(None)
+
+    path = title_class_path(directory, lang)
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return(None)
+
+    (classes, classes_mtime) = mapped.get(lang, (None, None))
+    if classes_mtime != mtime:
+        classes = TitleClasses(lang)
+        if not classes.load_snapshot(path):
+            return(None)
+        mapped[lang] = (classes, mtime)
+    return(classes)
+
+class TitleClasses:
+    def __init__(self, lang):
+        '''
+        Instantiate an empty set of title classes for the given language.
+        Call `load()` to classify the articles in the database replica,
+        or `load_snapshot()` to map a previously built snapshot.
+
+        :param lang: language code of the Wikipedia the classes are for
+        :type lang: str
+        '''
+        self.lang = lang
+
+        # Class bits of every article, indexed by page ID
+        self.flags = None
+
+        # Page IDs of the articles, sorted, and their titles (with
+        # underscores, as in the database) in the same order, so we can
+        # look up titles too.
+        self.page_ids = None
+        self.titles = None
+
+        # When the classes were built (seconds since the epoch)
+        self.built = None
+
+    def load(self, db_conn):
+        '''
+        Classify every article in the replicated Wikipedia database.
+
+        :param db_conn: connection to the Wikipedia's database replica
+        :type db_conn: MySQLdb.Connection
+        '''
+
+        # Articles in the main namespace, in page ID order
+        article_query = '''SELECT page_id, page_title
+                           FROM page
+                           WHERE page_namespace=0
+                           AND page_is_redirect=0
+                           ORDER BY page_id'''
+
+        logging.info("classifying article titles for {}wiki".format(self.lang))
+        start = time.time()
+
+        page_ids = array.array('q')
+        titles = []
+
+        ss_cursor = db_conn.cursor(MySQLdb.cursors.SSCursor)
+        try:
+            ss_cursor.execute(article_query)
+            for (page_id, page_title) in ss_cursor:
+                page_ids.append(page_id)
+                titles.append(page_title.decode('utf-8'))
+        except MySQLdb.Error as e:
+            logging.error("Unable to read the articles of {}wiki".format(self.lang))
+            logging.error("MySQL Error {}: {}".format(e.args[0], e.args[1]))
+            ss_cursor.close()
+            return(False)
+
+        ss_cursor.close()
+
+        self.build(np.frombuffer(page_ids, dtype=np.int64), titles)
+
+        logging.info("classified {} article titles in {:.1f} seconds".format(
+            len(titles), time.time() - start))
+        return(True)
+
+    def build(self, page_ids, titles):
+        '''
+        Classify the given articles.
+
+        :param page_ids: page IDs of the articles, sorted
+        :type page_ids: numpy.ndarray
+
+        :param titles: titles of the articles, in the same order
+        :type titles: list of str
+        '''
+        self.page_ids = np.asarray(page_ids, dtype=np.int32)
+        size = int(self.page_ids.max()) + 1 if len(self.page_ids) else 0
+        self.flags = np.zeros(size, dtype=np.uint8)
+        self.flags[self.page_ids] = np.fromiter(
+            (classify(title, self.lang) for title in titles),
+            dtype=np.uint8, count=len(titles))
+
+        arrays = string_table_arrays(titles)
+        self.titles = StringTable(arrays['blob'], arrays['offsets'],
+                                  arrays['order'])
+        self.built = time.time()
+
+    def page_flags(self, page_ids):
+        '''
+        Get the class bits of the given page IDs, as an array.  Pages
+        we haven't classified (e.g. created since) get 0, which has
+        CLASSIFIED unset.
+
+        :param page_ids: the page IDs
+        :type page_ids: numpy.ndarray
+        '''
+        page_ids = np.asarray(page_ids, dtype=np.int64)
+        flags = np.zeros(len(page_ids), dtype=np.uint8)
+        known = page_ids < len(self.flags)
+        flags[known] = self.flags[page_ids[known]]
+        return(flags)
+
+    def title_flags(self, title):
+        '''
+        Get the class bits of the article with the given title,
+        or None if we haven't classified it.
+
+        :param title: title of the article, with spaces or underscores
+        :type title: str
+        '''
+        title_id = self.titles.get(title.replace(' ', '_'))
+        if title_id is None:
+            return(None)
+        return(int(self.flags[self.page_ids[title_id]]))
+
+    def save_snapshot(self, path):
+        '''
+        Write the classes to a snapshot file that `load_snapshot()` can map.
+
+        :param path: path of the snapshot file
+        :type path: str
+        '''
+        write_snapshot(path,
+                       {'flags': self.flags,
+                        'page_ids': self.page_ids,
+                        'titles.blob': self.titles.blob,
+                        'titles.offsets': self.titles.offsets,
+                        'titles.order': self.titles.order},
+                       meta={'lang': self.lang, 'built': self.built})
+        logging.info("wrote title classes of {} articles to {}".format(
+            len(self.page_ids), path))
+
+    def load_snapshot(self, path):
+        '''
+        Populate the classes by mapping a snapshot file written by
+        `save_snapshot()`.
+
+        :param path: path of the snapshot file
+        :type path: str
+        '''
+        (meta, arrays) = read_snapshot(path)
+        if meta['lang'] != self.lang:
+            logging.error("snapshot {} is for {}wiki, not {}wiki".format(
+                path, meta['lang'], self.lang))
+            return(False)
+
+        self.flags = arrays['flags']
+        self.page_ids = arrays['page_ids']
+        self.titles = StringTable(arrays['titles.blob'],
+                                  arrays['titles.offsets'],
+                                  arrays['titles.order'])
+        self.built = meta['built']
+
+        logging.info("mapped title classes of {} articles from {}".format(
+            len(self.page_ids), path))
+        return(True)
@@ -0,0 +1,92 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+"""
+In-memory SQLite stand-in for SuggestBot's revision tables, with a cursor
+that understands the bits of MySQL our queries use, so that the set-based
+queries can be tested without a database server.
+"""
+
+import re
+import sqlite3
+import hashlib
+
+
+def connect():
+    """
+    Open an in-memory database with the MySQL functions our queries use.
+    """
+    db_conn = sqlite3.connect(":memory:")
+    db_conn.create_function("IF", 3, lambda condition, a, b: a if condition else b)
+    db_conn.create_function("MD5", 1, lambda s: hashlib.md5(s.encode("utf-8")).hexdigest())
+    db_conn.create_function("LEFT_", 2, lambda s, n: s[:n])
+    db_conn.create_function("CONV", 3, lambda s, from_base, to_base: int(s, from_base))
+    return db_conn
+
+
+def create_revision_table(db_conn, table, revisions, timestamp="2016-01-01 00:00:00"):
+    """
+    Create a revision table holding the given (user, title, is major)
+    revisions, with revision IDs in the order they are given.
+    """
+    db_conn.execute(
+        """CREATE TABLE {} (
+               rev_id INTEGER PRIMARY KEY,
+               rev_title TEXT NOT NULL,
+               rev_user TEXT NOT NULL,
+               rev_timestamp TEXT NOT NULL,
+               rev_is_minor INTEGER DEFAULT 0,
+               rev_comment_is_revert INTEGER DEFAULT 0)""".format(table)
+    )
+    db_conn.executemany(
+        "INSERT INTO {} VALUES (?, ?, ?, ?, ?, 0)".format(table),
+        [
+            (rev_id, title, user, timestamp, 0 if major else 1)
+            for (rev_id, (user, title, major)) in enumerate(revisions, start=1)
+        ],
+    )
+
+
+class Cursor:
+    def __init__(self, db_conn, dictionary=True):
+        """
+        A cursor returning rows as dictionaries (like MySQLdb's DictCursor)
+        or tuples, with text columns as bytes like our binary columns.
+        """
+        self.cursor = db_conn.cursor()
+        self.dictionary = dictionary
+        self.rows = []
+        self.rowcount = 0
+
+    def execute(self, query, args=None):
+        # LEFT() is a keyword in SQLite, and it uses other placeholders
+        query = query.replace("LEFT(", "LEFT_(")
+        query = re.sub(r"%\((\w+)\)s", r":\1", query).replace("%s", "?")
+        if isinstance(args, dict):
+            args = {key: self._decode(value) for (key, value) in args.items()}
+        elif args is not None:
+            args = [self._decode(value) for value in args]
+        self.cursor.execute(query, args or [])
+
+        names = [column[0] for column in self.cursor.description or []]
+        self.rows = []
+        for row in self.cursor.fetchall():
+            row = [value.encode("utf-8") if isinstance(value, str) else value for value in row]
+            self.rows.append(dict(zip(names, row)) if self.dictionary else tuple(row))
+        self.rowcount = len(self.rows) if names else self.cursor.rowcount
+        return self.rowcount
+
+    def _decode(self, value):
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    def fetchall(self):
+        (rows, self.rows) = (self.rows, [])
+        return rows
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self.cursor.close()
@@ -0,0 +1,265 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+"""
+Test the in-memory co-edit index against a direct implementation of
+the revision table queries in suggestbot.recommenders.coedit, using
+synthetic edit histories.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the Python path
+# Use this line only if your want to test the script directly from the current path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import random
+
+import numpy as np
+
+from suggestbot import config
+from suggestbot.recommenders.coeditindex import CoeditIndex
+from suggestbot.utilities.deltalog import append_deltas, delta_log_path, log_position
+
+from revisiondb import Cursor, connect, create_revision_table
+
+USERS = ["User {}".format(i) for i in range(60)]
+ARTICLES = ["Article {}".format(i) for i in range(120)]
+EXP_THRESHOLD = 18
+ASSOC_THRESHOLD = 0.0001
+
+
+def make_revisions(seed, n=3000, users=USERS, articles=ARTICLES):
+    """
+    Random revisions as (user, title, is major) tuples, skewed so some
+    articles have many editors and some users are experienced.
+    """
+    rng = random.Random(seed)
+    return [
+        (
+            rng.choice(users),
+            rng.choice(articles[: rng.randint(5, len(articles))]),
+            int(rng.random() < 0.6),
+        )
+        for _ in range(n)
+    ]
+
+
+def aggregate(revisions):
+    totals = {}
+    for (user, title, major) in revisions:
+        counts = totals.setdefault((user, title), [0, 0])
+        counts[0] += 1
+        counts[1] += major
+    return totals
+
+
+def build_index(revisions):
+    index = CoeditIndex("en")
+    columns = ([], [], [], [])
+    for ((user, title), (num_edits, num_major)) in aggregate(revisions).items():
+        columns[0].append(index.users.intern(user))
+        columns[1].append(index.articles.intern(title))
+        columns[2].append(num_edits)
+        columns[3].append(num_major)
+    index.build(*[np.array(column, dtype=np.int32) for column in columns])
+    return index
+
+
+def edit_table(index):
+    """
+    Index contents as a dictionary mapping (user, title) to
+    the number of edits and number of major edits.
+    """
+    table = {}
+    by_user = index.by_user.tocoo()
+    for (user_id, article_id, num_edits) in zip(by_user.row, by_user.col, by_user.data):
+        if num_edits:
+            table[(index.users[user_id], index.articles[article_id])] = [num_edits, 0]
+    major = index.major_by_user.tocoo()
+    for (user_id, article_id, num_major) in zip(major.row, major.col, major.data):
+        if num_major:
+            table[(index.users[user_id], index.articles[article_id])][1] = num_major
+    return table
+
+
+def reference_neighbours(revisions, username, basket):
+    """
+    Association of every neighbour as defined by the queries in
+    suggestbot.recommenders.coedit.
+    """
+    num_edits = {}
+    for (user, title, major) in revisions:
+        num_edits[user] = num_edits.get(user, 0) + 1
+
+    neighbours = {}
+    for user in num_edits:
+        if user == username:
+            continue
+        expert = num_edits[user] >= EXP_THRESHOLD
+        if not any(
+            u == user and title in basket and (major or not expert)
+            for (u, title, major) in revisions
+        ):
+            continue
+        articles = {t for (u, t, major) in revisions if u == user and (major or not expert)}
+        shared = len(articles & set(basket))
+        assoc = shared / (len(basket) + len(articles) - shared)
+        if assoc >= ASSOC_THRESHOLD:
+            neighbours[user] = assoc
+    return neighbours
+
+
+def test_neighbours_and_scores():
+    revisions = make_revisions(1)
+    index = build_index(revisions)
+
+    for username in ["User 0", "User 7", "Not a user"]:
+        basket = ARTICLES[:15] + ["Not an article"]
+        expected = reference_neighbours(revisions, username, basket)
+
+        (nhood, assoc) = index.neighbours(
+            username, basket, EXP_THRESHOLD, ASSOC_THRESHOLD, k=len(USERS)
+        )
+        found = {index.users[user_id]: a for (user_id, a) in zip(nhood, assoc)}
+        assert set(found) == set(expected)
+        for user in expected:
+            assert abs(found[user] - expected[user]) < 1e-12
+        assert list(assoc) == sorted(assoc, reverse=True)
+
+        # Only the k most associated are kept
+        (top, top_assoc) = index.neighbours(
+            username, basket, EXP_THRESHOLD, ASSOC_THRESHOLD, k=5
+        )
+        assert len(top) == 5
+        assert np.allclose(top_assoc, sorted(expected.values(), reverse=True)[:5])
+
+        # Every edit by a neighbour adds their association to the article
+        (article_ids, scores, counts) = index.score(nhood, assoc)
+        expected_scores = {}
+        expected_counts = {}
+        for (user, title, major) in revisions:
+            if user in found:
+                expected_scores[title] = expected_scores.get(title, 0) + found[user]
+                expected_counts[title] = expected_counts.get(title, 0) + 1
+        assert len(article_ids) == len(expected_scores)
+        for (article_id, score, count) in zip(article_ids, scores, counts):
+            title = index.articles[article_id]
+            assert abs(score - expected_scores[title]) < 1e-9
+            assert count == expected_counts[title]
+
+
+def test_empty_basket():
+    index = build_index(make_revisions(2))
+    (nhood, assoc) = index.neighbours(
+        "User 0", ["Not an article"], EXP_THRESHOLD, ASSOC_THRESHOLD
+    )
+    assert len(nhood) == 0
+    assert len(assoc) == 0
+
+
+def test_association_matches_neighbours():
+    index = build_index(make_revisions(3))
+    basket = ARTICLES[:10]
+    (nhood, assoc) = index.neighbours("User 0", basket, EXP_THRESHOLD, ASSOC_THRESHOLD)
+    (exact, shared) = index.association(nhood, basket, EXP_THRESHOLD)
+    assert np.allclose(exact, assoc)
+    assert (shared > 0).all()
+
+
+def test_snapshot_round_trip(tmp_path):
+    index = build_index(make_revisions(4))
+    index.delta_inode = 12345
+    index.delta_offset = 678
+    path = str(tmp_path / "enwiki-coedit.snapshot")
+    index.save_snapshot(path)
+
+    mapped = CoeditIndex("en")
+    assert mapped.load_snapshot(path)
+    assert (mapped.version, mapped.delta_inode, mapped.delta_offset) == (
+        index.version,
+        12345,
+        678,
+    )
+    assert list(mapped.users) == list(index.users)
+    assert list(mapped.articles) == list(index.articles)
+    assert edit_table(mapped) == edit_table(index)
+
+    basket = ARTICLES[:12]
+    for (a, b) in zip(
+        index.neighbours("User 1", basket, EXP_THRESHOLD, ASSOC_THRESHOLD),
+        mapped.neighbours("User 1", basket, EXP_THRESHOLD, ASSOC_THRESHOLD),
+    ):
+        assert np.array_equal(a, b)
+
+    # A snapshot for another language is refused
+    assert not CoeditIndex("de").load_snapshot(path)
+
+
+def test_apply_deltas(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "coedit_delta_dir", str(tmp_path))
+    path = delta_log_path(str(tmp_path), "en")
+
+    revisions = make_revisions(5, n=2000)
+    index = build_index(revisions)
+    (index.delta_inode, index.delta_offset) = log_position(path)
+    version = index.version
+
+    # New revisions, some by new users and to new articles, and the
+    # expiry of the oldest ones.  Compaction then drops users and
+    # articles left without edits.
+    new = make_revisions(6, n=300, users=USERS + ["New user"], articles=ARTICLES + ["New article"])
+    append_deltas(path, [("+", user, title, 1, major, None) for (user, title, major) in new])
+    expired = aggregate(revisions[:1500])
+    append_deltas(
+        path,
+        [
+            ("-", user, title, num_edits, num_major, None)
+            for ((user, title), (num_edits, num_major)) in expired.items()
+        ],
+    )
+    index.compacted = 0
+    assert index.apply_deltas()
+    assert index.version > version
+
+    expected = build_index(revisions[1500:] + new)
+    assert edit_table(index) == edit_table(expected)
+    assert set(index.users) == set(expected.users)
+    assert set(index.articles) == set(expected.articles)
+
+    basket = ARTICLES[:8] + ["New article"]
+    found = dict(
+        zip(*index.neighbours("User 0", basket, EXP_THRESHOLD, ASSOC_THRESHOLD))
+    )
+    wanted = dict(
+        zip(*expected.neighbours("User 0", basket, EXP_THRESHOLD, ASSOC_THRESHOLD))
+    )
+    assert {index.users[i]: round(a, 12) for (i, a) in found.items()} == {
+        expected.users[i]: round(a, 12) for (i, a) in wanted.items()
+    }
+
+    # Entries are lost if the log is rotated
+    os.replace(path, "{}.1".format(path))
+    append_deltas(path, [("+", "User 1", "Article 1", 1, 1, None)])
+    assert not index.apply_deltas()
+
+
+def test_unread_deltas():
+    db_conn = connect()
+    create_revision_table(
+        db_conn, config.revision_table["en"], make_revisions(7, n=20), timestamp="2016-01-01 00:00:00"
+    )
+    index = CoeditIndex("en")
+
+    # Revisions 1-20 and expiries up to 2015 are in the table,
+    # the rest were logged after it was read
+    entries = [
+        ("+", "User 1", "Article 1", 1, 1, "5"),
+        ("+", "User 1", "Article 2", 1, 0, "21"),
+        ("+", "User 2", "Article 1", 1, 1, None),
+        ("-", "User 3", "Article 3", 2, 1, "2015-06-01 00:00:00"),
+        ("-", "User 3", "Article 4", 2, 1, "2016-06-01 00:00:00"),
+        ("-", "User 4", "Article 4", 1, 0, None),
+    ]
+    unread = index.unread_deltas(Cursor(db_conn), entries, slice_size=1)
+    assert unread == [entries[1], entries[2], entries[4], entries[5]]
@@ -0,0 +1,115 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+"""
+Test batch collaborator recommendations against a direct calculation
+of each user's neighbours, using a synthetic edit history.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the Python path
+# Use this line only if your want to test the script directly from the current path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import random
+
+import numpy as np
+
+from suggestbot.recommenders import coedit
+from suggestbot.recommenders.coeditindex import CoeditIndex
+from suggestbot.recommenders.collaborator import CollabRecommender
+
+USERS = ["User {}".format(i) for i in range(40)]
+ARTICLES = ["Article {}".format(i) for i in range(60)]
+EXP_THRESHOLD = 18
+
+
+def make_revisions(seed, n=1500):
+    rng = random.Random(seed)
+    return [
+        (rng.choice(USERS), rng.choice(ARTICLES[: rng.randint(5, len(ARTICLES))]), rng.random() < 0.6)
+        for _ in range(n)
+    ]
+
+
+def make_recommender(revisions):
+    index = CoeditIndex("en")
+    totals = {}
+    for (user, title, major) in revisions:
+        counts = totals.setdefault((user, title), [0, 0])
+        counts[0] += 1
+        counts[1] += major
+    columns = ([], [], [], [])
+    for ((user, title), (num_edits, num_major)) in totals.items():
+        columns[0].append(index.users.intern(user))
+        columns[1].append(index.articles.intern(title))
+        columns[2].append(num_edits)
+        columns[3].append(num_major)
+    index.build(*[np.array(column, dtype=np.int32) for column in columns])
+
+    coedit_recommender = coedit.Recommender()
+    coedit_recommender.indexes["en"] = index
+    return CollabRecommender(exp_threshold=EXP_THRESHOLD, coedit_recommender=coedit_recommender)
+
+
+def reference_recs(revisions, user, basket, nrecs, threshold, backoff, assoc_threshold=0.0001, min_threshold=1):
+    num_edits = {}
+    for (u, t, m) in revisions:
+        num_edits[u] = num_edits.get(u, 0) + 1
+
+    neighbours = []
+    for other in num_edits:
+        if other == user:
+            continue
+        expert = num_edits[other] >= EXP_THRESHOLD
+        articles = {t for (u, t, m) in revisions if u == other and (m or not expert)}
+        shared = len(articles & basket)
+        if not shared:
+            continue
+        assoc = shared / (len(basket) + len(articles) - shared)
+        if assoc >= assoc_threshold:
+            neighbours.append((other, assoc, shared))
+
+    qualified = [n for n in neighbours if n[2] >= threshold]
+    while backoff and threshold > min_threshold and len(qualified) < nrecs:
+        threshold -= 1
+        qualified = [n for n in neighbours if n[2] >= threshold]
+    return sorted(qualified, key=lambda n: -n[1])[:nrecs]
+
+
+def test_recommend_batch():
+    revisions = make_revisions(1)
+    recommender = make_recommender(revisions)
+    users = USERS[:25] + ["Not a user"]
+    contribs = {"User 3": ARTICLES[:10], "Not a user": ARTICLES[5:8]}
+
+    for (nrecs, threshold, backoff) in [(100, 1, 0), (5, 3, 0), (20, 6, 1)]:
+        recs = recommender.recommend_batch(
+            users, "en", nrecs=nrecs, threshold=threshold, backoff=backoff, contribs=contribs, chunk_size=7
+        )
+        assert set(recs) == set(users)
+        for user in users:
+            if user in contribs:
+                basket = set(contribs[user])
+            else:
+                basket = {t for (u, t, m) in revisions if u == user}
+            expected = reference_recs(revisions, user, basket, nrecs, threshold, backoff)
+            found = recs[user]
+            assert len(found) == len(expected)
+            assert user not in [rec["item"] for rec in found]
+            assert np.allclose([rec["value"] for rec in found], [assoc for (u, assoc, shared) in expected])
+
+            # Ties at the cut-off can go either way, everyone above it is in
+            if expected:
+                cutoff = expected[-1][1]
+                above = {u for (u, assoc, shared) in expected if assoc > cutoff + 1e-12}
+                assert above <= {rec["item"] for rec in found}
+
+
+def test_shares_coedit_index():
+    revisions = make_revisions(2)
+    recommender = make_recommender(revisions)
+    index = recommender.coedit_recommender.get_index("en")
+    recommender.recommend_batch(["User 1"], "en")
+    assert recommender.coedit_recommender.indexes["en"] is index
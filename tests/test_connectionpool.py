@@ -0,0 +1,137 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+"""
+Test the links recommender's connection pool and concurrent slice
+fetching, using fake database connections.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the Python path
+# Use this line only if your want to test the script directly from the current path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+import threading
+
+import MySQLdb
+import pytest
+
+from suggestbot.recommenders.links import (
+    ConnectionPool,
+    DatabaseConnectionError,
+    Recommender,
+)
+
+
+class FakeConnection:
+    def __init__(self, fail_ping=False, fail_rollback=False):
+        self.fail_ping = fail_ping
+        self.fail_rollback = fail_rollback
+        self.num_rollbacks = 0
+        self.closed = False
+
+    def ping(self):
+        if self.fail_ping:
+            raise MySQLdb.Error("gone away")
+
+    def rollback(self):
+        if self.fail_rollback:
+            raise MySQLdb.Error("gone away")
+        self.num_rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor()
+
+
+class FakeCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+def test_acquire_and_release():
+    opened = []
+
+    def connect():
+        opened.append(FakeConnection())
+        return opened[-1]
+
+    pool = ConnectionPool(connect, 2, timeout=0.1)
+    first = pool.acquire()
+    second = pool.acquire()
+    assert len(opened) == 2
+    assert first is not second
+
+    # Released connections have their transaction rolled back and are reused
+    pool.release(first)
+    assert first.num_rollbacks == 1
+    assert pool.acquire() is first
+    assert len(opened) == 2
+
+    # A full pool times out
+    with pytest.raises(DatabaseConnectionError):
+        pool.acquire()
+
+    # ...unless a connection is released in the meantime
+    threading.Timer(0.02, pool.release, [second]).start()
+    pool.timeout = 5
+    assert pool.acquire() is second
+
+
+def test_broken_connections():
+    opened = []
+
+    def connect():
+        opened.append(FakeConnection())
+        return opened[-1]
+
+    pool = ConnectionPool(connect, 1, timeout=0.1)
+    db_conn = pool.acquire()
+
+    # A connection that can't be rolled back is closed, making room for a new one
+    db_conn.fail_rollback = True
+    pool.release(db_conn)
+    assert db_conn.closed
+    assert pool.num_open == 0
+
+    # Idle connections that fail to respond are replaced
+    db_conn = pool.acquire()
+    pool.release(db_conn)
+    db_conn.fail_ping = True
+    assert pool.acquire() is opened[-1] is not db_conn
+    assert db_conn.closed
+    assert pool.num_open == 1
+
+    def fail():
+        raise MySQLdb.Error("can't connect")
+
+    pool = ConnectionPool(fail, 1)
+    with pytest.raises(DatabaseConnectionError):
+        pool.acquire()
+    assert pool.num_open == 0
+
+
+def test_fetch_slices():
+    recommender = Recommender(sliceSize=3, workers={"en": 3})
+    pool = ConnectionPool(FakeConnection, 4)
+    recommender.pools[("wiki", "en")] = pool
+
+    def fetch(db_cursor, subset):
+        # Later slices finish first
+        time.sleep(0.01 * (10 - subset[0] // 3))
+        return list(subset)
+
+    page_ids = list(range(25))
+    for lang in ["en", "de"]:
+        recommender.pools[("wiki", lang)] = pool
+        slices = recommender.fetch_slices(lang, "wiki", page_ids, fetch)
+        assert slices == [page_ids[i : i + 3] for i in range(0, 25, 3)]
+    assert pool.num_open <= 4
+    assert pool.idle.qsize() == pool.num_open
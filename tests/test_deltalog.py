@@ -0,0 +1,79 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+"""
+Test reading and writing the revision table delta log.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the Python path
+# Use this line only if your want to test the script directly from the current path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from suggestbot.utilities.deltalog import (
+    append_deltas,
+    delta_log_path,
+    log_position,
+    read_deltas,
+)
+
+
+def test_append_and_read(tmp_path):
+    path = delta_log_path(str(tmp_path), "en")
+    assert log_position(path) == (None, 0)
+
+    # A log created after our last read is read from the start
+    entries = [
+        ("+", "Alice", "Foo", 1, 1, 1001),
+        ("+", "Bob", "Bar baz", 1, 0, 1002),
+        ("-", "Alice", "Qux", 3, 2, "2020-01-01 00:00:00"),
+    ]
+    append_deltas(path, entries)
+    (read, inode, offset) = read_deltas(path, None, 0)
+    assert read == [
+        ("+", "Alice", "Foo", 1, 1, "1001"),
+        ("+", "Bob", "Bar baz", 1, 0, "1002"),
+        ("-", "Alice", "Qux", 3, 2, "2020-01-01 00:00:00"),
+    ]
+    assert (inode, offset) == log_position(path)
+
+    # Nothing new, then only what was added since
+    assert read_deltas(path, inode, offset) == ([], inode, offset)
+    append_deltas(path, [("+", "Carol", "Foo", 1, 1, None)])
+    (read, inode, offset) = read_deltas(path, inode, offset)
+    assert read == [("+", "Carol", "Foo", 1, 1, None)]
+
+
+def test_partial_and_old_lines(tmp_path):
+    path = delta_log_path(str(tmp_path), "en")
+    (inode, offset) = log_position(path)
+    with open(path, "a", encoding="utf-8") as outfile:
+        # A line without a key, one that isn't valid, and one
+        # the daemon is still writing
+        outfile.write("+\tAlice\tFoo\t1\t1\n")
+        outfile.write("+\tbroken\n")
+        outfile.write("+\tBob\tBar")
+
+    (read, inode, offset) = read_deltas(path, inode, offset)
+    assert read == [("+", "Alice", "Foo", 1, 1, None)]
+
+    # The partial line is read once it's complete
+    with open(path, "a", encoding="utf-8") as outfile:
+        outfile.write("\t1\t0\t7\n")
+    (read, inode, offset) = read_deltas(path, inode, offset)
+    assert read == [("+", "Bob", "Bar", 1, 0, "7")]
+
+
+def test_rotation(tmp_path):
+    path = delta_log_path(str(tmp_path), "en")
+    append_deltas(path, [("+", "Alice", "Foo", 1, 1, 1)])
+    (inode, offset) = log_position(path)
+
+    append_deltas(path, [("+", "Bob", "Foo", 1, 1, 2)], max_bytes=1)
+    assert os.path.exists("{}.1".format(path))
+    assert read_deltas(path, inode, offset) is None
+
+    # A log that disappeared also means entries were lost
+    os.remove(path)
+    assert read_deltas(path, inode, offset) is None
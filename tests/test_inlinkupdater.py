@@ -0,0 +1,337 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+"""
+Test the inlink count table updater's page ID fetching, finding pages
+to update, and queuing, staging and resuming updates, using fake
+database connections that keep their tables in memory.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the Python path
+# Use this line only if your want to test the script directly from the current path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import re
+import copy
+import importlib.util
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+LINK_REC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "tool-labs", "link-rec"))
+sys.path.insert(0, LINK_REC_DIR)
+
+spec = importlib.util.spec_from_file_location("inlink_table_updater", os.path.join(LINK_REC_DIR, "inlink-table-updater.py"))
+updater = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(updater)
+
+
+class WikiFailure(Exception):
+    pass
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        (rows, self.rows) = (self.rows, [])
+        return rows
+
+    def close(self):
+        pass
+
+    def executemany(self, query, args):
+        for params in args:
+            self.execute(query, params)
+
+    def execute(self, query, params=None):
+        query = " ".join(query.split())
+        (self.rows, self.rowcount) = self.conn.run(query, params)
+
+
+class FakeConnection:
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self)
+
+    def close(self):
+        pass
+
+
+class ToolDatabase(FakeConnection):
+    """
+    The tables of the tool database that the updater works on, where
+    changes are only kept if they are committed.
+    """
+
+    def __init__(self, ilc, timestamp=None):
+        self.committed = {
+            "running": 0,
+            "timestamp": timestamp,
+            "ilc": {page_id: [num_links, 0] for (page_id, num_links) in ilc.items()},
+            "pending": set(),
+            "staging": {},
+        }
+        self.state = copy.deepcopy(self.committed)
+
+    def commit(self):
+        self.committed = copy.deepcopy(self.state)
+
+    def reopen(self):
+        """Lose uncommitted changes, as if the connection was lost."""
+        self.state = copy.deepcopy(self.committed)
+
+    def run(self, query, params):
+        state = self.state
+        if query.startswith("SELECT ilcu_update_running"):
+            return ([{"ilcu_update_running": state["running"]}], 1)
+        if query.startswith("UPDATE inlinkcount_updates SET ilcu_update_running="):
+            state["running"] = int(query.split("=")[1][0])
+            return ([], 1)
+        if query.startswith("SELECT ilcu_timestamp"):
+            return ([{"ilcu_timestamp": state["timestamp"]}], 1)
+        if query.startswith("UPDATE inlinkcount_updates SET ilcu_timestamp"):
+            state["timestamp"] = params["timestamp"]
+            return ([], 1)
+        if query.startswith("CREATE TABLE"):
+            return ([], 0)
+        if query.startswith("SELECT COUNT(*)"):
+            return ([(len(state["pending"]),)], 1)
+        if query.startswith("SELECT ilc_page_id FROM enwiki_inlinkcounts_pending"):
+            chunk = sorted(state["pending"])[: params["limit"]]
+            return ([(page_id,) for page_id in chunk], len(chunk))
+        if query.startswith("INSERT IGNORE INTO enwiki_inlinkcounts_pending"):
+            state["pending"].add(params)
+            return ([], 1)
+        if query.startswith("SELECT ilc_page_id FROM enwiki_inlinkcounts WHERE ilc_age"):
+            aged = [p for (p, (n, age)) in state["ilc"].items() if age >= params["age"]]
+            return ([(page_id,) for page_id in aged], len(aged))
+        if query.startswith("SELECT ilc_page_id FROM enwiki_inlinkcounts"):
+            return ([(page_id,) for page_id in state["ilc"]], len(state["ilc"]))
+        if query.startswith("DELETE FROM enwiki_inlinkcounts WHERE"):
+            deleted = [p for p in id_list(query) if p in state["ilc"]]
+            for page_id in deleted:
+                del state["ilc"][page_id]
+            return ([], len(deleted))
+        if query.startswith("INSERT INTO enwiki_inlinkcounts (ilc_page_id)"):
+            state["ilc"][params] = [None, 0]
+            return ([], 1)
+        if query.startswith("UPDATE enwiki_inlinkcounts SET ilc_age = ilc_age + 1"):
+            for counts in state["ilc"].values():
+                counts[1] += 1
+            return ([], len(state["ilc"]))
+        if query.startswith("INSERT INTO enwiki_inlinkcounts_staging"):
+            state["staging"][params[0]] = params[1]
+            return ([], 1)
+        if query.startswith("UPDATE enwiki_inlinkcounts AS ilc JOIN"):
+            for (page_id, num_links) in state["staging"].items():
+                state["ilc"][page_id] = [num_links, 0]
+            return ([], len(state["staging"]))
+        if query.startswith("DELETE FROM enwiki_inlinkcounts_staging"):
+            state["staging"] = {}
+            return ([], 0)
+        if query.startswith("DELETE FROM enwiki_inlinkcounts_pending"):
+            dequeued = {p for p in state["pending"] if params["first"] <= p <= params["last"]}
+            state["pending"] -= dequeued
+            return ([], len(dequeued))
+        if query.startswith("UPDATE enwiki_inlinkcounts SET ilc_numlinks=0"):
+            aged = [p for (p, (n, age)) in state["ilc"].items() if age >= params["age"]]
+            for page_id in aged:
+                state["ilc"][page_id] = [0, 0]
+            return ([], len(aged))
+        raise AssertionError("unexpected query: {}".format(query))
+
+
+class WikiDatabase(FakeConnection):
+    """
+    Pages, links, redirects and recent changes of a Wikipedia, failing
+    after a given number of queries.
+
+    :param num_links: inlink counts of the articles we update, by page ID
+    :param pages: whether the page is a redirect, by page ID
+    :param links: page IDs of the pages linked from a page, by page ID
+    :param redirects: page ID a redirect points to, by page ID
+    :param changes: timestamp of a page's most recent change, by page ID
+    """
+
+    def __init__(self, num_links=None, fail_after=None, pages=None, links=None, redirects=None, changes=None):
+        self.num_links = num_links or {}
+        self.fail_after = fail_after
+        self.pages = pages or {}
+        self.links = links or {}
+        self.redirects = redirects or {}
+        self.changes = changes or {}
+        self.num_queries = 0
+
+    def run(self, query, params):
+        self.num_queries += 1
+        if self.fail_after is not None and self.num_queries > self.fail_after:
+            raise WikiFailure
+        if query.startswith("SELECT page_id FROM page"):
+            articles = [(p,) for (p, is_redirect) in self.pages.items() if not is_redirect]
+            return (articles, len(articles))
+        if query.startswith("SELECT p.page_id AS pageid"):
+            changed = [
+                {"pageid": p, "timestamp": timestamp}
+                for (p, timestamp) in self.changes.items()
+                if timestamp.decode("utf-8") >= params["timestamp"]
+            ]
+            return (changed, len(changed))
+        if query.startswith("SELECT rc.rc_timestamp"):
+            return ([{"rc_timestamp": max(self.changes.values())}], 1)
+        if query.startswith("SELECT p.page_id, p.page_is_redirect FROM pagelinks"):
+            linked = {target for p in id_list(query) for target in self.links.get(p, [])}
+            rows = [{"page_id": p, "page_is_redirect": self.pages[p]} for p in linked]
+            return (rows, len(rows))
+        if query.startswith("SELECT p.page_id, p.page_is_redirect FROM redirect"):
+            targets = [self.redirects[p] for p in id_list(query) if p in self.redirects]
+            rows = [{"page_id": p, "page_is_redirect": self.pages[p]} for p in targets]
+            return (rows, len(rows))
+        rows = [{"ilc_page_id": p, "ilc_numlinks": self.num_links[p]} for p in id_list(query) if p in self.num_links]
+        return (rows, len(rows))
+
+
+class PageIdDatabase(FakeConnection):
+    def __init__(self, page_ids):
+        self.page_ids = page_ids
+        self.params = None
+
+    def run(self, query, params):
+        self.params = params
+        return ([(page_id, "other column") for page_id in self.page_ids], len(self.page_ids))
+
+
+def id_list(query):
+    return [int(p) for p in re.search(r"IN \(([\d,]+)\)", query).group(1).split(",")]
+
+
+def make_updater(tool_db, wiki_db, commit_size=10, slice_size=3):
+    ilc_updater = updater.InlinkTableUpdater("en", slice_size=slice_size, commit_size=commit_size)
+    ilc_updater.tool_db_conn = tool_db
+    ilc_updater.wiki_db_conn = wiki_db
+    return ilc_updater
+
+
+def test_fetch_page_ids():
+    page_ids = [7, 3, 4294967295, 3, 12, 0, 7]
+    db_conn = PageIdDatabase(page_ids)
+    found = updater.fetch_page_ids(db_conn, "SELECT page_id FROM page", {"ns": 0})
+    assert found.dtype == np.uintc
+    assert found.tolist() == sorted(set(page_ids))
+    assert db_conn.params == {"ns": 0}
+    assert len(updater.fetch_page_ids(PageIdDatabase([]), "SELECT page_id FROM page")) == 0
+
+
+def make_wiki():
+    """
+    Articles 1-30 and redirects 31-33, where 31 points to 10, and 32 is
+    a double redirect through 33.  Articles 2 and 3 changed after our
+    last update, article 4 before it.
+    """
+    pages = {page_id: 0 for page_id in range(1, 31)}
+    pages.update({31: 1, 32: 1, 33: 1})
+    return WikiDatabase(
+        pages=pages,
+        links={2: [7, 31, 26], 3: [8, 32, 3], 4: [9]},
+        redirects={31: 10, 32: 33, 33: 12},
+        changes={2: b"20160102000000", 3: b"20160103000000", 4: b"20151231000000"},
+    )
+
+
+def test_find_pages_to_update():
+    # The table is missing articles 26-30, and has pages 40 and 41 that
+    # were deleted, articles 5 and 6 are about to reach the maximum age
+    tool_db = ToolDatabase({page_id: 10 for page_id in list(range(1, 26)) + [40, 41]}, timestamp=datetime(2016, 1, 1))
+    tool_db.state["ilc"][5][1] = 6
+    tool_db.state["ilc"][6][1] = 7
+    tool_db.state["ilc"][40][1] = 9
+    tool_db.commit()
+    ilc_updater = make_updater(tool_db, make_wiki())
+
+    (pages_to_update, new_update_time) = ilc_updater.find_pages_to_update()
+    assert pages_to_update.tolist() == [3, 5, 6, 7, 8, 10, 26, 27, 28, 29, 30]
+    assert new_update_time == datetime(2016, 1, 3)
+    assert sorted(tool_db.committed["ilc"]) == list(range(1, 31))
+
+    ilc_updater.queue_pages(pages_to_update, new_update_time)
+    assert tool_db.committed["pending"] == set(pages_to_update.tolist())
+    assert tool_db.committed["timestamp"] == new_update_time
+    assert tool_db.committed["ilc"][26][1] == 1
+
+    # Without a previous update only new and aged articles are updated
+    tool_db = ToolDatabase({page_id: 10 for page_id in range(1, 28)})
+    tool_db.state["ilc"][5][1] = 6
+    tool_db.commit()
+    ilc_updater = make_updater(tool_db, make_wiki())
+    (pages_to_update, new_update_time) = ilc_updater.find_pages_to_update()
+    assert pages_to_update.tolist() == [5, 28, 29, 30]
+    assert new_update_time == datetime(2016, 1, 3)
+
+
+def test_update_and_resume():
+    num_links = {page_id: page_id * 2 + 1 for page_id in range(100, 145)}
+    tool_db = ToolDatabase({page_id: 0 for page_id in range(100, 150)})
+    pages = np.arange(100, 145, dtype=np.uintc)
+
+    # The update dies while fetching the inlink counts of its fourth chunk,
+    # with leftovers from an earlier run in the staging table
+    ilc_updater = make_updater(tool_db, WikiDatabase(num_links, fail_after=13))
+    ilc_updater.setUpdateStatus()
+    tool_db.state["pending"] = set(pages.tolist())
+    tool_db.state["staging"] = {100: 12345}
+    tool_db.commit()
+    with pytest.raises(WikiFailure):
+        ilc_updater.update_pending_pages()
+    tool_db.reopen()
+
+    # Only whole chunks were applied and dequeued, and nothing was left staged
+    assert tool_db.state["pending"] == set(range(130, 145))
+    assert tool_db.state["staging"] == {}
+    for page_id in range(100, 130):
+        assert tool_db.state["ilc"][page_id][0] == num_links[page_id]
+    assert tool_db.state["ilc"][130][0] == 0
+
+    # The next run finds the status set, but resumes from the queue
+    # instead of looking for pages to update
+    ilc_updater = make_updater(tool_db, WikiDatabase(num_links))
+    ilc_updater.find_pages_to_update = None
+    ilc_updater.setUpdateStatus()
+    ilc_updater.updateInlinkTable()
+    ilc_updater.clearUpdateStatus()
+
+    assert tool_db.committed["running"] == 0
+    assert tool_db.committed["pending"] == set()
+    for (page_id, (count, age)) in tool_db.committed["ilc"].items():
+        assert count == num_links.get(page_id, 0)
+        assert age == 0
+
+
+def test_update_running():
+    tool_db = ToolDatabase({})
+    tool_db.state["running"] = 1
+    tool_db.commit()
+    ilc_updater = make_updater(tool_db, WikiDatabase({}))
+    with pytest.raises(updater.UpdateRunningError):
+        ilc_updater.setUpdateStatus()
+
+    # Unless asked to resume
+    ilc_updater.setUpdateStatus(resume=True)
+    assert tool_db.committed["running"] == 1
@@ -0,0 +1,112 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+"""
+Test the item-item co-edit similarities against a brute-force
+calculation, using synthetic edit histories.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the Python path
+# Use this line only if your want to test the script directly from the current path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import math
+import random
+
+import numpy as np
+
+from suggestbot import config
+from suggestbot.recommenders.coeditindex import CoeditIndex
+from suggestbot.recommenders.itemsimilarity import SimilarityBuilder
+
+
+def build_index(seed, n_users=50, n_articles=80, n=2000):
+    rng = random.Random(seed)
+    totals = {}
+    for _ in range(n):
+        user = "User {}".format(rng.randrange(n_users))
+        title = "Article {}".format(rng.randrange(rng.randint(3, n_articles)))
+        counts = totals.setdefault((user, title), [0, 0])
+        counts[0] += 1
+        counts[1] += int(rng.random() < 0.6)
+
+    index = CoeditIndex("en")
+    columns = ([], [], [], [])
+    for ((user, title), (num_edits, num_major)) in totals.items():
+        columns[0].append(index.users.intern(user))
+        columns[1].append(index.articles.intern(title))
+        columns[2].append(num_edits)
+        columns[3].append(num_major)
+    index.build(*[np.array(column, dtype=np.int32) for column in columns])
+    return index
+
+
+def brute_force(index, min_coeditors, max_user_articles=0):
+    """
+    Cosine similarity and number of shared editors of every pair of
+    articles, keyed by article ID, then neighbour ID.
+    """
+    sets = index.effective_sets(config.coedit_filter_threshold)
+    editors = {}
+    for user_id in range(sets.shape[0]):
+        articles = sets.indices[sets.indptr[user_id] : sets.indptr[user_id + 1]].tolist()
+        if max_user_articles and len(articles) > max_user_articles:
+            continue
+        for article_id in articles:
+            editors.setdefault(article_id, set()).add(user_id)
+
+    similar = {}
+    for (a, a_editors) in editors.items():
+        for (b, b_editors) in editors.items():
+            shared = len(a_editors & b_editors)
+            if a != b and shared >= min_coeditors:
+                similar.setdefault(a, {})[b] = (shared / math.sqrt(len(a_editors) * len(b_editors)), shared)
+    return similar
+
+
+def collect(builder, index):
+    found = {}
+    for (sources, targets, scores, counts) in builder.similarities(index):
+        for (a, b, score, count) in zip(sources.tolist(), targets.tolist(), scores.tolist(), counts.tolist()):
+            assert b not in found.get(a, {})
+            found.setdefault(a, {})[b] = (score, count)
+    return found
+
+
+def assert_same(found, expected):
+    assert set(found) == set(expected)
+    for a in expected:
+        assert set(found[a]) == set(expected[a])
+        for b in expected[a]:
+            assert abs(found[a][b][0] - expected[a][b][0]) < 1e-12
+            assert found[a][b][1] == expected[a][b][1]
+
+
+def test_similarities():
+    index = build_index(1)
+    builder = SimilarityBuilder("en", k=1000, min_coeditors=2, chunk_size=7)
+    assert_same(collect(builder, index), brute_force(index, 2))
+
+    # Prolific users are left out
+    builder = SimilarityBuilder("en", k=1000, min_coeditors=1, max_user_articles=10, chunk_size=7)
+    assert_same(collect(builder, index), brute_force(index, 1, max_user_articles=10))
+
+
+def test_top_k():
+    index = build_index(2)
+    expected = brute_force(index, 2)
+    builder = SimilarityBuilder("en", k=5, min_coeditors=2, chunk_size=13)
+    found = collect(builder, index)
+    assert set(found) == set(expected)
+    for a in expected:
+        best = sorted((score for (score, count) in expected[a].values()), reverse=True)[:5]
+        assert np.allclose(sorted((score for (score, count) in found[a].values()), reverse=True), best)
+
+
+def test_workers():
+    index = build_index(3)
+    single = collect(SimilarityBuilder("en", k=1000, chunk_size=11), index)
+    parallel = collect(SimilarityBuilder("en", k=1000, chunk_size=11, workers=2), index)
+    assert_same(parallel, single)
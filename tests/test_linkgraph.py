@@ -0,0 +1,134 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+"""
+Test the in-memory link graph and its personalized PageRank against
+a dense power iteration, using synthetic graphs.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the Python path
+# Use this line only if your want to test the script directly from the current path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+
+from suggestbot.recommenders.linkgraph import LinkGraph
+
+
+def make_graph(seed, n=80, n_links=400):
+    """
+    A random graph with non-contiguous page IDs, duplicate links,
+    links to pages that are not articles, and some articles
+    without outgoing links.
+    """
+    rng = np.random.RandomState(seed)
+    page_ids = np.arange(n) * 3 + 10
+    sources = rng.choice(page_ids[: n - 10], size=n_links)
+    targets = rng.choice(page_ids, size=n_links)
+    sources = np.concatenate([sources, sources[:20], [page_ids[0], 5]])
+    targets = np.concatenate([targets, targets[:20], [11, page_ids[1]]])
+
+    graph = LinkGraph("en")
+    graph.build(
+        page_ids,
+        ["Page_{}".format(i) for i in range(n)],
+        sources,
+        targets,
+        redirect_titles=["Redirect_to_2", "Redirect_to_nowhere"],
+        redirect_pages=[page_ids[2], 11],
+    )
+    expected = {}
+    for (source, target) in zip(sources.tolist(), targets.tolist()):
+        if source in page_ids and target in page_ids:
+            expected.setdefault((source - 10) // 3, set()).add((target - 10) // 3)
+    return (graph, expected)
+
+
+def test_build_and_links():
+    (graph, expected) = make_graph(1)
+    assert len(graph) == 80
+    for article_id in range(len(graph)):
+        links = graph.links([article_id])
+        assert sorted(links.tolist()) == sorted(expected.get(article_id, set()))
+
+    # Links of several articles are concatenated
+    links = graph.links([0, 3, 75])
+    assert len(links) == sum(len(expected.get(i, ())) for i in [0, 3, 75])
+    assert len(graph.links([75, 79])) == 0
+
+    in_degree = np.zeros(len(graph), dtype=int)
+    for targets in expected.values():
+        for target in targets:
+            in_degree[target] += 1
+    assert np.array_equal(graph.in_degree, in_degree)
+
+
+def test_resolve():
+    (graph, _) = make_graph(2)
+    assert graph.resolve("Page_7") == 7
+    assert graph.resolve("Page 7") == 7
+    assert graph.resolve("Redirect to 2") == 2
+    assert graph.resolve("Redirect_to_nowhere") is None
+    assert graph.resolve("Not a page") is None
+    (dense_ids, valid) = graph.dense_ids([10, 13, 11, 100000])
+    assert valid.tolist() == [True, True, False, False]
+    assert dense_ids[:2].tolist() == [0, 1]
+
+
+def reference_pagerank(graph, seeds, damping, n_iter=500):
+    """
+    Personalized PageRank by dense power iteration, where articles
+    without links send their walkers back to the seeds.
+    """
+    n = len(graph)
+    restart = np.zeros(n)
+    restart[seeds] = 1.0 / len(seeds)
+    scores = restart.copy()
+    for _ in range(n_iter):
+        spread = np.zeros(n)
+        dangling = 0.0
+        for article_id in range(n):
+            links = graph.links([article_id])
+            if len(links):
+                spread[links] += scores[article_id] / len(links)
+            else:
+                dangling += scores[article_id]
+        scores = damping * spread + (1 - damping + damping * dangling) * restart
+    return scores
+
+
+def test_personalized_pagerank():
+    (graph, _) = make_graph(3)
+    for seeds in [[0], [4, 9, 9, 20], [79]]:
+        expected = reference_pagerank(graph, np.unique(seeds), 0.85)
+        (ids, scores) = graph.personalized_pagerank(
+            seeds, max_iter=500, tol=1e-12, min_score=0
+        )
+        assert list(ids) == sorted(ids)
+        found = np.zeros(len(graph))
+        found[ids] = scores
+        assert np.allclose(found, expected, atol=1e-9)
+        assert abs(scores.sum() - 1) < 1e-9
+
+    # Dropping low scores keeps the walk near the seeds
+    (ids, scores) = graph.personalized_pagerank([0], max_iter=500, tol=1e-12, min_score=0.01)
+    assert (scores >= 0.01).all()
+    (ids, scores) = graph.personalized_pagerank([])
+    assert len(ids) == 0
+
+
+def test_snapshot_round_trip(tmp_path):
+    (graph, _) = make_graph(4)
+    path = str(tmp_path / "enwiki-links.snapshot")
+    graph.save_snapshot(path)
+
+    mapped = LinkGraph("en")
+    assert mapped.load_snapshot(path)
+    assert np.array_equal(mapped.page_ids, graph.page_ids)
+    assert mapped.resolve("Redirect to 2") == 2
+    for article_id in range(len(graph)):
+        assert np.array_equal(mapped.links([article_id]), graph.links([article_id]))
+
+    assert not LinkGraph("de").load_snapshot(path)
@@ -0,0 +1,102 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+"""
+Test MinHash signatures and LSH banding, using synthetic edit histories.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the Python path
+# Use this line only if your want to test the script directly from the current path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from suggestbot.recommenders.coeditindex import CoeditIndex
+from suggestbot.recommenders.minhash import MERSENNE_PRIME, MinHashIndex
+
+EXP_THRESHOLD = 18
+
+
+def build_index(edits):
+    """
+    A co-edit index from (user, title, number of edits,
+    number of major edits) tuples.
+    """
+    index = CoeditIndex("en")
+    columns = ([], [], [], [])
+    for (user, title, num_edits, num_major) in edits:
+        columns[0].append(index.users.intern(user))
+        columns[1].append(index.articles.intern(title))
+        columns[2].append(num_edits)
+        columns[3].append(num_major)
+    index.build(*[np.array(column, dtype=np.int32) for column in columns])
+    return index
+
+
+def test_bands_must_divide():
+    with pytest.raises(ValueError):
+        MinHashIndex(num_perm=64, bands=10)
+
+
+def test_signatures():
+    minhash = MinHashIndex(num_perm=64, bands=32)
+    sets = sp.csr_matrix(
+        np.array(
+            [
+                [1, 1, 0, 1, 0],
+                [0, 0, 0, 0, 0],
+                [1, 1, 0, 1, 0],
+                [0, 0, 1, 0, 1],
+            ]
+        )
+    )
+    sigs = minhash.signatures(sets)
+    assert sigs.shape == (4, 64)
+
+    # Each signature value is the minimum hash of the set's members
+    hashes = (np.outer(np.arange(5, dtype=np.uint64), minhash.hash_a) + minhash.hash_b) % np.uint64(
+        MERSENNE_PRIME
+    )
+    assert np.array_equal(sigs[0], hashes[[0, 1, 3]].min(axis=0))
+    assert np.array_equal(sigs[0], sigs[2])
+    assert np.array_equal(sigs[3], hashes[[2, 4]].min(axis=0))
+    assert (sigs[1] == MERSENNE_PRIME).all()
+
+
+def test_query():
+    rng = np.random.RandomState(1)
+    edits = []
+    for user in range(200):
+        articles = rng.choice(1000, size=rng.randint(1, 40), replace=False)
+        for article in articles.tolist():
+            num_edits = int(rng.randint(1, 5))
+            edits.append(("User {}".format(user), "Article {}".format(article), num_edits, num_edits))
+    # A user with only minor edits, whom we compare on nothing
+    # once they are experienced
+    edits.append(("Minor editor", "Article 1", EXP_THRESHOLD, 0))
+    coedit_index = build_index(edits)
+
+    minhash = MinHashIndex(num_perm=64, bands=32)
+    minhash.build(coedit_index, EXP_THRESHOLD)
+    assert minhash.exp_threshold == EXP_THRESHOLD
+    assert len(minhash.band_keys) == 32
+    assert coedit_index.users.get("Minor editor") not in minhash.band_users[0]
+
+    # A user's own set collides in every band, so they come first
+    sets = coedit_index.effective_sets(EXP_THRESHOLD)
+    for user_id in [0, 17, 150]:
+        article_ids = sets[user_id].indices
+        candidates = minhash.query(article_ids, 10)
+        assert 0 < len(candidates) <= 10
+        assert candidates[0] == user_id
+
+    # A set sharing most articles with a user finds them
+    article_ids = sets[42].indices
+    candidates = minhash.query(article_ids[: max(1, len(article_ids) - 1)], 50)
+    assert 42 in candidates
+
+    assert len(minhash.query(np.array([], dtype=np.int32), 10)) == 0
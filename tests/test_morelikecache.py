@@ -0,0 +1,86 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+"""
+Test the disk-backed cache of morelike search results.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the Python path
+# Use this line only if your want to test the script directly from the current path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from suggestbot.recommenders import morelikecache
+from suggestbot.recommenders.morelikecache import MorelikeCache
+
+RESULTS = ["Result {}".format(i) for i in range(100)]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+
+def make_cache(tmp_path, monkeypatch, name="morelike.sqlite", **kwargs):
+    clock = Clock()
+    monkeypatch.setattr(morelikecache.time, "time", clock.time)
+    return (MorelikeCache(str(tmp_path / name), **kwargs), clock)
+
+
+def test_get_and_put(tmp_path, monkeypatch):
+    (cache, clock) = make_cache(tmp_path, monkeypatch, ttl=100)
+    assert cache.get("en", "Article", 50) is None
+    cache.put("en", "Article", 50, RESULTS[:50], revision=12)
+
+    assert cache.get("en", "Article", 50) == RESULTS[:50]
+    assert cache.get("en", "Article", 20, revision=12) == RESULTS[:20]
+    assert cache.get("de", "Article", 50) is None
+
+    # Results fetched with a lower limit can't stand in for more
+    assert cache.get("en", "Article", 100) is None
+
+    # Nor can results for an earlier revision
+    assert cache.get("en", "Article", 50, revision=13) is None
+
+    # Results are replaced, and those without a known revision always match
+    cache.put("en", "Article", 100, RESULTS)
+    assert cache.get("en", "Article", 100, revision=13) == RESULTS
+
+    # ...until they expire
+    clock.now += 101
+    assert cache.get("en", "Article", 50) is None
+
+    assert cache.stats() == {"hits": 3, "misses": 5, "hit_rate": 3 / 8}
+
+
+def test_shared_between_processes(tmp_path, monkeypatch):
+    (cache, clock) = make_cache(tmp_path, monkeypatch)
+    cache.put("en", "Article", 50, RESULTS[:50])
+    other = MorelikeCache(cache.path)
+    assert other.get("en", "Article", 50) == RESULTS[:50]
+
+
+def test_trim(tmp_path, monkeypatch):
+    (cache, clock) = make_cache(tmp_path, monkeypatch, max_entries=5)
+    for i in range(8):
+        clock.now += 1
+        cache.put("en", "Article {}".format(i), 10, RESULTS[:10])
+
+    # Using an entry keeps it around
+    clock.now += 1
+    assert cache.get("en", "Article 1", 10) is not None
+
+    cache.trim()
+    kept = [i for i in range(8) if cache.get("en", "Article {}".format(i), 10) is not None]
+    assert kept == [1, 4, 5, 6, 7]
+
+    # No limit
+    (cache, clock) = make_cache(tmp_path, monkeypatch, name="unlimited.sqlite", max_entries=0)
+    for i in range(8):
+        cache.put("en", "Article {}".format(i), 10, RESULTS[:10])
+    cache.trim()
+    assert all(cache.get("en", "Article {}".format(i), 10) for i in range(8))
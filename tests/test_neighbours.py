@@ -0,0 +1,166 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+"""
+Test the set-based neighbour queries against the in-memory co-edit index,
+running them on a synthetic revision table in SQLite.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the Python path
+# Use this line only if your want to test the script directly from the current path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import random
+
+import numpy as np
+
+from suggestbot import config
+from suggestbot.recommenders.coeditindex import CoeditIndex
+from suggestbot.recommenders.neighbours import (
+    NeighbourFinder,
+    editor_hash,
+    hub_cutoff,
+    hub_weight,
+)
+
+from revisiondb import Cursor, connect, create_revision_table
+
+USERS = ["User {}".format(i) for i in range(60)]
+ARTICLES = ["Article {}".format(i) for i in range(200)]
+EXP_THRESHOLD = 18
+ASSOC_THRESHOLD = 0.0001
+
+
+def make_revisions(seed, n=3000):
+    rng = random.Random(seed)
+    return [
+        (rng.choice(USERS), rng.choice(ARTICLES[: rng.randint(5, len(ARTICLES))]), rng.random() < 0.6)
+        for _ in range(n)
+    ]
+
+
+def make_finder(revisions, slice_size=7):
+    db_conn = connect()
+    create_revision_table(db_conn, config.revision_table["en"], revisions)
+    return NeighbourFinder(Cursor(db_conn), "en", slice_size=slice_size)
+
+
+def build_index(revisions):
+    index = CoeditIndex("en")
+    totals = {}
+    for (user, title, major) in revisions:
+        counts = totals.setdefault((user, title), [0, 0])
+        counts[0] += 1
+        counts[1] += major
+    columns = ([], [], [], [])
+    for ((user, title), (num_edits, num_major)) in totals.items():
+        columns[0].append(index.users.intern(user))
+        columns[1].append(index.articles.intern(title))
+        columns[2].append(num_edits)
+        columns[3].append(num_major)
+    index.build(*[np.array(column, dtype=np.int32) for column in columns])
+    return index
+
+
+def test_queries():
+    revisions = make_revisions(1, n=500)
+    finder = make_finder(revisions)
+    basket = ARTICLES[:10] + ["Not an article"]
+
+    shared = finder.shared_articles(basket)
+    for (user, (num_shared, num_major_shared)) in shared.items():
+        assert num_shared == len({t for (u, t, m) in revisions if u == user and t in basket})
+        assert num_major_shared == len({t for (u, t, m) in revisions if u == user and m and t in basket})
+    assert set(shared) == {u for (u, t, m) in revisions if t in basket}
+    assert finder.shared_articles([]) == {}
+
+    # Limited to some users, asked about a slice at a time
+    some_users = USERS[:20] + ["Not a user"]
+    assert finder.shared_articles(basket, users=some_users) == {
+        user: counts for (user, counts) in shared.items() if user in some_users
+    }
+
+    stats = finder.user_stats(USERS + ["Not a user"])
+    for (user, user_stats) in stats.items():
+        assert user_stats.num_edits == sum(1 for r in revisions if r[0] == user)
+        assert user_stats.num_articles == len({t for (u, t, m) in revisions if u == user})
+        assert user_stats.num_major_articles == len({t for (u, t, m) in revisions if u == user and m})
+    assert "Not a user" not in stats
+
+    editors = finder.article_editors(ARTICLES[:30])
+    for (title, num_editors) in editors.items():
+        assert num_editors == len({u for (u, t, m) in revisions if t == title})
+
+    edits = sorted(finder.articles_by_users(USERS[:9]))
+    assert edits == sorted((u, t) for (u, t, m) in revisions if u in USERS[:9])
+
+
+def test_find():
+    revisions = make_revisions(2)
+    finder = make_finder(revisions)
+    index = build_index(revisions)
+
+    for username in ["User 0", "User 5", "Not a user"]:
+        basket = ARTICLES[:15] + ["Not an article"]
+        found = finder.find(username, basket, EXP_THRESHOLD, ASSOC_THRESHOLD)
+        (nhood, assoc) = index.neighbours(username, basket, EXP_THRESHOLD, ASSOC_THRESHOLD, k=len(USERS))
+        expected = {index.users[user_id]: a for (user_id, a) in zip(nhood, assoc)}
+
+        assert set(found) == set(expected)
+        assert username not in found
+        for (user, (a, num_shared)) in found.items():
+            assert abs(a - expected[user]) < 1e-12
+            assert num_shared > 0
+
+
+def test_hub_sampling():
+    assert hub_cutoff(10, 10) == 1 << 32
+    assert hub_cutoff(40, 10) == 1 << 30
+    assert hub_weight(5, 10) == 1.0
+    assert hub_weight(10, 10) == 1.0
+    assert 0 < hub_weight(1000, 10) < hub_weight(100, 10) < 1.0
+
+    revisions = make_revisions(3)
+    finder = make_finder(revisions)
+    hubs = finder.hub_articles(ARTICLES[:20], 10)
+    assert hubs
+    assert finder.hub_articles(ARTICLES[:20], 0) == {}
+    for (title, num_editors) in hubs.items():
+        editors = {u for (u, t, m) in revisions if t == title}
+        assert num_editors == len(editors) > 10
+
+        # The database's hash picks the same editors as ours
+        sample = dict(finder.sampled_editors(title, num_editors, 10))
+        cutoff = hub_cutoff(num_editors, 10)
+        assert set(sample) == {user for user in editors if editor_hash(user) < cutoff}
+        for (user, made_major) in sample.items():
+            assert made_major == any(u == user and t == title and m for (u, t, m) in revisions)
+
+
+def test_find_with_hubs():
+    revisions = make_revisions(4)
+    finder = make_finder(revisions)
+    index = build_index(revisions)
+    basket = ARTICLES[:15]
+
+    for hub_idf in [False, True]:
+        found = finder.find("User 0", basket, EXP_THRESHOLD, ASSOC_THRESHOLD, max_editors=10, hub_idf=hub_idf)
+        (nhood, assoc) = index.neighbours(
+            "User 0",
+            basket,
+            EXP_THRESHOLD,
+            ASSOC_THRESHOLD,
+            k=len(USERS),
+            max_editors=10,
+            hub_idf=hub_idf,
+        )
+        expected = {index.users[user_id]: a for (user_id, a) in zip(nhood, assoc)}
+        assert set(found) == set(expected)
+        for (user, (a, num_shared)) in found.items():
+            assert abs(a - expected[user]) < 1e-12
+
+    # Sampling only ever leaves out neighbours
+    unsampled = finder.find("User 0", basket, EXP_THRESHOLD, ASSOC_THRESHOLD)
+    assert set(found) < set(unsampled)
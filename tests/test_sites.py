@@ -0,0 +1,105 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+"""
+Test the per-process pool of Pywikibot sites and the shared HTTP session,
+using fake sites.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the Python path
+# Use this line only if your want to test the script directly from the current path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import threading
+
+from suggestbot import config
+from suggestbot.utilities import sites
+
+
+class FakeTokens:
+    def __init__(self):
+        self.num_clears = 0
+
+    def clear(self):
+        self.num_clears += 1
+
+
+class FakeSite:
+    def __init__(self, lang):
+        self.lang = lang
+        self.tokens = FakeTokens()
+        self.num_logins = 0
+
+    def login(self):
+        self.num_logins += 1
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+
+def fake_sites(monkeypatch):
+    clock = Clock()
+    created = []
+
+    def make_site(lang):
+        created.append(FakeSite(lang))
+        return created[-1]
+
+    monkeypatch.setattr(sites, "_sites", {})
+    monkeypatch.setattr(sites, "_session", None)
+    monkeypatch.setattr(sites.pywikibot, "Site", make_site)
+    monkeypatch.setattr(sites.time, "time", clock.time)
+    monkeypatch.setattr(config, "site_token_max_age", 3600)
+    return (clock, created)
+
+
+def test_get_site(monkeypatch):
+    (clock, created) = fake_sites(monkeypatch)
+
+    site = sites.get_site("en")
+    assert site.num_logins == 0
+    assert sites.get_site("en", login=True) is site
+    assert sites.get_site("en", login=True) is site
+    assert site.num_logins == 1
+    assert sites.get_site("de") is not site
+    assert [s.lang for s in created] == ["en", "de"]
+
+    # Tokens are cleared once they're too old, but we stay logged in
+    clock.now += 3000
+    sites.get_site("en", login=True)
+    assert site.tokens.num_clears == 0
+    clock.now += 1000
+    sites.get_site("en", login=True)
+    sites.get_site("en")
+    assert site.tokens.num_clears == 1
+    assert site.num_logins == 1
+
+
+def test_threads(monkeypatch):
+    (clock, created) = fake_sites(monkeypatch)
+    found = []
+
+    def get():
+        found.append(sites.get_site("en", login=True))
+
+    threads = [threading.Thread(target=get) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+    assert all(site is created[0] for site in found)
+    assert created[0].num_logins == 1
+
+
+def test_get_session(monkeypatch):
+    fake_sites(monkeypatch)
+    session = sites.get_session()
+    assert sites.get_session() is session
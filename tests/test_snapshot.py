@@ -0,0 +1,92 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+"""
+Test snapshot files and the string tables stored in them.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the Python path
+# Use this line only if your want to test the script directly from the current path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import pytest
+
+from suggestbot.utilities.snapshot import (
+    ALIGNMENT,
+    SnapshotError,
+    StringTable,
+    read_snapshot,
+    string_table_arrays,
+    write_snapshot,
+)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "test.snapshot")
+    arrays = {
+        "bytes": np.arange(7, dtype=np.uint8),
+        "ints": np.arange(1000, dtype=np.int32) * 3,
+        "floats": np.linspace(0, 1, 33),
+        "matrix": np.arange(12, dtype=np.int64).reshape(3, 4),
+        "empty": np.zeros(0, dtype=np.float32),
+    }
+    meta = {"lang": "en", "version": 3}
+    write_snapshot(path, arrays, meta=meta)
+
+    (read_meta, read_arrays) = read_snapshot(path)
+    assert read_meta == meta
+    assert set(read_arrays) == set(arrays)
+    for (name, array) in arrays.items():
+        assert read_arrays[name].dtype == array.dtype
+        assert read_arrays[name].shape == array.shape
+        assert np.array_equal(read_arrays[name], array)
+        if len(array):
+            # Every array is aligned in memory, and read-only
+            assert read_arrays[name].ctypes.data % ALIGNMENT == 0
+            assert not read_arrays[name].flags.writeable
+
+    # No temporary files are left behind
+    assert os.listdir(str(tmp_path)) == ["test.snapshot"]
+
+
+def test_only_empty_arrays(tmp_path):
+    path = str(tmp_path / "empty.snapshot")
+    write_snapshot(path, {"empty": np.zeros(0, dtype=np.int32)})
+    (meta, arrays) = read_snapshot(path)
+    assert meta == {}
+    assert len(arrays["empty"]) == 0
+
+
+def test_not_a_snapshot(tmp_path):
+    path = str(tmp_path / "other.snapshot")
+    with open(path, "wb") as outfile:
+        outfile.write(b"not a snapshot at all")
+    with pytest.raises(SnapshotError):
+        read_snapshot(path)
+
+
+def test_string_table(tmp_path):
+    strings = ["Zebra", "apple", "Äpfel", "a", "", "東京", "apple pie"]
+    arrays = string_table_arrays(strings)
+    table = StringTable(arrays["blob"], arrays["offsets"], arrays["order"])
+
+    assert len(table) == len(strings)
+    assert list(table) == strings
+    for (string_id, string) in enumerate(strings):
+        assert table[string_id] == string
+        assert table.get(string) == string_id
+        assert string in table
+    assert table.get("missing") is None
+    assert table.get("missing", -1) == -1
+    assert "appl" not in table
+
+    # Same lookups after a round trip through a snapshot
+    path = str(tmp_path / "strings.snapshot")
+    write_snapshot(path, arrays)
+    (_, read_arrays) = read_snapshot(path)
+    table = StringTable(read_arrays["blob"], read_arrays["offsets"], read_arrays["order"])
+    assert list(table) == strings
+    assert table.get("東京") == 5
@@ -0,0 +1,187 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+"""
+Test the local text index's TF-IDF vectors and morelike search
+against a brute-force implementation, using synthetic articles.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the Python path
+# Use this line only if your want to test the script directly from the current path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import math
+import random
+
+import numpy as np
+
+from suggestbot.recommenders.textindex import TOKEN_RE, TextIndex, feature
+
+N_FEATURES = 2**16
+
+
+def make_articles(seed, n=200):
+    """
+    Titles and texts of random articles, each drawing most of its words
+    from one of a few topics so that some articles are similar.
+    """
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = ["".join(rng.choice(letters) for _ in range(rng.randint(2, 8))) for _ in range(600)]
+    topics = [words[i * 100 : (i + 1) * 100] for i in range(5)]
+
+    titles = []
+    texts = []
+    for i in range(n):
+        topic = topics[i % len(topics)]
+        text = [rng.choice(topic if rng.random() < 0.8 else words) for _ in range(rng.randint(0, 120))]
+        # Numbers and single letters are not terms
+        text.append("{} x 42".format(rng.choice(words).upper()))
+        titles.append("Article {}".format(i))
+        texts.append(" ".join(text))
+    return (titles, texts)
+
+
+def build_index(titles, texts):
+    index = TextIndex("en", n_features=N_FEATURES)
+    index.build(
+        iter(texts),
+        titles,
+        redirect_titles=["Redirect to 3", "Redirect to nowhere"],
+        redirect_targets=["Article 3", "Not an article"],
+    )
+    return index
+
+
+def reference_vectors(texts):
+    """
+    Unit length TF-IDF vectors of the texts as dictionaries, with
+    sublinear term frequency and smoothed inverse document frequency.
+    """
+    counts = []
+    for text in texts:
+        doc = {}
+        for term in TOKEN_RE.findall(text.lower()):
+            f = feature(term, N_FEATURES)
+            doc[f] = doc.get(f, 0) + 1
+        counts.append(doc)
+
+    doc_freq = {}
+    for doc in counts:
+        for f in doc:
+            doc_freq[f] = doc_freq.get(f, 0) + 1
+    idf = {f: math.log((1 + len(texts)) / (1 + df)) + 1 for (f, df) in doc_freq.items()}
+
+    vectors = []
+    for doc in counts:
+        vector = {f: (1 + math.log(tf)) * idf[f] for (f, tf) in doc.items()}
+        norm = math.sqrt(sum(w**2 for w in vector.values()))
+        vectors.append({f: w / norm for (f, w) in vector.items()})
+    return vectors
+
+
+def test_vectors():
+    (titles, texts) = make_articles(1)
+    index = build_index(titles, texts)
+    assert len(index) == len(titles)
+
+    for (article_id, vector) in enumerate(reference_vectors(texts)):
+        start = index.article_offsets[article_id]
+        end = index.article_offsets[article_id + 1]
+        found = dict(zip(index.features[start:end].tolist(), index.article_weights[start:end].tolist()))
+        assert set(found) == set(vector)
+        for f in vector:
+            assert abs(found[f] - vector[f]) < 1e-5
+
+    # The column arrays hold the same matrix
+    for f in np.unique(index.features)[:50].tolist():
+        start = index.feature_offsets[f]
+        end = index.feature_offsets[f + 1]
+        for (article_id, weight) in zip(index.articles[start:end], index.feature_weights[start:end]):
+            row = slice(index.article_offsets[article_id], index.article_offsets[article_id + 1])
+            assert weight == index.article_weights[row][index.features[row] == f][0]
+
+
+def test_resolve():
+    (titles, texts) = make_articles(2, n=10)
+    index = build_index(titles, texts)
+    assert index.resolve("Article 5") == 5
+    assert index.resolve("Article_5") == 5
+    assert index.resolve("Redirect to 3") == 3
+    assert index.resolve("Redirect_to_nowhere") is None
+    assert index.resolve("Not an article") is None
+    assert index.morelike("Not an article") is None
+
+
+def brute_force_scores(index, article_id, max_query_terms):
+    """
+    Cosine similarity of every article to the query made of the article's
+    `max_query_terms` highest weighted terms, and the articles that share
+    at least one term with the query.
+    """
+    start = index.article_offsets[article_id]
+    end = index.article_offsets[article_id + 1]
+    order = np.argsort(-index.article_weights[start:end], kind="stable")[:max_query_terms]
+    query = dict(
+        zip(index.features[start:end][order].tolist(), index.article_weights[start:end][order].tolist())
+    )
+
+    scores = np.zeros(len(index))
+    matches = np.zeros(len(index), dtype=bool)
+    for other in range(len(index)):
+        row = slice(index.article_offsets[other], index.article_offsets[other + 1])
+        for (f, w) in zip(index.features[row].tolist(), index.article_weights[row].tolist()):
+            if f in query:
+                scores[other] += w * query[f]
+                matches[other] = True
+    matches[article_id] = False
+    return (scores, matches)
+
+
+def test_morelike():
+    (titles, texts) = make_articles(3)
+    index = build_index(titles, texts)
+
+    for article_id in [0, 1, 17, 42, 199]:
+        for (limit, max_query_terms) in [(10, 25), (50, 5), (500, 1000)]:
+            (scores, matches) = brute_force_scores(index, article_id, max_query_terms)
+            found = index.morelike(titles[article_id], limit=limit, max_query_terms=max_query_terms)
+
+            found_ids = [index.resolve(title) for title in found]
+            assert article_id not in found_ids
+            assert len(set(found_ids)) == len(found_ids)
+            assert len(found) == min(limit, matches.sum())
+            assert all(matches[found_ids])
+
+            # Most similar first, and nothing better left out
+            found_scores = scores[found_ids]
+            best = np.sort(scores[matches])[::-1][: len(found)]
+            assert np.allclose(found_scores, best, atol=1e-6)
+
+    # Redirects are followed
+    assert index.morelike("Redirect to 3") == index.morelike("Article 3")
+
+
+def test_empty_article():
+    index = TextIndex("en", n_features=N_FEATURES)
+    index.build(["", "alpha beta", "alpha gamma"], ["Empty", "First", "Second"])
+    assert index.morelike("Empty") == []
+    assert index.morelike("First") == ["Second"]
+
+
+def test_snapshot_round_trip(tmp_path):
+    (titles, texts) = make_articles(4, n=50)
+    index = build_index(titles, texts)
+    path = str(tmp_path / "enwiki-text.snapshot")
+    index.save_snapshot(path)
+
+    mapped = TextIndex("en")
+    assert mapped.load_snapshot(path)
+    assert mapped.n_features == N_FEATURES
+    assert mapped.resolve("Redirect to 3") == 3
+    for title in titles[:10]:
+        assert mapped.morelike(title) == index.morelike(title)
+
+    assert not TextIndex("de").load_snapshot(path)
@@ -0,0 +1,191 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+"""
+Test the text recommender's Borda count aggregation of morelike searches
+against running them one after another, using a fake search that
+finishes in random order.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the Python path
+# Use this line only if your want to test the script directly from the current path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+import random
+import threading
+
+import pywikibot
+
+from suggestbot.recommenders import text
+
+BASKET = ["Article {}".format(i) for i in range(12)]
+
+
+class FakeSite:
+    def __init__(self, rights=()):
+        self.rights = rights
+
+    def has_right(self, right):
+        return right in self.rights
+
+
+class FakeSearch:
+    """
+    Morelike search over made-up results, with small enough vocabularies
+    that many titles tie, sleeping for a random while so searches finish
+    in a different order every time.
+    """
+
+    def __init__(self, seed, failing=()):
+        rng = random.Random(seed)
+        self.results = {
+            title: rng.sample(["Result {}".format(j) for j in range(30)] + BASKET, rng.randint(0, 20))
+            for title in BASKET
+        }
+        self.failing = failing
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.queries = []
+
+    def __call__(self, site, page_title, srlimit):
+        with self.lock:
+            self.queries.append((page_title, srlimit))
+            delay = self.rng.random() * 0.01
+        time.sleep(delay)
+        if page_title in self.failing:
+            raise pywikibot.Error("search failed")
+        results = self.results[page_title][:srlimit]
+        return results or None
+
+
+def reference_recs(search, articles, nrecs, skip=()):
+    """
+    Borda counts from searching for each article in order, where ties
+    go to the title that showed up first.
+    """
+    scores = {}
+    order = []
+    for page_title in articles:
+        if page_title in skip:
+            continue
+        results = search.results[page_title]
+        for (rank, title) in enumerate(results):
+            if title not in scores:
+                order.append(title)
+            scores[title] = scores.get(title, 0) + len(results) - rank
+    order = [title for title in order if title not in articles]
+    order.sort(key=lambda title: -scores[title])
+    return [{"item": title, "value": scores[title]} for title in order[:nrecs]]
+
+
+def make_recommender(monkeypatch, search, workers):
+    monkeypatch.setattr(text, "get_site", lambda lang, login=False: FakeSite())
+    recommender = text.Recommender(workers=workers)
+    recommender.search_morelike = search
+    return recommender
+
+
+def test_concurrent_borda(monkeypatch):
+    for seed in range(5):
+        search = FakeSearch(seed)
+        expected = reference_recs(search, BASKET, 25)
+        assert len({rec["value"] for rec in expected}) < len(expected)
+        for workers in [1, 4, 12]:
+            recommender = make_recommender(monkeypatch, search, workers)
+            assert recommender.recommend("User", "en", BASKET, {"nrecs": 25}) == expected
+
+
+def test_failed_search(monkeypatch):
+    search = FakeSearch(1, failing={"Article 3", "Article 7"})
+    recommender = make_recommender(monkeypatch, search, 4)
+    recs = recommender.recommend("User", "en", BASKET, {"nrecs": 500})
+    assert recs == reference_recs(search, BASKET, 500, skip=search.failing)
+    assert len(search.queries) == len(BASKET)
+
+
+def test_cached_results(monkeypatch, tmp_path):
+    search = FakeSearch(2)
+    recommender = make_recommender(monkeypatch, search, 4)
+    recommender.cache = text.MorelikeCache(str(tmp_path / "morelike.sqlite"))
+    revisions = {title: 1 for title in BASKET}
+    recommender.get_revisions = lambda site, titles: dict(revisions)
+
+    expected = reference_recs(search, BASKET, 500)
+    assert recommender.recommend("User", "en", BASKET, {"nrecs": 500}) == expected
+    assert len(search.queries) == len(BASKET)
+
+    # Only the edited article is searched for again, along with
+    # those that had no results to cache
+    revisions["Article 4"] = 2
+    assert recommender.recommend("User", "en", BASKET, {"nrecs": 500}) == expected
+    searched = sorted(title for (title, srlimit) in search.queries[len(BASKET) :])
+    assert searched == sorted({"Article 4"} | {title for title in BASKET if not search.results[title]})
+
+
+def test_group_titles():
+    recommender = text.Recommender(batch_size=3)
+    searches = list(enumerate(BASKET[:7]))
+    assert recommender.group_titles(searches) == [
+        (0, BASKET[0:3]),
+        (3, BASKET[3:6]),
+        (6, BASKET[6:7]),
+    ]
+
+    # Batches are kept short enough for CirrusSearch
+    long_titles = ["{} {}".format(i, "x" * 100) for i in range(5)]
+    groups = text.Recommender(batch_size=5).group_titles(list(enumerate(long_titles)))
+    assert [i for (i, titles) in groups] == [0, 2, 4]
+    for (i, titles) in groups:
+        assert len("morelike:" + "|".join(titles)) <= text.MAX_QUERY_LENGTH
+
+
+class BatchedSearch(FakeSearch):
+    """
+    Every article gets as many results, and the articles of a batch
+    get different ones, so searching for a batch returns their results
+    interleaved.
+    """
+
+    def __init__(self, seed, num_results=8):
+        super().__init__(seed)
+        rng = random.Random(seed)
+        self.results = {
+            title: rng.sample(["Result {}-{}".format(i % 3, j) for j in range(15)], num_results)
+            for (i, title) in enumerate(BASKET)
+        }
+
+    def __call__(self, site, page_title, srlimit):
+        with self.lock:
+            self.queries.append((page_title, srlimit))
+        results = [self.results[title] for title in page_title.split("|")]
+        return [title for ranked in zip(*results) for title in ranked][:srlimit]
+
+
+def test_batched_borda(monkeypatch):
+    search = BatchedSearch(3)
+    expected = {rec["item"]: rec["value"] for rec in reference_recs(search, BASKET, 500)}
+    for batch_size in [1, 3]:
+        recommender = make_recommender(monkeypatch, search, 4)
+        recommender.batch_size = batch_size
+        recs = recommender.recommend("User", "en", BASKET, {"nrecs": 500})
+        assert {rec["item"]: rec["value"] for rec in recs} == expected
+    assert len(search.queries) == len(BASKET) + len(BASKET) // 3
+
+
+def test_batched_srlimit(monkeypatch):
+    search = BatchedSearch(4)
+    for (rights, batch_size, srlimit) in [
+        ((), 3, 150),
+        ((), 12, text.MAX_SRLIMIT),
+        (("apihighlimits",), 3, 300),
+        (("apihighlimits",), 12, 1200),
+    ]:
+        recommender = make_recommender(monkeypatch, search, 4)
+        monkeypatch.setattr(text, "get_site", lambda lang, login=False: FakeSite(rights))
+        recommender.batch_size = batch_size
+        search.queries = []
+        recommender.recommend("User", "en", BASKET, {"nrecs": 500})
+        assert [limit for (title, limit) in search.queries] == [srlimit] * (len(BASKET) // batch_size)
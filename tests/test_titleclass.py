@@ -0,0 +1,84 @@
+#!/usr/env/python
+# -*- coding: utf-8 -*-
+"""
+Test classifying article titles and looking up their classes.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the Python path
+# Use this line only if your want to test the script directly from the current path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+
+from suggestbot.utilities.titleclass import (
+    CLASSIFIED,
+    DATE,
+    FILTER_LIST,
+    LINK_EXCLUDED,
+    LIST,
+    YEAR,
+    TitleClasses,
+    classify,
+    mapped_title_classes,
+    title_class_path,
+)
+
+
+def test_classify():
+    assert classify("Foo", "en") == CLASSIFIED
+    assert classify("List_of_birds", "en") == CLASSIFIED | LIST | FILTER_LIST
+    assert classify("Birds, list of", "en") == CLASSIFIED
+    assert classify("January 5", "en") == CLASSIFIED | DATE
+    assert classify("1999 in sport", "en") == CLASSIFIED | YEAR
+    assert classify("Liste over fugler", "no") & LIST
+    assert not classify("Foo", "en") & LINK_EXCLUDED
+    # Languages without patterns only get the year class
+    assert classify("List of 1999 things", "xx") == CLASSIFIED | YEAR
+
+
+def make_classes():
+    classes = TitleClasses("en")
+    classes.build(
+        np.array([3, 7, 8, 20]),
+        ["Foo", "List_of_birds", "January_5", "1999_in_sport"],
+    )
+    return classes
+
+
+def test_lookups():
+    classes = make_classes()
+    flags = classes.page_flags([3, 7, 8, 20, 4, 1000])
+    assert flags.tolist() == [
+        CLASSIFIED,
+        CLASSIFIED | LIST | FILTER_LIST,
+        CLASSIFIED | DATE,
+        CLASSIFIED | YEAR,
+        0,
+        0,
+    ]
+    assert classes.title_flags("List of birds") == CLASSIFIED | LIST | FILTER_LIST
+    assert classes.title_flags("1999_in_sport") == CLASSIFIED | YEAR
+    assert classes.title_flags("Not an article") is None
+
+    empty = TitleClasses("en")
+    empty.build(np.array([], dtype=np.int64), [])
+    assert empty.page_flags([1, 2]).tolist() == [0, 0]
+
+
+def test_snapshot_round_trip(tmp_path):
+    classes = make_classes()
+    directory = str(tmp_path)
+    assert mapped_title_classes(directory, "en", {}) is None
+    classes.save_snapshot(title_class_path(directory, "en"))
+
+    mapped = {}
+    loaded = mapped_title_classes(directory, "en", mapped)
+    assert np.array_equal(loaded.flags, classes.flags)
+    assert loaded.title_flags("January 5") == CLASSIFIED | DATE
+    # Mapped once, until the snapshot changes
+    assert mapped_title_classes(directory, "en", mapped) is loaded
+
+    assert not TitleClasses("de").load_snapshot(title_class_path(directory, "en"))
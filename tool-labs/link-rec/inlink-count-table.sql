@@ -16,6 +16,10 @@ CREATE TABLE ptwiki_inlinkcounts LIKE enwiki_inlinkcounts;
 CREATE TABLE ruwiki_inlinkcounts LIKE enwiki_inlinkcounts;
 CREATE TABLE svwiki_inlinkcounts LIKE enwiki_inlinkcounts;
 
+-- inlink-table-updater.py also creates {lang}wiki_inlinkcounts_pending
+-- and {lang}wiki_inlinkcounts_staging, the pages queued for an update
+-- and their new inlink counts, as needed.
+
 CREATE TABLE inlinkcount_updates (
        ilcu_lang VARCHAR(16) NOT NULL PRIMARY KEY, -- language code
        ilcu_timestamp DATETIME, -- timestamp of last edited page read
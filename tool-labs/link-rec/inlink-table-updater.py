@@ -34,13 +34,20 @@ Boston, MA  02110-1301, USA.
 import os
 import re
 import sys
+import array
 import logging
 
 from datetime import datetime
 from more_itertools import chunked
 
+import numpy as np
+
 import db
 
+# Inlink count of the pages that are not in the table in the exported
+# array, the link recommender leaves those pages unweighted
+MISSING_INLINK_COUNT = np.iinfo(np.uint32).max
+
 class DatabaseConnectionError(Exception):
     """
     Raised if we're unable to connect to a given database.
@@ -59,6 +66,28 @@ class UpdateTableError(Exception):
     """
     pass
 
+def fetch_page_ids(db_conn, query, params=None):
+    '''
+    Stream the page IDs returned by the given query through a server-side
+    cursor into a sorted array of unique unsigned 32-bit integers, so we
+    never hold millions of them as Python ints.
+
+    :param db_conn: database connection to run the query on
+    :type db_conn: pymysql.Connection
+
+    :param query: SQL query that returns page IDs in its first column
+    :type query: str
+
+    :param params: parameters of the query
+    :type params: dict
+    '''
+    page_ids = array.array('I')
+    with db.cursor(db_conn, 'ss') as db_cursor:
+        db_cursor.execute(query, params)
+        for row in db_cursor:
+            page_ids.append(row[0])
+    return(np.unique(np.frombuffer(page_ids, dtype=np.uintc)))
+
 class InlinkTableUpdater:
     def __init__(self, lang,
                  slice_size=100, commit_size=1000):
@@ -97,14 +126,27 @@ class InlinkTableUpdater:
         self.tool_ilc_table = '{}wiki_inlinkcounts'.format(lang)
         self.tool_temp_table = 'temp_inlinkcounts'
 
+        ## Tables with the pages queued for an update, and their
+        ## new inlink counts before they're applied.
+        self.tool_pending_table = '{}wiki_inlinkcounts_pending'.format(lang)
+        self.tool_staging_table = '{}wiki_inlinkcounts_staging'.format(lang)
+
         ## Hostname and database name pattern for the replicated Wikipedia DBs
         self.wiki_db_name = '{}wiki_p'.format(lang)
         self.wiki_host = '{}wiki.analytics.db.svc.eqiad.wmflabs'.format(lang)
 
-    def setUpdateStatus(self):
+    def setUpdateStatus(self, resume=False):
         """
         Check the ilcu_update_running column, if set, raise error,
-        else set it, commit, and return
+        else set it, commit, and return.  If the column is set but
+        there are pages queued for an update, the run that set it
+        died before finishing (runs are limited to 24 hours by the job
+        scheduler, and each language is updated once a day), and we
+        resume its update instead of raising an error.
+
+        :param resume: don't raise an error if the column is set, because
+                       we're resuming an update that was interrupted
+        :type resume: bool
         """
         checkRunningQuery = u"""SELECT ilcu_update_running
                                 FROM {status_table}
@@ -120,8 +162,11 @@ class InlinkTableUpdater:
             row = db_cursor.fetchone()
             db_cursor.fetchall() # flush cursor
 
-            if row['ilcu_update_running']:
-                raise UpdateRunningError
+            if row['ilcu_update_running'] and not resume:
+                self.create_work_tables()
+                if not self.count_pending():
+                    raise UpdateRunningError
+                logging.warning("update status is set but articles are queued, resuming interrupted update")
 
             db_cursor.execute(setRunningQuery, {'lang': self.lang})
             if db_cursor.rowcount != 1:
@@ -177,18 +222,17 @@ class InlinkTableUpdater:
         db.disconnect(self.wiki_db_conn)
         db.disconnect(self.tool_db_conn)
     
-    def updateInlinkTable(self):
+    def find_pages_to_update(self):
         '''
-        Update the inlink count table for the given language.
+        Delete pages that no longer exist from the inlink count table,
+        insert new ones, and find the articles whose inlink counts need
+        updating: new articles, articles linked from recently changed ones,
+        and those that haven't been updated in `self.max_age` days.
+        Returns a tuple of a sorted array of page IDs and the timestamp of the
+        most recent change we saw.  Ages are incremented but not committed,
+        `queue_pages()` commits them along with the queued pages.
         '''
 
-        # Query to update the ILC table
-        update_query = '''UPDATE {ilc_table}
-                          SET ilc_numlinks=%(num_links)s,
-                              ilc_age=0
-                          WHERE ilc_page_id=%(page_id)s'''.format(
-                              ilc_table=self.tool_ilc_table)
-        
         ## Query to get page IDs of all pages in the Wikipedia we're processing
         wiki_pages_query = '''SELECT page_id
                               FROM page p
@@ -224,56 +268,6 @@ class InlinkTableUpdater:
                           (ilc_page_id) VALUES (%s)'''.format(
                               ilc_table=self.tool_ilc_table)
         
-        # Query to get a set of articles with their inlink count
-        # so we can update their inlink counts
-        get_inlinkcount_query = '''
-            SELECT page_id AS ilc_page_id,
-                   links.numlinks + IFNULL(redirlinks.numlinks, 0)
-                   - IFNULL(redirs.numredirs, 0) AS ilc_numlinks
-            FROM
-            (SELECT p.page_id AS page_id,
-                    count(*) AS numlinks
-             FROM page p
-             JOIN pagelinks pl
-             ON (p.page_namespace=pl.pl_namespace
-                 AND p.page_title=pl.pl_title)
-             WHERE p.page_id IN ({idlist})
-             AND pl.pl_from_namespace=0
-             GROUP BY p.page_id
-            ) AS links
-            LEFT JOIN
-            (SELECT p1.page_id,
-                    count(*) AS numredirs
-             FROM page p1
-             JOIN redirect 
-             ON (p1.page_namespace=rd_namespace
-                 AND page_title=rd_title)
-             JOIN page p2
-             ON rd_from=p2.page_id
-             WHERE p2.page_namespace=0
-             AND p1.page_id IN ({idlist})
-             GROUP BY page_id
-            ) AS redirs
-            USING (page_id)
-            LEFT JOIN
-            (SELECT p1.page_id,
-                    count(*) AS numlinks
-             FROM page p1
-             JOIN redirect 
-             ON (p1.page_namespace=rd_namespace
-                 AND page_title=rd_title)
-             JOIN page p2
-             ON rd_from=p2.page_id
-             JOIN pagelinks pl
-             ON (p2.page_namespace=pl.pl_namespace
-                 AND p2.page_title=pl.pl_title)
-             WHERE p2.page_namespace=0
-             AND pl.pl_from_namespace=0
-             AND p1.page_id IN ({idlist})
-             GROUP BY page_id
-            ) AS redirlinks
-            USING (page_id)'''
-
         # Query to delete a page from the inlink count table
         deletePageQuery = '''DELETE FROM {ilc_table}
                              WHERE ilc_page_id IN ({idlist})'''
@@ -289,25 +283,12 @@ class InlinkTableUpdater:
                             WHERE ilc_age >= %(age)s'''.format(
                                 ilc_table=self.tool_ilc_table)
 
-        ## After an update, all articles that still have age >= self.max_age
-        ## do not have any inlinks. So, we reset those.
-        reset_aged_query = '''UPDATE {ilc_table}
-                              SET ilc_numlinks=0, ilc_age=0
-                              WHERE ilc_age >= %(age)s'''.format(
-                                  ilc_table=self.tool_ilc_table)
-        
         # Query to get the last update timestamp from the database
         getLastupdateQuery = '''SELECT ilcu_timestamp
                                 FROM {status_table}
                                 WHERE ilcu_lang=%(lang)s'''.format(
                                     status_table=self.tool_status_table)
 
-        # Query to set the last update timestamp from the database
-        setLastupdateQuery = '''UPDATE {status_table}
-                                SET ilcu_timestamp=%(timestamp)s
-                                WHERE ilcu_lang=%(lang)s'''.format(
-                                    status_table=self.tool_status_table)
-
         # Query to get IDs and most recent edit timestamp
         # of non-redirecting articles (namespace 0)
         # updated after a given timestamp, from the recentchanges table
@@ -334,28 +315,20 @@ class InlinkTableUpdater:
 
         logging.info("finding pages to delete")
 
-        ## 1: get a set of all page IDs of all Wikipedia pages
-        all_wiki_pages = set()
-        with db.cursor(self.wiki_db_conn, 'dict') as db_cursor:
-            db_cursor.execute(wiki_pages_query)
-            for row in db_cursor:
-                all_wiki_pages.add(row['page_id'])
-        
-        ## 2: get a set of all page IDs in our corresponding inlink table
-        all_ilc_pages = set()
-        with db.cursor(self.tool_db_conn, 'dict') as db_cursor:
-            db_cursor.execute(ilc_pages_query)
-            for row in db_cursor:
-                all_ilc_pages.add(row['ilc_page_id'])
+        ## 1: get the page IDs of all Wikipedia pages, and 2: all page IDs
+        ## in our corresponding inlink table, as sorted arrays
+        all_wiki_pages = fetch_page_ids(self.wiki_db_conn, wiki_pages_query)
+        all_ilc_pages = fetch_page_ids(self.tool_db_conn, ilc_pages_query)
         
         # 1: find pages that need to be deleted, and delete them
-        deleted_pages = [str(p) for p in (all_ilc_pages - all_wiki_pages)]
+        deleted_pages = np.setdiff1d(all_ilc_pages, all_wiki_pages,
+                                     assume_unique=True)
         
         logging.info("found {} pages to delete.".format(len(deleted_pages)))
 
         i = 0
         with db.cursor(self.tool_db_conn) as db_cursor:
-            for subset in chunked(deleted_pages, self.slice_size):
+            for subset in chunked(deleted_pages.tolist(), self.slice_size):
                 db_cursor.execute(deletePageQuery.format(
                     ilc_table=self.tool_ilc_table,
                     idlist=",".join([str(p) for p in subset])))
@@ -370,14 +343,17 @@ class InlinkTableUpdater:
         #    that need updating.
         ## Note: named "pages_to_update" because we later add to this to get
         ## the whole set of pages we'll update inlink counts for.
-        pages_to_update = all_wiki_pages - all_ilc_pages
+        pages_to_update = np.setdiff1d(all_wiki_pages, all_ilc_pages,
+                                       assume_unique=True)
+        all_wiki_pages = None
+        all_ilc_pages = None
         
         # 2.1 iterate over slices and insert the pages into the ILC table.
         logging.info("Inserting {} articles to the ILC table".format(len(pages_to_update)))
 
         i = 0
         with db.cursor(self.tool_db_conn) as db_cursor:
-            for subset in chunked(pages_to_update, self.slice_size):
+            for subset in chunked(pages_to_update.tolist(), self.slice_size):
                 db_cursor.executemany(insert_query,
                                       [(p) for p in subset])
 
@@ -437,6 +413,7 @@ class InlinkTableUpdater:
         # (Our basic assumption is that this takes less time than grabbing text
         #  and diffing to find the exact link added/removed)
         redirectsToResolve = set()
+        linked_pages = array.array('I')
         with db.cursor(self.wiki_db_conn, 'dict') as db_cursor:
             for subset in chunked(changedPages, self.slice_size):
                 db_cursor.execute(getLinksQuery.format(
@@ -446,7 +423,7 @@ class InlinkTableUpdater:
                     if row['page_is_redirect']:
                         redirectsToResolve.add(row['page_id'])
                     else:
-                        pages_to_update.add(row['page_id'])
+                        linked_pages.append(row['page_id'])
 
         # This can now be cleaned up
         changedPages = None
@@ -461,7 +438,11 @@ class InlinkTableUpdater:
                     pageidlist=",".join([str(p) for p in subset])))
                 for row in db_cursor:
                     if not row['page_is_redirect']:
-                        pages_to_update.add(row['page_id'])
+                        linked_pages.append(row['page_id'])
+
+        pages_to_update = np.union1d(pages_to_update,
+                                     np.frombuffer(linked_pages, dtype=np.uintc))
+        linked_pages = None
 
         logging.info("resolved redirects, found {} articles in need of an update.".format(len(pages_to_update)))
 
@@ -469,36 +450,223 @@ class InlinkTableUpdater:
         with db.cursor(self.tool_db_conn, 'dict') as db_cursor:
             db_cursor.execute(update_age_query)
             db_cursor.fetchall() # flush cursor
-            self.tool_db_conn.commit()
 
-            db_cursor.execute(get_aged_query,
-                              {'age': self.max_age})
-            for row in db_cursor:
-                pages_to_update.add(row['ilc_page_id'])
+        pages_to_update = np.union1d(
+            pages_to_update,
+            fetch_page_ids(self.tool_db_conn, get_aged_query,
+                           {'age': self.max_age}))
 
         logging.info('added pages that have reached max age, now have {} articles in need of an update'.format(len(pages_to_update)))
             
-        # 4: Iterate over all changed pages and update their inlink counts
+        return(pages_to_update, newUpdateTime)
+
+    def create_work_tables(self):
+        '''
+        Create the tables we queue pages to update in and stage their
+        new inlink counts in, if they don't exist.  Both are permanent
+        tables so an interrupted update can be resumed.
+        '''
+        create_pending_query = '''CREATE TABLE IF NOT EXISTS {pending_table} (
+                                      ilc_page_id INT(8) UNSIGNED NOT NULL PRIMARY KEY
+                                  ) ENGINE=InnoDB'''.format(
+                                      pending_table=self.tool_pending_table)
+        create_staging_query = '''CREATE TABLE IF NOT EXISTS {staging_table} (
+                                      ilc_page_id INT(8) UNSIGNED NOT NULL PRIMARY KEY,
+                                      ilc_numlinks INTEGER UNSIGNED DEFAULT 0
+                                  ) ENGINE=InnoDB'''.format(
+                                      staging_table=self.tool_staging_table)
+
+        with db.cursor(self.tool_db_conn) as db_cursor:
+            db_cursor.execute(create_pending_query)
+            db_cursor.execute(create_staging_query)
+        return()
+
+    def count_pending(self):
+        '''
+        Get the number of pages queued for an update.
+        '''
+        count_query = '''SELECT COUNT(*)
+                         FROM {pending_table}'''.format(
+                             pending_table=self.tool_pending_table)
+
+        with db.cursor(self.tool_db_conn) as db_cursor:
+            db_cursor.execute(count_query)
+            (num_pending,) = db_cursor.fetchone()
+        return(num_pending)
+
+    def queue_pages(self, pages_to_update, newUpdateTime):
+        '''
+        Queue the given pages for an update with batched multi-row inserts,
+        and set the last update timestamp.  Both are committed together
+        (along with the age increments from `find_pages_to_update()`),
+        so once the pages are queued the update can be resumed from
+        the queue.
+
+        :param pages_to_update: page IDs of the articles to update, sorted
+        :type pages_to_update: numpy.ndarray
+
+        :param newUpdateTime: timestamp of the most recent change we saw
+        :type newUpdateTime: datetime.datetime
+        '''
+
+        # Query to queue pages, pymysql's executemany() turns this
+        # into multi-row inserts
+        queue_query = '''INSERT IGNORE INTO {pending_table}
+                         (ilc_page_id) VALUES (%s)'''.format(
+                             pending_table=self.tool_pending_table)
+
+        # Query to set the last update timestamp from the database
+        setLastupdateQuery = '''UPDATE {status_table}
+                                SET ilcu_timestamp=%(timestamp)s
+                                WHERE ilcu_lang=%(lang)s'''.format(
+                                    status_table=self.tool_status_table)
+
+        with db.cursor(self.tool_db_conn) as db_cursor:
+            for start in range(0, len(pages_to_update), self.commit_size):
+                subset = pages_to_update[start:start+self.commit_size]
+                db_cursor.executemany(queue_query, subset.tolist())
+
+            db_cursor.execute(setLastupdateQuery,
+                              {'timestamp': newUpdateTime,
+                               'lang': self.lang})
+        self.tool_db_conn.commit()
+
+        logging.info("queued {} articles for an update".format(len(pages_to_update)))
+        return()
+
+    def update_pending_pages(self):
+        '''
+        Update the inlink counts of the queued pages, `self.commit_size`
+        pages at a time.  The counts of each chunk are inserted into the
+        staging table and applied to the inlink count table with a single
+        join update, and the chunk is removed from the queue in the same
+        transaction, so an interrupted update resumes after the last
+        committed chunk.
+        '''
+
+        # Query to get the next chunk of queued pages
+        get_pending_query = '''SELECT ilc_page_id
+                               FROM {pending_table}
+                               ORDER BY ilc_page_id
+                               LIMIT %(limit)s'''.format(
+                                   pending_table=self.tool_pending_table)
+
+        # Query to get a set of articles with their inlink count
+        # so we can update their inlink counts
+        get_inlinkcount_query = '''
+            SELECT page_id AS ilc_page_id,
+                   links.numlinks + IFNULL(redirlinks.numlinks, 0)
+                   - IFNULL(redirs.numredirs, 0) AS ilc_numlinks
+            FROM
+            (SELECT p.page_id AS page_id,
+                    count(*) AS numlinks
+             FROM page p
+             JOIN pagelinks pl
+             ON (p.page_namespace=pl.pl_namespace
+                 AND p.page_title=pl.pl_title)
+             WHERE p.page_id IN ({idlist})
+             AND pl.pl_from_namespace=0
+             GROUP BY p.page_id
+            ) AS links
+            LEFT JOIN
+            (SELECT p1.page_id,
+                    count(*) AS numredirs
+             FROM page p1
+             JOIN redirect 
+             ON (p1.page_namespace=rd_namespace
+                 AND page_title=rd_title)
+             JOIN page p2
+             ON rd_from=p2.page_id
+             WHERE p2.page_namespace=0
+             AND p1.page_id IN ({idlist})
+             GROUP BY page_id
+            ) AS redirs
+            USING (page_id)
+            LEFT JOIN
+            (SELECT p1.page_id,
+                    count(*) AS numlinks
+             FROM page p1
+             JOIN redirect 
+             ON (p1.page_namespace=rd_namespace
+                 AND page_title=rd_title)
+             JOIN page p2
+             ON rd_from=p2.page_id
+             JOIN pagelinks pl
+             ON (p2.page_namespace=pl.pl_namespace
+                 AND p2.page_title=pl.pl_title)
+             WHERE p2.page_namespace=0
+             AND pl.pl_from_namespace=0
+             AND p1.page_id IN ({idlist})
+             GROUP BY page_id
+            ) AS redirlinks
+            USING (page_id)'''
+
+        # Query to stage inlink counts, pymysql's executemany() turns this
+        # into multi-row inserts
+        stage_query = '''INSERT INTO {staging_table}
+                         (ilc_page_id, ilc_numlinks) VALUES (%s, %s)'''.format(
+                             staging_table=self.tool_staging_table)
+
+        # Query to apply the staged inlink counts to the ILC table
+        apply_query = '''UPDATE {ilc_table} AS ilc
+                         JOIN {staging_table} AS staged
+                         USING (ilc_page_id)
+                         SET ilc.ilc_numlinks=staged.ilc_numlinks,
+                             ilc.ilc_age=0'''.format(
+                                 ilc_table=self.tool_ilc_table,
+                                 staging_table=self.tool_staging_table)
+
+        # Query to clear the staging table, DELETE rather than TRUNCATE
+        # because the latter commits
+        clear_staging_query = '''DELETE FROM {staging_table}'''.format(
+            staging_table=self.tool_staging_table)
+
+        # Query to remove a chunk of pages from the queue
+        dequeue_query = '''DELETE FROM {pending_table}
+                           WHERE ilc_page_id BETWEEN %(first)s AND %(last)s'''.format(
+                               pending_table=self.tool_pending_table)
+
+        ## After an update, all articles that still have age >= self.max_age
+        ## do not have any inlinks. So, we reset those.
+        reset_aged_query = '''UPDATE {ilc_table}
+                              SET ilc_numlinks=0, ilc_age=0
+                              WHERE ilc_age >= %(age)s'''.format(
+                                  ilc_table=self.tool_ilc_table)
+        
+        num_pending = self.count_pending()
+        logging.info("updating inlink counts of {} queued articles".format(num_pending))
+
         wiki_cursor = db.cursor(self.wiki_db_conn, 'dict')
-        tool_cursor = db.cursor(self.tool_db_conn, 'dict')
+        tool_cursor = db.cursor(self.tool_db_conn)
+
+        # Clear out anything staged by an interrupted update
+        tool_cursor.execute(clear_staging_query)
 
         i = 0
-        for subset in chunked(pages_to_update, self.slice_size):
-            page_ids = [str(p) for p in subset]
-
-            wiki_cursor.execute(get_inlinkcount_query.format(
-                idlist=','.join(page_ids)))
-            for row in wiki_cursor:
-                tool_cursor.execute(update_query,
-                                    {'num_links': row['ilc_numlinks'],
-                                     'page_id': row['ilc_page_id']})
-            i += self.slice_size
-            if i % self.commit_size == 0:
-                logging.info("updated {} articles in the ILC table.".format(i))
-                self.tool_db_conn.commit()
+        while True:
+            tool_cursor.execute(get_pending_query,
+                                {'limit': self.commit_size})
+            chunk = [row[0] for row in tool_cursor.fetchall()]
+            if not chunk:
+                break
+
+            inlink_counts = []
+            for subset in chunked(chunk, self.slice_size):
+                wiki_cursor.execute(get_inlinkcount_query.format(
+                    idlist=','.join([str(p) for p in subset])))
+                for row in wiki_cursor:
+                    inlink_counts.append((row['ilc_page_id'],
+                                          row['ilc_numlinks']))
+
+            tool_cursor.executemany(stage_query, inlink_counts)
+            tool_cursor.execute(apply_query)
+            tool_cursor.execute(clear_staging_query)
+            tool_cursor.execute(dequeue_query,
+                                {'first': chunk[0], 'last': chunk[-1]})
+            self.tool_db_conn.commit()
 
-        ## Commit any outstanding updates
-        self.tool_db_conn.commit()
+            i += len(chunk)
+            logging.info("updated {} of {} articles in the ILC table.".format(i, num_pending))
 
         ## Done fetching data from the Wiki, close that cursor
         wiki_cursor.close()
@@ -507,11 +675,6 @@ class InlinkTableUpdater:
         tool_cursor.execute(reset_aged_query,
                             {'age': self.max_age})
         logging.info("reset inlink count for {} aged rows in the ILC table, committing all changes".format(tool_cursor.rowcount))
-        
-        # Update the last updated timestamp
-        tool_cursor.execute(setLastupdateQuery,
-                            {'timestamp': newUpdateTime,
-                             'lang': self.lang})
         self.tool_db_conn.commit()
         tool_cursor.close()
 
@@ -519,6 +682,64 @@ class InlinkTableUpdater:
 
         # OK, we're done here
         return()
+
+    def updateInlinkTable(self):
+        '''
+        Update the inlink count table for the given language.  If a
+        previous update was interrupted after queuing its pages,
+        it is resumed instead.
+        '''
+        self.create_work_tables()
+
+        num_pending = self.count_pending()
+        if num_pending:
+            logging.info("resuming interrupted update, {} articles left to update".format(num_pending))
+        else:
+            (pages_to_update, newUpdateTime) = self.find_pages_to_update()
+            self.queue_pages(pages_to_update, newUpdateTime)
+
+        self.update_pending_pages()
+        return()
+
+    def export_inlink_counts(self, directory):
+        '''
+        Export the inlink count table to a dense array of unsigned 32-bit
+        integers indexed by page ID, saved as {lang}wiki_inlinkcounts.npy
+        in the given directory, which the link recommender memory-maps.
+        Pages not in the table get MISSING_INLINK_COUNT.  The file is
+        written to a temporary file first and then renamed into place,
+        so readers never see a partial export.
+
+        :param directory: directory to export the array to
+        :type directory: str
+        '''
+
+        # Query to get all inlink counts
+        get_all_query = '''SELECT ilc_page_id, ilc_numlinks
+                           FROM {ilc_table}'''.format(
+                               ilc_table=self.tool_ilc_table)
+
+        page_ids = array.array('Q')
+        num_links = array.array('Q')
+        with db.cursor(self.tool_db_conn, 'ss') as db_cursor:
+            db_cursor.execute(get_all_query)
+            for (page_id, numlinks) in db_cursor:
+                page_ids.append(page_id)
+                num_links.append(numlinks or 0)
+
+        page_ids = np.frombuffer(page_ids, dtype=np.uint64)
+        num_links = np.frombuffer(num_links, dtype=np.uint64)
+        counts = np.full(int(page_ids.max()) + 1 if len(page_ids) else 0,
+                         MISSING_INLINK_COUNT, dtype=np.uint32)
+        counts[page_ids] = np.minimum(num_links, MISSING_INLINK_COUNT - 1)
+
+        path = os.path.join(directory, self.tool_ilc_table + '.npy')
+        tmp_path = '{}.tmp.{}.npy'.format(path, os.getpid())
+        np.save(tmp_path, counts)
+        os.replace(tmp_path, path)
+
+        logging.info("exported inlink counts of {} articles to {}".format(len(page_ids), path))
+        return()
         
 def main():
     '''
@@ -538,6 +759,14 @@ def main():
     cli_parser.add_argument("-v", "--verbose", action="store_true",
                           help="I can has kittehtalkzalot?")
 
+    # Resume an update that was interrupted
+    cli_parser.add_argument("-r", "--resume", action="store_true",
+                            help='resume an interrupted update even though the status table says it is still running and no articles are queued')
+
+    # Directory to export the dense inlink count array to
+    cli_parser.add_argument("-e", "--export-dir", type=str,
+                            help='directory to export the inlink counts to as an array indexed by page ID (default: no export)')
+
     # Language we're updating
     cli_parser.add_argument("lang", type=str,
                             help="what language to update the inlink count table for")
@@ -563,7 +792,7 @@ def main():
 
     try:
         # Try to set status of this language as running.
-        myUpdater.setUpdateStatus()
+        myUpdater.setUpdateStatus(resume=args.resume)
         
 
         # Helpful to output the beginning and end of a run,
@@ -571,6 +800,8 @@ def main():
         print("Update of inlink count for lang {} started at {}".format(
             args.lang, datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")))
         myUpdater.updateInlinkTable()
+        if args.export_dir:
+            myUpdater.export_inlink_counts(args.export_dir)
         print("Update of inlink count for lang {} ended at {}".format(
             args.lang, datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")))
         myUpdater.clearUpdateStatus()
@@ -27,6 +27,8 @@ import os
 import re
 import json
 import math
+import time
+import array
 import logging
 import operator
 
@@ -36,9 +38,70 @@ import pymysql
 from flipflop import WSGIServer
 import cgi
 
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from more_itertools import chunked
 
+## Maximum number of pages per language whose links we keep in memory,
+## and for how many seconds, in the link cache.
+# Maximum number of links kept across all cached pages, each
+# stored as a 4-byte page ID (~20MB per language)
+LINK_CACHE_MAX_LINKS = 5000000
+LINK_CACHE_TTL = 3600
+
+# Regular expressions for things that we exclude.
+# Note that we use match() to anchor these at the beginning
+# of the string, instead of using "^" and search(), and that we use
+# non-capturing groups since we're not using the results.
+# Also note that Swedish and Norwegian Wikipedia specify dates as
+# "xx. Januar" rather than "January 1" as they do in English.
+MONTHS = {
+    'en': r'(January|February|March|April|May|June|July|August|September|October|November|December)[ _]\d+',
+    'no': r'\d+\.[ _]+(:[Jj]anuar|[Ff]ebruar|[Mm]ars|[Aa]pril|[Mm]ai|[Jj]uni|[Jj]uli|[Aa]ugust|[Ss]eptember|[Oo]ktober|[Nn]ovember|[Dd]esember)',
+    'sv': r'\d+\.[ _]+(:[Jj]anuari|[Ff]ebruari|[Mm]ars|[Aa]pril|[Mm]aj|[Jj]uni|[Jj]uli|[Aa]ugusti|[Ss]eptember|[Oo]ktober|[Nn]ovember|[Dd]ecember)',
+    'pt': r'\d+[ _]+de[ _]+(:[Jj]aneiro|[Ff]evereiro|[Mm]arço|[Aa]bril|[Mm]aio|[Jj]unho|[Jj]ulho|[Aa]gosto|[Ss]etembro|[Oo]utubro|[Nn]ovembro|[Dd]ezembro)',
+    'hu': r'Január|Február|Március|Április|Május|Június|Július|Augusztus|Szeptember|Október|November|December',
+    'fa': 'دسامب|نوامب|اکتب|سپتامب|اوت|ژوئی|ژوئن|مه|آوریل|مارس|فوریه|ژانویه',
+    'ru': r'(:Январь|Февраль|Март|Апрель|Май|Июнь|Июль|Август|Сентябрь|Октябрь|Ноябрь|Декабрь)|(:\d+[ _]+(:января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря))',
+    ## Note the negative lookahead (?! ...) to allow us to match
+    ## the actual months, but not dates.
+    'fr': r'(\d+[ _](?!.*[ _]\d+$))?([Jj]anvier|[Ff]évrier|[Mm]ars|[Aa]vril|[Mm]ai|[Jj]uin|[Jj]uillet|[Aa]oût|[Ss]eptembre|[Oo]ctobre|[Nn]ovembre|[Dd]écembre)(\d+)?',
+    }
+
+# Note: compatible with both ' '  and '_' as spaces
+LISTS = {
+    'en': r'^List[ _]of[ _]',
+    'no': r'^Liste[ _]over[ _]',
+    'sv': r'^Lista[ _]över[ _]',
+    'pt': r'^Lista[ _]de[ _]',
+    'hu': r'[ _]listája$',
+    'fa': r'^فهرست',
+    'ru': r'(^Список|(:Алфавитный[ _]|Хронологический[ _])список)|—[ _]список',
+    'fr': r"[Ll]iste[ _]d[e']",
+    }
+
+# Compile the regular expressions
+MONTHS_RE = dict()
+LISTS_RE = dict()
+for lang_code in MONTHS.keys():
+    MONTHS_RE[lang_code] = re.compile(MONTHS[lang_code], re.U|re.I)
+    LISTS_RE[lang_code] = re.compile(LISTS[lang_code], re.U|re.I)
+
+# Four digits somewhere in the title, typically a year
+YEAR_RE = re.compile(r'\d{4}')
+
+## The app is served by a single-threaded FastCGI server, so the process
+## handles one request at a time and can keep connections, recommenders
+## and caches around between requests without locking.
+
+## Database connections, keyed by hostname and database name
+_connections = {}
+
+## Recommenders, keyed by language code
+_recommenders = {}
+
+## Link caches, keyed by language code
+_link_caches = {}
+
 class DatabaseConnectionError(Exception):
     """
     Raised if we're unable to connect to a given database.
@@ -78,6 +141,176 @@ class JSON():
     def process(self, request):
         self.sendSuccess(request)
 
+def resolve_titles(db_cursor, titles, slice_size=100):
+    '''
+    Resolve article titles to page IDs, a slice of titles per query.
+    Single redirects are followed to the article they point to, while
+    titles of double redirects and of pages that are not articles are
+    left out.  Returns a dictionary mapping the resolved titles to
+    page IDs.  Kept in sync with the same function in
+    suggestbot/recommenders/links.py.
+
+    @param db_cursor: dictionary cursor on the Wikipedia database
+    @type db_cursor: pymysql.cursors.DictCursor
+
+    @param titles: titles of the articles, with spaces or underscores
+    @type titles: list
+
+    @param slice_size: number of titles to resolve per query
+    @type slice_size: int
+    '''
+
+    # Query to get the page IDs of a list of pages and for those
+    # that are redirects also get the page ID of the page they redirect to
+    get_page_ids_query = '''SELECT p.page_title, p.page_id,
+                                     p.page_is_redirect,
+                                     redir.page_id AS redir_page_id,
+                                     redir.page_is_redirect AS double_redirect
+                              FROM page p LEFT JOIN redirect rd
+                              ON p.page_id=rd.rd_from
+                              LEFT JOIN page redir
+                              ON (rd.rd_namespace=redir.page_namespace
+                                  AND rd.rd_title=redir.page_title)
+                              WHERE p.page_namespace=0
+                              AND p.page_title IN ({titlelist})'''
+
+    # Titles as they are stored in the database, mapped to the titles
+    # we were given (e.g. both "A B" and "A_B" become "A_B")
+    db_titles = defaultdict(list)
+    for title in titles:
+        db_titles[re.sub(' ', '_', title).encode('utf-8')].append(title)
+
+    page_ids = {}
+    for subset in chunked(db_titles.keys(), slice_size):
+        try:
+            db_cursor.execute(
+                get_page_ids_query.format(
+                    titlelist=','.join(['%s'] * len(subset))),
+                subset)
+            for row in db_cursor:
+                if not row['page_is_redirect']:
+                    page_id = row['page_id']
+                elif row['redir_page_id'] and not row['double_redirect']:
+                    page_id = row['redir_page_id']
+                else:
+                    continue
+
+                for title in db_titles[row['page_title']]:
+                    page_ids[title] = page_id
+        except pymysql.Error as e:
+            logging.warning("Failed to get page IDs for {n} titles".format(n=len(subset)))
+            logging.warning("MySQL error {0}: {1}".format(e.args[0], e.args[1]))
+
+    return(page_ids)
+
+def get_connection(host, database, config_file):
+    '''
+    Get a connection to the given database, reusing the one from
+    a previous request if it is still alive, and connecting otherwise.
+    Returns None if we're unable to connect.
+
+    @param host: hostname of the database server
+    @type host: str
+
+    @param database: name of the database
+    @type database: str
+
+    @param config_file: path to the MySQL configuration file to use
+    @type config_file: str
+    '''
+    db_conn = _connections.get((host, database))
+    if db_conn is not None:
+        try:
+            db_conn.ping(reconnect=True)
+            # End the previous request's transaction so we don't keep
+            # reading from its REPEATABLE READ snapshot.
+            db_conn.rollback()
+            return(db_conn)
+        except pymysql.Error:
+            logging.warning("lost connection to {}, reconnecting".format(host))
+            db.disconnect(db_conn)
+
+    try:
+        db_conn = db.connect(host, database, config_file)
+    except Exception:
+        db_conn = None
+    if db_conn is not None:
+        _connections[(host, database)] = db_conn
+    else:
+        _connections.pop((host, database), None)
+    return(db_conn)
+
+class LinkCache:
+    def __init__(self, max_links=LINK_CACHE_MAX_LINKS, ttl=LINK_CACHE_TTL):
+        '''
+        Bounded cache of the links from recently expanded pages, evicting
+        the least recently used pages when it holds more than `max_links`
+        links in total.  Links are kept for at most `ttl` seconds so
+        edits to the pages are picked up.
+
+        @param max_links: maximum number of links to keep across all pages
+        @type max_links: int
+
+        @param ttl: number of seconds we keep a page's links
+        @type ttl: int
+        '''
+        self.max_links = max_links
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.num_links = 0
+
+    def get(self, page_id):
+        '''
+        Get the page IDs of the pages linked from the given page,
+        or None if they are not in the cache.
+        '''
+        try:
+            (timestamp, links) = self.entries[page_id]
+        except KeyError:
+            return(None)
+        if time.time() - timestamp > self.ttl:
+            self.remove(page_id)
+            return(None)
+        self.entries.move_to_end(page_id)
+        return(links)
+
+    def remove(self, page_id):
+        '''
+        Remove the given page's links from the cache, if present.
+        '''
+        entry = self.entries.pop(page_id, None)
+        if entry is not None:
+            self.num_links -= len(entry[1])
+
+    def put(self, page_id, links):
+        '''
+        Store the page IDs of the pages linked from the given page.
+        Pages with more links than the cache can hold are not stored.
+        '''
+        self.remove(page_id)
+        if len(links) > self.max_links:
+            return()
+        self.entries[page_id] = (time.time(), array.array('i', links))
+        self.num_links += len(links)
+        while self.num_links > self.max_links:
+            (_, (_, evicted)) = self.entries.popitem(last=False)
+            self.num_links -= len(evicted)
+
+def get_recommender(lang):
+    '''
+    Get the recommender for the given language, creating it
+    if this process hasn't served that language before.
+
+    @param lang: language code of the language we're recommending for
+    @type lang: str
+    '''
+    try:
+        return(_recommenders[lang])
+    except KeyError:
+        recommender = LinkRecommender(lang=lang)
+        _recommenders[lang] = recommender
+        return(recommender)
+
 class LinkRecommender():
     def __init__(self, lang='en', nrecs=10, max_depth=2, verbose=False,
                  sliceSize=25, n_docs=1000):
@@ -128,43 +361,11 @@ class LinkRecommender():
         self.wiki_db_name = '{}wiki_p'.format(lang)
         self.wiki_host = '{}wiki.web.db.svc.eqiad.wmflabs'.format(lang)
 
-        # Regular expressions for things that we exclude.
-        # Note that we use match() to anchor these at the beginning
-        # of the string, instead of using "^" and search(), and that we use
-        # non-capturing groups since we're not using the results.
-        # Also note that Swedish and Norwegian Wikipedia specify dates as
-        # "xx. Januar" rather than "January 1" as they do in English.
-        self.months = {
-            'en': r'(January|February|March|April|May|June|July|August|September|October|November|December)[ _]\d+',
-            'no': r'\d+\.[ _]+(:[Jj]anuar|[Ff]ebruar|[Mm]ars|[Aa]pril|[Mm]ai|[Jj]uni|[Jj]uli|[Aa]ugust|[Ss]eptember|[Oo]ktober|[Nn]ovember|[Dd]esember)',
-            'sv': r'\d+\.[ _]+(:[Jj]anuari|[Ff]ebruari|[Mm]ars|[Aa]pril|[Mm]aj|[Jj]uni|[Jj]uli|[Aa]ugusti|[Ss]eptember|[Oo]ktober|[Nn]ovember|[Dd]ecember)',
-            'pt': r'\d+[ _]+de[ _]+(:[Jj]aneiro|[Ff]evereiro|[Mm]arço|[Aa]bril|[Mm]aio|[Jj]unho|[Jj]ulho|[Aa]gosto|[Ss]etembro|[Oo]utubro|[Nn]ovembro|[Dd]ezembro)',
-            'hu': r'Január|Február|Március|Április|Május|Június|Július|Augusztus|Szeptember|Október|November|December',
-            'fa': 'دسامب|نوامب|اکتب|سپتامب|اوت|ژوئی|ژوئن|مه|آوریل|مارس|فوریه|ژانویه',
-            'ru': r'(:Январь|Февраль|Март|Апрель|Май|Июнь|Июль|Август|Сентябрь|Октябрь|Ноябрь|Декабрь)|(:\d+[ _]+(:января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря))',
-            ## Note the negative lookahead (?! ...) to allow us to match
-            ## the actual months, but not dates.
-            'fr': r'(\d+[ _](?!.*[ _]\d+$))?([Jj]anvier|[Ff]évrier|[Mm]ars|[Aa]vril|[Mm]ai|[Jj]uin|[Jj]uillet|[Aa]oût|[Ss]eptembre|[Oo]ctobre|[Nn]ovembre|[Dd]écembre)(\d+)?',
-            }
-
-        # Note: compatible with both ' '  and '_' as spaces
-        self.lists = {
-            'en': r'^List[ _]of[ _]',
-            'no': r'^Liste[ _]over[ _]',
-            'sv': r'^Lista[ _]över[ _]',
-            'pt': r'^Lista[ _]de[ _]',
-            'hu': r'[ _]listája$',
-            'fa': r'^فهرست',
-            'ru': r'(^Список|(:Алфавитный[ _]|Хронологический[ _])список)|—[ _]список',
-            'fr': r"[Ll]iste[ _]d[e']",
-            }
-
-        # Compile the regular expressions
-        self.months_re = dict()
-        self.lists_re = dict()
-        for lang in self.months.keys():
-            self.months_re[lang] = re.compile(self.months[lang], re.U|re.I)
-            self.lists_re[lang] = re.compile(self.lists[lang], re.U|re.I)
+        # Regular expressions for things that we exclude,
+        # compiled once per process.
+        self.lists = LISTS
+        self.months_re = MONTHS_RE
+        self.lists_re = LISTS_RE
 
         self.rec_map = defaultdict(int)
 
@@ -192,7 +393,7 @@ class LinkRecommender():
 
         # date
         ## FIXME: what's the false positive rate on this one?
-        if re.search(r'\d{4}', item):
+        if YEAR_RE.search(item):
             return(True)
 
         # is a list
@@ -206,7 +407,10 @@ class LinkRecommender():
         return(False)
 
     def get_links(self):
-        '''Get all links from the articles in self.rec_map'''
+        '''
+        Get all links from the articles in self.rec_map, using the
+        language's link cache for pages we have recently expanded.
+        '''
         if not self.rec_map:
             return(None)
 
@@ -214,7 +418,8 @@ class LinkRecommender():
         # Single redirects are resolved, double redirects are marked
         # as such so they can be ignored.  Inlink counts for both links
         # and redirects (if present) are also listed.
-        getLinkedPagesQuery = r'''SELECT link.page_id AS lpage,
+        getLinkedPagesQuery = r'''SELECT pl.pl_from AS from_page,
+                                         link.page_id AS lpage,
                                          link.page_title AS lpage_title,
                                          redir.page_id AS rpage,
                                          redir.page_title AS rpage_title,
@@ -233,12 +438,30 @@ class LinkRecommender():
 
         logging.info("Ready to find recs based on {n} articles.".format(n=len(self.rec_map)))
 
+        try:
+            link_cache = _link_caches[self.lang]
+        except KeyError:
+            link_cache = LinkCache()
+            _link_caches[self.lang] = link_cache
+
         # Get a snapshot of the current set of recommendations,
-        # and extend recommendations based on it.
+        # and extend recommendations based on it, first from
+        # the pages with cached links.
         current_recs = list(self.rec_map.keys())
+        pages_to_fetch = []
+        for pageId in current_recs:
+            links = link_cache.get(pageId)
+            if links is None:
+                pages_to_fetch.append(pageId)
+                continue
+            for linkedId in links:
+                self.rec_map[linkedId] += 1
+
+        logging.info("found cached links for {} articles, fetching links for {}".format(len(current_recs) - len(pages_to_fetch), len(pages_to_fetch)))
+
         i = 0
         with db.cursor(self.wiki_db_conn, 'dict') as db_cursor:
-            for subset in chunked(current_recs, self.sliceSize):
+            for subset in chunked(pages_to_fetch, self.sliceSize):
                 logging.info("fetching links for slice {}".format(i))
 
                 # Get linked pages
@@ -246,6 +469,7 @@ class LinkRecommender():
                     db_cursor.execute(
                         getLinkedPagesQuery.format(
                             idlist=','.join([str(p) for p in subset])))
+                    fetched_links = {p: [] for p in subset}
                     for row in db_cursor:
                         # If the link is a double redirect, we skip it
                         if row['is_double_redirect']:
@@ -268,7 +492,12 @@ class LinkRecommender():
                         if self.exclude_item(pageTitle):
                             continue
 
-                        self.rec_map[pageId] += 1
+                        fetched_links[row['from_page']].append(pageId)
+
+                    for (fromId, links) in fetched_links.items():
+                        link_cache.put(fromId, links)
+                        for linkedId in links:
+                            self.rec_map[linkedId] += 1
 
                 except pymysql.Error as e:
                     logging.warning("Failed to get page links")
@@ -295,19 +524,6 @@ class LinkRecommender():
         if not item_map or not param_map:
             return(None)
 
-        # Query to get the page ID of a given page and if it's
-        # a redirect also get the page ID of the page it redirects to
-        getPageIdQuery = '''SELECT p.page_id, p.page_is_redirect,
-                                   redir.page_id AS redir_page_id,
-                                   redir.page_is_redirect AS double_redirect
-                            FROM page p LEFT JOIN redirect rd
-                            ON p.page_id=rd.rd_from
-                            LEFT JOIN page redir
-                            ON (rd.rd_namespace=redir.page_namespace
-                                AND rd.rd_title=redir.page_title)
-                            WHERE p.page_namespace=0
-                            AND p.page_title=%(title)s'''
-
         # Query to get the page titles for a list of page IDs
         getPageTitlesQuery = '''SELECT page_id, page_title
                                 FROM page
@@ -326,30 +542,16 @@ class LinkRecommender():
         self.rec_map = defaultdict(int)
         newItemMap = {}
         with db.cursor(self.wiki_db_conn, 'dict') as db_cursor:
-            for item, val in item_map.items():
-                try:
-                    db_cursor.execute(
-                        getPageIdQuery,
-                        {'title': re.sub(b' ', b'_', item.encode('utf-8'))})
-                    row = db_cursor.fetchone()
-                    db_cursor.fetchall() # flush cursor
-                    page_id = None
-                    if row:
-                        # Article exists, set pageId accordingly
-                        if not row['page_is_redirect']:
-                            page_id = row['page_id']
-                        elif not row ['double_redirect']:
-                            page_id = row['redir_page_id']
-
-                    if page_id:
-                        # Store `val` in new item map, add page ID to rec seed
-                        # if not an item to exclude
-                        newItemMap[page_id] = val
-                        if not self.exclude_item(item):
-                            self.rec_map[page_id] = 0
-                except pymysql.Error as e:
-                    logging.warning("Failed to get page ID for {title}".format(title=item))
-                    logging.warning("MySQL error {0}: {1}".format(e.args[0], e.args[1]))
+            page_ids = resolve_titles(db_cursor, list(item_map.keys()))
+
+        for item, val in item_map.items():
+            page_id = page_ids.get(item)
+            if page_id:
+                # Store `val` in new item map, add page ID to rec seed
+                # if not an item to exclude
+                newItemMap[page_id] = val
+                if not self.exclude_item(item):
+                    self.rec_map[page_id] = 0
 
         item_map = newItemMap
         newItemMap = None
@@ -427,31 +629,38 @@ class LinkRecommender():
         return(recs)
 
     def connect(self):
-        '''Connect to the appropriate Wikipedia and user databases.'''
-        try:
-            self.wiki_db_conn = db.connect(self.wiki_host,
+        '''
+        Connect to the appropriate Wikipedia and user databases,
+        reusing this process' connections if they are still alive.
+        '''
+        self.wiki_db_conn = get_connection(self.wiki_host,
                                            self.wiki_db_name,
                                            self.db_config)
-        except:
+        if self.wiki_db_conn is None:
             raise DatabaseConnectionError
 
-        try:
-            self.tool_db_conn = db.connect(self.tool_host,
+        self.tool_db_conn = get_connection(self.tool_host,
                                            self.tool_db,
                                            self.db_config)
-        except:
+        if self.tool_db_conn is None:
             raise DatabaseConnectionError
 
         ## all ok
         return()
 
     def close(self):
-        '''Close our database connections.'''
+        '''
+        Close our database connections.  Only needed when not running
+        as a web service, where connections are kept between requests.
+        '''
         try:
             self.wiki_db_conn.close()
             self.tool_db_conn.close()
         except:
             raise DatabaseConnectionError
+        finally:
+            _connections.pop((self.wiki_host, self.wiki_db_name), None)
+            _connections.pop((self.tool_host, self.tool_db), None)
 
         ## all ok
         return()
@@ -476,16 +685,23 @@ def app(envir, start_response):
         return(json_helper.getError(
             500, 'Unable to decode items or parameters as JSON.'))
 
+    # Check that both item_map and param_map are dictionaries
+    if (not isinstance(req_items, dict)) or (not isinstance(req_params, dict)):
+        return(json_helper.getError(
+            400, 'Error: Items and params not dictionaries.'))
+
     try:
         nrecs_param = int(req_params['nrecs'])
     except:
         nrecs_param = 10
 
-    recommender = LinkRecommender(lang=req_params['lang'], nrecs=nrecs_param)
-
-    if not recommender.checkLang():
+    # Only languages we support get a recommender kept around
+    if req_params.get('lang') not in LISTS:
         return(json_helper.getError(501, 'Error: Language not supported.'))
 
+    recommender = get_recommender(req_params['lang'])
+    recommender.nrecs = nrecs_param
+
     if not recommender.checkNrecs():
         return(json_helper.getError(
             413, 'Error: Requested too many recommendations.'))
@@ -496,14 +712,7 @@ def app(envir, start_response):
         return(json_helper.getError(
             500, 'Error: Unable to connect to database servers.'))
 
-    # Check that both item_map and param_map are dictionaries
-    if (not isinstance(req_items, dict)) or (not isinstance(req_params, dict)):
-        return(json_helper.getError(
-            400, 'Error: Items and params not dictionaries.'))
-
     recs = recommender.get_recs(item_map=req_items, param_map=req_params)
-    recommender.close()
-    del(recommender) # done, can be GC'ed if possible
     return(json_helper.getSuccess(recs))
 
 # Test code, uncomment and run from command line to verify functionality
@@ -18,5 +18,6 @@
 # Run on trusty to have all necessary libraries
 #$ -l release=trusty
 
-# Command-line option is the language we're updating for
-$HOME/venv/3.4/bin/python3 $HOME/link-rec/inlink-table-updater.py $1
+# Command-line option is the language we're updating for, the counts
+# are also exported for the link recommender to memory-map
+$HOME/venv/3.4/bin/python3 $HOME/link-rec/inlink-table-updater.py -e $HOME/link-rec/inlinkcounts $1